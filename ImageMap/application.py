@@ -5,18 +5,14 @@ from ttkbootstrap.constants import *
 import sys
 import threading
 import time
-import torch
 import logging
-from PIL import Image, ImageTk
 import queue
 from file_explorer_dialog import FileExplorerDialog
-from load_image import load_image
 from calculate_unique_colors import calculate_unique_colors
-from extract_color_palette import extract_color_palette
-from save_image import save_image
-from resize_and_remap_image import resize_and_remap_image
 from multilingual_support import language_manager
 from redirect import Redirect
+from palette_cache import PaletteCache, image_digest, palette_key
+from remap_job import JobCancelled, RemapJob
 
 logging.basicConfig(level=logging.INFO)
 
@@ -28,6 +24,9 @@ class Application(ttk.Frame):
         self.preview_label = None
         self.create_widgets()
         self.image = None
+        self.palette_cache = PaletteCache()
+        self.job = None
+        self.closing = False
         self.unique_colors_count = 0
         self.start_time = None
         self.stop_time = False
@@ -36,6 +35,7 @@ class Application(ttk.Frame):
         self.progress_queue = queue.Queue()
         self.last_progress = -1
         self.create_settings_menu()
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
         self.update_gui()
 
     def create_widgets(self):
@@ -44,7 +44,8 @@ class Application(ttk.Frame):
         self.text_output = tk.Text(self, height=15, width=80, font=large_font)
         self.text_output.pack(pady=10, padx=10)
 
-        sys.stdout = Redirect(self.text_output)
+        self.console = Redirect(self.text_output)
+        sys.stdout = self.console
 
         self.load_button = ttk.Button(self, text=language_manager.translate('load_image'), style='primary.TButton', command=self.load_image)
         self.load_button.pack(pady=10)
@@ -90,8 +91,19 @@ class Application(ttk.Frame):
         self.master.title(language_manager.translate('starting_app'))
         self.create_settings_menu()
 
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+    def on_close(self):
+        self.closing = True
+        self.cancel_job()
+        self.master.destroy()
+
     def load_image(self):
         logging.info("Load image button clicked")
+        self.cancel_job()
         self.start_time = None
         dialog = FileExplorerDialog(self.master)
         self.master.wait_window(dialog)
@@ -112,17 +124,28 @@ class Application(ttk.Frame):
         thread.start()
 
     def load_image_thread(self, image_path):
+        from load_image import load_image
+
         try:
-            self.image = load_image(image_path)
-            if self.image is None:
-                logging.error(language_manager.translate('error_loading'))
-                self.master.after(0, self.end_loading, False)
-                return
-            self.unique_colors_count = calculate_unique_colors(self.image)
-            self.master.after(0, self.end_loading, True)
+            image = load_image(image_path, compact=True)
         except Exception as e:
             logging.error(f"{language_manager.translate('error_occurred').format(e)}", exc_info=True)
+            image = None
+        if image is None:
+            logging.error(language_manager.translate('error_loading'))
             self.master.after(0, self.end_loading, False)
+            return
+        self.image = image
+        # The parameter prompt does not need the color count, so it is shown before counting starts. The count
+        # works on its own reference: a failure there is only logged, and a newer load keeps its own count.
+        self.master.after(0, self.end_loading, True)
+        try:
+            unique_colors_count = calculate_unique_colors(image)
+        except Exception as e:
+            logging.error(f"{language_manager.translate('error_occurred').format(e)}", exc_info=True)
+            return
+        if self.image is image:
+            self.unique_colors_count = unique_colors_count
 
     def end_loading(self, success):
         self.progress_bar.stop()
@@ -153,69 +176,89 @@ class Application(ttk.Frame):
         self.stop_time = False
         self.progress_bar['value'] = 0
         self.last_progress = -1
+        self.cancel_job()
+        job = self.job = RemapJob()
+        progress_function = job.progress(self.update_progress_callback)
     
         def worker():
             try:
+                # torch, scikit-learn and OpenCV are imported by the first job rather than before the window opens.
+                import torch
+                from extract_color_palette import extract_color_palette
+                from resize_and_remap_image import resize_and_remap_image
+
                 self.update_status(language_manager.translate("extracting_color_palette"))
-                palette_list = extract_color_palette(self.image.cpu().numpy(), color_count, self.update_progress_callback)
-                palette = torch.tensor(palette_list, device=self.image.device, dtype=self.image.dtype)
+                backend = language_manager.config_manager.get_palette_backend()
+                key = palette_key(image_digest(self.image), color_count, **({} if backend == 'auto' else {'backend': backend}))
+                palette_list = self.palette_cache.get_or_compute(
+                    key, lambda: extract_color_palette(self.image.cpu().numpy(), color_count, progress_function,
+                                                       backend=backend))
+                logging.info(f"Palette cache: {self.palette_cache.hits} hit(s), {self.palette_cache.misses} miss(es)")
+                palette = torch.tensor(palette_list, device=self.image.device, dtype=torch.float32)
                 
                 self.last_progress = 49  
                 self.update_status(language_manager.translate("resizing_remapping"))
-                processed_image = resize_and_remap_image(self.image, scale, palette, 512, self.update_progress_callback)
+                processed_image = resize_and_remap_image(self.image, scale, palette, 512, self.update_progress_callback, job=job)
 
                 self.master.after(0, self.update_status, language_manager.translate("displaying_preview"))
                 self.master.after(0, self.display_preview, processed_image)
 
                 self.master.after(0, self.update_status, language_manager.translate("ready_to_save"))
-                self.master.after(0, self.save_dialog, processed_image)
+                self.master.after(0, self.save_dialog, processed_image, palette)
 
+            except JobCancelled:
+                logging.info(language_manager.translate("task_cancelled"))
+                if not self.closing:
+                    self.master.after(0, self.update_status, language_manager.translate("task_cancelled"))
+                return
             except Exception as e:
                 error_message = f"{language_manager.translate('error_occurred')}: {str(e)}"
                 logging.error(error_message, exc_info=True)
                 self.master.after(0, self.update_status, error_message)
             finally:
-                self.stop_time = True
-                self.master.after(0, self.update_status, language_manager.translate("task_completed"))
-                self.master.after(0, lambda: setattr(self.progress_bar, 'value', 100))
+                # A cancelled job can still be unwinding after the next one started; only the current job stops the timer.
+                if self.job is job:
+                    self.stop_time = True
 
-        thread = threading.Thread(target=worker)
+            self.master.after(0, self.update_status, language_manager.translate("task_completed"))
+            self.master.after(0, lambda: setattr(self.progress_bar, 'value', 100))
+
+        # A daemon thread, so closing the window does not wait for the job to notice that it was cancelled.
+        thread = threading.Thread(target=worker, daemon=True)
         thread.start()
 
 
-    def save_dialog(self, processed_image):
-        dialog = FileExplorerDialog(self.master, image_data=processed_image, mode="save")
+    def save_dialog(self, processed_image, palette=None):
+        from save_image import save_image
+
+        dialog = FileExplorerDialog(self.master, image_data=processed_image, mode="save", palette=palette)
         self.master.wait_window(dialog)
 
         if dialog.result:
             output_path = dialog.result
             self.update_status(language_manager.translate("main_action_save"))
-            save_image(processed_image, output_path)
+            save_image(processed_image, output_path, palette)
             self.update_status(language_manager.translate("image_save_success"))
-            logging.info(language_manager.translate("image_save_success"))
         else:
             self.update_status(language_manager.translate("save_cancelled"))
-            logging.info(language_manager.translate("save_cancelled"))
 
     def update_status(self, message):
-        if not message.endswith('\n'):
-            message += '\n'
-        self.text_output.insert(tk.END, message)
-        self.text_output.see(tk.END)
-        self.text_output.update_idletasks()
-        logging.info(message.strip())
+        # Safe from the worker thread: the console only queues the line and logs it once.
+        self.console.write_line(message)
 
     def update_progress_callback(self, progress):
         self.progress_queue.put(progress)
 
     def update_gui(self):
+        # Only the latest of the values queued since the last tick is drawn.
+        progress = None
         try:
             while True:
                 progress = self.progress_queue.get_nowait()
-                self.progress_bar['value'] = progress
-                self.update_idletasks()
         except queue.Empty:
             pass
+        if progress is not None:
+            self.progress_bar['value'] = progress
 
         if self.start_time is not None and not self.stop_time:
             elapsed_time = time.time() - self.start_time
@@ -231,6 +274,9 @@ class Application(ttk.Frame):
         logging.info(f"Processed image shape: {processed_image.shape if hasattr(processed_image, 'shape') else 'No shape attribute'}")
         logging.info(language_manager.translate('image_preview'))
 
+        import torch
+        from PIL import Image, ImageTk
+
         if isinstance(processed_image, torch.Tensor):
             processed_image = processed_image.cpu().numpy()
 
@@ -0,0 +1,219 @@
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from load_image import SUPPORTED_EXTENSIONS
+from batch_engine import BatchEngine
+from palette_cache import DEFAULT_CACHE_DIR
+from palette_backends import PALETTE_BACKENDS
+from strip_writer import DEFLATE_STRATEGIES, PNG_FILTERS
+from tracing import TRACER, format_summary, write_chrome_trace
+
+OUTPUT_FORMATS = ('png', 'tif', 'ppm', 'npy', 'jpg', 'webp', 'bmp')
+
+def expand_inputs(patterns, extensions=SUPPORTED_EXTENSIONS):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+        paths.extend(path for path in matches
+                     if os.path.isfile(path) and path.lower().endswith(extensions))
+    return list(dict.fromkeys(paths))
+
+def build_output_path(image_path, output_dir, extension='.png'):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(output_dir, stem + extension)
+
+def plan_outputs(paths, output_dir, scales=None, extension='.png'):
+    outputs = []
+    used = set()
+    for path in paths:
+        output_path = build_output_path(path, output_dir, extension)
+        base, extension = os.path.splitext(output_path)
+        suffix = 1
+        while output_path in used:
+            output_path = f"{base}_{suffix}{extension}"
+            suffix += 1
+        used.add(output_path)
+        if scales and len(scales) > 1:
+            base, extension = os.path.splitext(output_path)
+            output_path = tuple(f"{base}_x{scale:g}{extension}" for scale in scales)
+        outputs.append(output_path)
+    return outputs
+
+def format_outputs(output_path):
+    return ", ".join(output_path) if isinstance(output_path, tuple) else output_path
+
+def format_timings(timings):
+    # Stages come in the order the pipeline reports them, batch_pipeline.STAGES; importing that module here
+    # would load torch in the CLI process.
+    return " ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+
+def print_summary(totals, processed, failed, elapsed, cache_hits=None, cache_lookups=0, skipped=0):
+    print(f"Processed {processed} image(s), {failed} failed, in {elapsed:.2f}s")
+    if skipped:
+        print(f"Skipped {skipped} unchanged image(s)")
+    if cache_hits is not None and cache_lookups:
+        print(f"Palette cache: {cache_hits}/{cache_lookups} hits ({100 * cache_hits / cache_lookups:.0f}%)")
+    if processed:
+        for stage, total in totals.items():
+            print(f"  {stage:<8} total {total:8.2f}s  mean {total / processed:6.3f}s")
+    if elapsed > 0:
+        print(f"Throughput: {processed / elapsed:.2f} images/sec")
+
+def encoding_settings(args):
+    # Only the settings that were given, so the fingerprints of default outputs do not change.
+    settings = {'indexed': args.indexed or None, 'compression_level': args.compression_level, 'filter_type': args.filter,
+                'strategy': args.deflate_strategy, 'tile_size': args.tile_size}
+    return {name: value for name, value in settings.items() if value is not None}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Resize and remap images without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="Input files, directories or glob patterns")
+    parser.add_argument('-s', '--scale', type=float, nargs='+', required=True,
+                        help="Scale factor; several scales write one output per scale from a single decode and palette")
+    parser.add_argument('-c', '--colors', type=int, required=True, help="Number of colors in the palette")
+    parser.add_argument('-o', '--output-dir', required=True, help="Directory for the remapped images")
+    parser.add_argument('--block-size', type=int, default=512, help="Strip and block size for the remap stage")
+    parser.add_argument('-j', '--workers', type=int, default=0, help="Worker processes (0 uses one per CPU)")
+    parser.add_argument('--threads-per-worker', type=int, default=0, help="Torch/BLAS threads per worker (0 splits the CPUs evenly)")
+    parser.add_argument('--chunk-size', type=int, default=0, help="Images handed to a worker at once (0 picks automatically)")
+    parser.add_argument('--no-pin', action='store_true', help="Do not pin workers to CPU cores")
+    parser.add_argument('--no-prefetch', action='store_true', help="Do not decode the next image while the current one is remapped")
+    parser.add_argument('--unordered', action='store_true', help="Report results as they finish instead of in input order")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read, remap and write in strips so memory stays bounded for very large images")
+    parser.add_argument('--compact', action='store_true',
+                        help="Keep decoded images as uint8/uint16 instead of float32 (about 4x less memory)")
+    parser.add_argument('--palette-cache', default=DEFAULT_CACHE_DIR, metavar='DIR',
+                        help="Directory of cached palettes, keyed by image content and palette settings")
+    parser.add_argument('--no-palette-cache', action='store_true', help="Always recompute the palette")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed for pixel sampling and k-means, so the same input always gives the same palette")
+    parser.add_argument('--histogram', action='store_true',
+                        help="Cluster every distinct color weighted by its pixel count instead of a random pixel sample")
+    parser.add_argument('--backend', choices=sorted(PALETTE_BACKENDS), default='auto',
+                        help="Palette extraction backend (auto uses minibatch on CPU and lloyd on GPU)")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="Skip images whose outputs were already written from the same file with the same settings")
+    parser.add_argument('--resume', action='store_true',
+                        help="Checkpoint finished strips next to each output and continue interrupted images from them")
+    parser.add_argument('--memmap-output', action='store_true',
+                        help="Remap into a memory-mapped file next to the output and encode it strip by strip")
+    parser.add_argument('--reduced-decode', action='store_true',
+                        help="Decode JPEG files at 1/2, 1/4 or 1/8 size when the largest scale allows it, then resize the rest")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='png', help="Output file format")
+    parser.add_argument('--indexed', action='store_true',
+                        help="Write PNG and TIFF with a palette and one index (or fewer bits) per pixel instead of RGB")
+    parser.add_argument('--compression-level', type=int, choices=range(10), default=None, metavar='0-9',
+                        help="Deflate level for PNG and TIFF; lower is faster, higher is smaller (default 1)")
+    parser.add_argument('--filter', choices=list(PNG_FILTERS), default=None,
+                        help="PNG scanline filter; any filter but none turns on the horizontal predictor for TIFF")
+    parser.add_argument('--deflate-strategy', choices=list(DEFLATE_STRATEGIES), default=None,
+                        help="zlib strategy for PNG (rle is fast on flat palette images)")
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help="Write TIFF as square tiles of this size (a multiple of 16) instead of strips")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="Write a Chrome trace (chrome://tracing, ui.perfetto.dev) of every stage and strip to FILE")
+    parser.add_argument('--trace-summary', action='store_true',
+                        help="Print wall time, CPU time, throughput and peak memory per traced span at the end")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Hide the per-stage messages of the pipeline")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Enable INFO logging")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if any(scale <= 0 for scale in args.scale):
+        print("Scale factor must be positive", file=sys.stderr)
+        return 2
+    if args.histogram and args.stream:
+        print("--histogram needs the whole image in memory and cannot be combined with --stream", file=sys.stderr)
+        return 2
+    if args.reduced_decode and args.stream:
+        print("--reduced-decode applies to in-memory runs; --stream reads the file strip by strip", file=sys.stderr)
+        return 2
+    for flag, enabled in (('--resume', args.resume), ('--memmap-output', args.memmap_output)):
+        if enabled and (args.stream or len(args.scale) > 1):
+            print(f"{flag} only applies to single-scale in-memory runs, not to --stream or several scales", file=sys.stderr)
+            return 2
+    if args.colors < 1:
+        print("Number of colors must be at least 1", file=sys.stderr)
+        return 2
+    if args.indexed and args.colors > 256:
+        print("--indexed supports at most 256 colors", file=sys.stderr)
+        return 2
+    if args.tile_size is not None and (args.tile_size <= 0 or args.tile_size % 16):
+        print("--tile-size must be a positive multiple of 16", file=sys.stderr)
+        return 2
+
+    # Raw .npy arrays can only be read by the strip reader.
+    paths = expand_inputs(args.inputs, SUPPORTED_EXTENSIONS + ('.npy',) if args.stream else SUPPORTED_EXTENSIONS)
+    if not paths:
+        print("No input images found", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = plan_outputs(paths, args.output_dir, args.scale, '.' + args.format)
+    scale = args.scale[0] if len(args.scale) == 1 else tuple(args.scale)
+
+    engine = BatchEngine(workers=args.workers or None, threads_per_worker=args.threads_per_worker or None,
+                         pin_cores=not args.no_pin, chunk_size=args.chunk_size or None, prefetch=not args.no_prefetch)
+    trace = bool(args.trace or args.trace_summary)
+    if trace:
+        TRACER.enable()
+    totals = {}
+    processed = 0
+    failed = 0
+    skipped = 0
+    cache_hits = 0
+    cache_lookups = 0
+    start = time.perf_counter()
+
+    jobs = list(zip(paths, outputs))
+    for done, result in enumerate(engine.run(jobs, scale, args.colors, args.block_size,
+                                             ordered=not args.unordered, quiet=args.quiet,
+                                             stream=args.stream, compact=args.compact,
+                                             palette_cache_dir=None if args.no_palette_cache else args.palette_cache,
+                                             seed=args.seed, skip_unchanged=args.skip_unchanged,
+                                             sampling='histogram' if args.histogram else 'random',
+                                             backend=args.backend, resume=args.resume,
+                                             memmap_output=args.memmap_output,
+                                             encoding=encoding_settings(args), trace=trace,
+                                             reduced_decode=args.reduced_decode), start=1):
+        TRACER.extend(result.trace)
+        if result.palette_cached is not None:
+            cache_lookups += 1
+            cache_hits += result.palette_cached
+        if not result.ok:
+            failed += 1
+            print(f"[{done}/{len(jobs)}] {result.image_path}: FAILED ({result.error})")
+            continue
+        if result.skipped:
+            skipped += 1
+            print(f"[{done}/{len(jobs)}] {result.image_path}: unchanged, skipped")
+            continue
+
+        processed += 1
+        for stage, seconds in result.timings.items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        print(f"[{done}/{len(jobs)}] {result.image_path} -> {format_outputs(result.output_path)}: {format_timings(result.timings)}")
+
+    print_summary(totals, processed, failed, time.perf_counter() - start,
+                  None if args.no_palette_cache else cache_hits, cache_lookups, skipped)
+    if trace:
+        events = TRACER.drain()
+        if args.trace:
+            write_chrome_trace(args.trace, events)
+            print(f"Trace written to {args.trace}")
+        if args.trace_summary:
+            print(format_summary(events))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os
+import sys
+import contextlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Torch and the BLAS libraries size their thread pools from these when they are first imported,
+# so they are set in each worker before batch_pipeline is imported there.
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+_thread_limits = None
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def split_cpus(cpus, groups):
+    size = max(1, len(cpus) // groups)
+    return [cpus[i * size:(i + 1) * size] or cpus for i in range(groups)]
+
+def limit_threads(threads):
+    global _thread_limits
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        _thread_limits = threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+class BatchResult:
+    def __init__(self, index, image_path, output_path, timings=None, error=None):
+        self.index = index
+        self.image_path = image_path
+        self.output_path = output_path
+        self.timings = timings or {}
+        self.error = error
+        self.palette_cached = None
+        self.skipped = False
+        # Trace events recorded while the image was processed, when the run is traced.
+        self.trace = []
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def _init_worker(threads, cpu_groups, counter, quiet):
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+
+    if cpu_groups and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cpu_groups[slot % len(cpu_groups)])
+        except OSError as e:
+            logging.warning(f"Could not pin worker {slot} to CPUs: {e}")
+
+    limit_threads(threads)
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+_palette_caches = {}
+
+def _palette_cache(directory):
+    # One cache per worker process; the directory on disk is what the workers share.
+    if directory is None:
+        return None
+    if directory not in _palette_caches:
+        from palette_cache import PaletteCache
+        _palette_caches[directory] = PaletteCache(directory)
+    return _palette_caches[directory]
+
+def _process_chunk(chunk, options):
+    from batch_pipeline import (outputs_up_to_date, output_fingerprint, process_image, process_image_multiscale,
+                                process_image_streaming, record_fingerprint, timed_load)
+    from tracing import TRACER, span
+
+    scale, number_of_colors, block_size = options['scale'], options['number_of_colors'], options['block_size']
+    compact, prefetch, seed = options['compact'], options['prefetch'], options['seed']
+    # The prefetched decode has to pick the same reduction as the pipeline would.
+    decode_scale = (max(scale) if isinstance(scale, (list, tuple)) else scale) if options['reduced_decode'] else None
+    palette_cache = _palette_cache(options['palette_cache_dir'])
+    if options['trace']:
+        TRACER.enable()
+
+    results = []
+    fingerprints = {}
+    if options['skip_unchanged']:
+        # Decided for the whole chunk up front so the decoder never prefetches an image that is skipped.
+        remaining = []
+        for index, image_path, output_path in chunk:
+            output_paths = list(output_path) if isinstance(output_path, tuple) else [output_path]
+            try:
+                fingerprints[index] = output_fingerprint(image_path, scale, number_of_colors, seed, options['stream'],
+                                                         options['sampling'], options['backend'], options['encoding'],
+                                                         options['reduced_decode'], block_size)
+            except OSError as e:
+                results.append(BatchResult(index, image_path, output_path, error=str(e)))
+                continue
+            if outputs_up_to_date(output_paths, fingerprints[index]):
+                result = BatchResult(index, image_path, output_path)
+                result.skipped = True
+                results.append(result)
+            else:
+                remaining.append((index, image_path, output_path))
+        chunk = remaining
+
+    def run_one(index, image_path, output_path, loaded=None):
+        hits = palette_cache.hits if palette_cache is not None else 0
+        try:
+            with span('image', path=image_path):
+                timings = process_one(image_path, output_path, loaded)
+            if index in fingerprints:
+                record_fingerprint(list(output_path) if isinstance(output_path, tuple) else [output_path], fingerprints[index])
+            result = BatchResult(index, image_path, output_path, timings)
+        except Exception as e:
+            logging.error(f"Failed to process {image_path}: {e}", exc_info=True)
+            result = BatchResult(index, image_path, output_path, error=str(e))
+        if palette_cache is not None:
+            result.palette_cached = palette_cache.hits > hits
+        if options['trace']:
+            # Events of the prefetched decode may land with the previous image; the trace is merged anyway.
+            result.trace = TRACER.drain()
+        return result
+
+    def process_one(image_path, output_path, loaded):
+        if isinstance(loaded, Exception):
+            raise loaded
+        if options['stream']:
+            return process_image_streaming(image_path, output_path, scale, number_of_colors, block_size,
+                                           palette_cache=palette_cache, seed=seed, backend=options['backend'],
+                                           encoding=options['encoding'])
+        if isinstance(scale, (list, tuple)):
+            return process_image_multiscale(image_path, output_path, scale, number_of_colors, block_size,
+                                            loaded=loaded, compact=compact, palette_cache=palette_cache, seed=seed,
+                                            sampling=options['sampling'], backend=options['backend'],
+                                            encoding=options['encoding'], reduced_decode=options['reduced_decode'])
+        return process_image(image_path, output_path, scale, number_of_colors, block_size,
+                             loaded=loaded, compact=compact, palette_cache=palette_cache, seed=seed,
+                             sampling=options['sampling'], backend=options['backend'], resume=options['resume'],
+                             memmap_output=options['memmap_output'], encoding=options['encoding'],
+                             reduced_decode=options['reduced_decode'])
+
+    if options['stream'] or not chunk:
+        results.extend(run_one(index, image_path, output_path) for index, image_path, output_path in chunk)
+        return sorted(results, key=lambda result: result.index)
+
+    with ThreadPoolExecutor(max_workers=1) as decoder:
+        pending = decoder.submit(timed_load, chunk[0][1], compact, decode_scale) if prefetch else None
+
+        for position, (index, image_path, output_path) in enumerate(chunk):
+            try:
+                loaded = pending.result() if pending is not None else None
+            except Exception as e:
+                loaded = e
+
+            # Decode the next image while this one goes through the palette and remap stages.
+            pending = None
+            if prefetch and position + 1 < len(chunk):
+                pending = decoder.submit(timed_load, chunk[position + 1][1], compact, decode_scale)
+
+            results.append(run_one(index, image_path, output_path, loaded))
+    return sorted(results, key=lambda result: result.index)
+
+class BatchEngine:
+    def __init__(self, workers=None, threads_per_worker=None, pin_cores=True, chunk_size=None, prefetch=True, start_method='spawn'):
+        cpus = available_cpus()
+        self.workers = workers or len(cpus)
+        self.threads_per_worker = threads_per_worker or max(1, len(cpus) // self.workers)
+        self.cpu_groups = split_cpus(cpus, self.workers) if pin_cores and self.workers > 1 else None
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.start_method = start_method
+
+    def _make_chunks(self, jobs):
+        # The decoder prefetches only within a chunk, so with prefetch on a chunk holds at least two images.
+        chunk_size = self.chunk_size or max(2 if self.prefetch else 1, min(8, len(jobs) // (self.workers * 4)))
+        return [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    def run(self, jobs, scale, number_of_colors, block_size=512, ordered=True, quiet=False, stream=False, compact=False,
+            palette_cache_dir=None, seed=None, skip_unchanged=False, sampling='random', backend='auto',
+            resume=False, memmap_output=False, encoding=None, trace=False, reduced_decode=False):
+        jobs = [(index, image_path, output_path) for index, (image_path, output_path) in enumerate(jobs)]
+        if not jobs:
+            return
+
+        options = {'scale': scale, 'number_of_colors': number_of_colors, 'block_size': block_size, 'prefetch': self.prefetch,
+                   'stream': stream, 'compact': compact, 'palette_cache_dir': palette_cache_dir,
+                   'seed': seed, 'skip_unchanged': skip_unchanged, 'sampling': sampling,
+                   'backend': backend, 'resume': resume,
+                   'memmap_output': memmap_output, 'encoding': encoding, 'trace': trace,
+                   'reduced_decode': reduced_decode}
+        if self.workers == 1:
+            yield from self._run_inline(jobs, options, quiet)
+            return
+
+        context = multiprocessing.get_context(self.start_method)
+        counter = context.Value('i', 0)
+        chunks = self._make_chunks(jobs)
+        workers = min(self.workers, len(chunks))
+        logging.info(f"Processing {len(jobs)} image(s) on {workers} worker(s) with {self.threads_per_worker} thread(s) each")
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(self.threads_per_worker, self.cpu_groups, counter, quiet)) as pool:
+            futures = {pool.submit(_process_chunk, chunk, options): chunk
+                       for chunk in chunks}
+
+            finished = {}
+            next_index = 0
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logging.error(f"Worker failed: {e}", exc_info=True)
+                    results = [BatchResult(index, image_path, output_path, error=str(e))
+                               for index, image_path, output_path in futures[future]]
+
+                if not ordered:
+                    yield from results
+                    continue
+
+                for result in results:
+                    finished[result.index] = result
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+
+    def _run_inline(self, jobs, options, quiet):
+        quiet_output = open(os.devnull, 'w') if quiet else None
+        try:
+            for chunk in self._make_chunks(jobs):
+                with contextlib.redirect_stdout(quiet_output) if quiet_output else contextlib.nullcontext():
+                    results = _process_chunk(chunk, options)
+                yield from results
+        finally:
+            if quiet_output is not None:
+                quiet_output.close()
\ No newline at end of file
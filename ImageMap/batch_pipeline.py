@@ -0,0 +1,150 @@
+import os
+import logging
+import torch
+from load_image import load_image, reduced_decode_factor
+from extract_color_palette import extract_color_palette
+from resize_and_remap_image import resize_and_remap_image
+from save_image import save_image_to_path
+from stream_remap import multiscale_resize_and_remap, stream_resize_and_remap
+from strip_writer import encoder_options
+from palette_cache import file_digest, fingerprint, image_digest, palette_key
+from remap_job import CHECKPOINT_SUFFIX, RemapJob
+from tracing import span
+
+STAGES = ('load', 'palette', 'remap', 'save')
+FINGERPRINT_SUFFIX = '.fingerprint'
+
+def no_progress(progress):
+    pass
+
+def timed_load(image_path, compact=False, decode_scale=None):
+    # With decode_scale, the largest output scale, JPEG files are decoded at a reduced size that is still at
+    # least as large as that output. The remap scales are then multiplied by the returned reduction.
+    timings = {}
+    with span('load', timings, path=os.path.basename(image_path)):
+        reduction = 1 if decode_scale is None else reduced_decode_factor(image_path, decode_scale)
+        image = load_image(image_path, compact, reduction)
+    if image is None:
+        raise ValueError(f"Failed to load image: {image_path}")
+    return image, timings['load'], reduction
+
+def palette_params(seed=None, sampling='random', backend='auto'):
+    # Default settings are left out so palettes and fingerprints recorded before they existed stay valid.
+    params = {} if seed is None else {'seed': seed}
+    if sampling != 'random':
+        params['sampling'] = sampling
+    if backend != 'auto':
+        params['backend'] = backend
+    return params
+
+def output_fingerprint(image_path, scale, number_of_colors, seed=None, stream=False, sampling='random', backend='auto',
+                       encoding=None, reduced_decode=False, block_size=512):
+    scales = list(scale) if isinstance(scale, (list, tuple)) else [scale]
+    params = palette_params(sampling=sampling, backend=backend)
+    # Strips are resized independently, so the strip height changes the pixels along their seams.
+    if block_size != 512:
+        params['block_size'] = block_size
+    if encoding:
+        params['encoding'] = encoding
+    if reduced_decode:
+        params['decode'] = 'reduced'
+    return fingerprint(file_digest(image_path), scales=scales, colors=number_of_colors, seed=seed, stream=stream, **params)
+
+def outputs_up_to_date(output_paths, expected):
+    # An output is reused only when it exists and its sidecar records the same input hash and settings.
+    for output_path in output_paths:
+        try:
+            with open(output_path + FINGERPRINT_SUFFIX, 'r', encoding='ascii') as f:
+                if f.read().strip() != expected:
+                    return False
+        except OSError:
+            return False
+        if not os.path.exists(output_path):
+            return False
+    return True
+
+def record_fingerprint(output_paths, value):
+    for output_path in output_paths:
+        with open(output_path + FINGERPRINT_SUFFIX, 'w', encoding='ascii') as f:
+            f.write(value)
+
+def palette_for_image(image, number_of_colors, progress_function=no_progress, palette_cache=None, seed=None,
+                      sampling='random', backend='auto'):
+    compute = lambda: extract_color_palette(image.cpu().numpy(), number_of_colors, progress_function, backend=backend,
+                                            seed=seed, sampling=sampling)
+    if palette_cache is None:
+        palette_list = compute()
+    else:
+        params = palette_params(seed, sampling, backend)
+        palette_list = palette_cache.get_or_compute(palette_key(image_digest(image), number_of_colors, **params), compute)
+    return torch.tensor(palette_list, device=image.device, dtype=torch.float32)
+
+def process_image(image_path, output_path, scale, number_of_colors, block_size=512, progress_function=no_progress, loaded=None,
+                  compact=False, palette_cache=None, seed=None, sampling='random', backend='auto', resume=False,
+                  memmap_output=False, encoding=None, reduced_decode=False):
+    timings = {}
+
+    if loaded is None:
+        loaded = timed_load(image_path, compact, scale if reduced_decode else None)
+    image, timings['load'], reduction = loaded
+
+    with span('palette', timings, colors=number_of_colors):
+        palette = palette_for_image(image, number_of_colors, progress_function, palette_cache, seed, sampling, backend)
+
+    # The remap goes into a memmap next to the output, which the encoder then reads strip by strip. Finished
+    # strips are recorded, so with resume an interrupted run continues from them; without it, a leftover
+    # checkpoint is overwritten.
+    job = RemapJob(output_path + CHECKPOINT_SUFFIX, keep_output=True, resume=resume) if resume or memmap_output else None
+    # Indexed outputs are remapped to an index map, which the encoder takes without an RGB expansion.
+    indexed = bool((encoding or {}).get('indexed'))
+    with span('remap', timings, scale=scale):
+        processed_image = resize_and_remap_image(image, scale * reduction, palette, block_size, progress_function,
+                                                 job=job, indexed=indexed)
+
+    with span('save', timings, path=os.path.basename(output_path)):
+        # An output backed by the job's memmap is encoded from it strip by strip, whatever its size.
+        save_image_to_path(processed_image, output_path, streaming=True if job is not None else None,
+                           **encoder_options(encoding, palette))
+    if job is not None:
+        del processed_image
+        job.finish()
+
+    logging.info(f"Processed {image_path} -> {output_path}")
+    return timings
+
+def process_image_multiscale(image_path, output_paths, scales, number_of_colors, block_size=512, progress_function=no_progress,
+                            loaded=None, compact=False, palette_cache=None, seed=None, sampling='random', backend='auto',
+                            encoding=None, reduced_decode=False):
+    # One decode and one palette for every scale; encoding happens inside the remap stage.
+    timings = {}
+
+    if loaded is None:
+        loaded = timed_load(image_path, compact, max(scales) if reduced_decode else None)
+    image, timings['load'], reduction = loaded
+
+    with span('palette', timings, colors=number_of_colors):
+        palette = palette_for_image(image, number_of_colors, progress_function, palette_cache, seed, sampling, backend)
+
+    multiscale_resize_and_remap(image, [scale * reduction for scale in scales], palette, output_paths, progress_function,
+                                block_size, timings=timings, encoding=encoding)
+    logging.info(f"Processed {image_path} -> {', '.join(output_paths)}")
+    return timings
+
+def process_image_streaming(image_path, output_path, scale, number_of_colors, block_size=512, progress_function=no_progress,
+                            palette_cache=None, seed=None, backend='auto', encoding=None):
+    # Sampling pass, palette and strip-by-strip remap; encoding happens inside the remap stage.
+    # Several scales reuse the palette of the first pass but read the file again for each output.
+    timings = {}
+    scales = scale if isinstance(scale, (list, tuple)) else [scale]
+    output_paths = output_path if isinstance(output_path, (list, tuple)) else [output_path]
+
+    palette = None
+    for scale, output_path in zip(scales, output_paths):
+        stage_timings = {}
+        palette, _ = stream_resize_and_remap(image_path, output_path, scale, number_of_colors, progress_function, block_size,
+                                             palette=palette, timings=stage_timings, palette_cache=palette_cache, seed=seed,
+                                             backend=backend, encoding=encoding)
+        for stage, seconds in stage_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        logging.info(f"Streamed {image_path} -> {output_path}")
+    return timings
\ No newline at end of file
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import cv2
+from common import megapixel_shape, print_table, synthetic_image
+from memory_usage import format_bytes
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each mode runs in a fresh interpreter so the peak RSS of one does not hide the other.
+RUN_SCRIPT = textwrap.dedent("""
+    import contextlib, json, os, sys
+    sys.path.insert(0, {app_dir!r})
+    import torch
+    from memory_usage import current_rss, peak_rss, reset_peak_rss
+    from batch_pipeline import process_image
+
+    reset_peak_rss()
+    baseline = current_rss()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        timings = process_image({source!r}, {output!r}, {scale!r}, {colors!r}, compact={compact!r})
+    print(json.dumps({{'timings': timings, 'peak': peak_rss() - baseline}}))
+""")
+
+def run_mode(source, output, scale, colors, compact):
+    script = RUN_SCRIPT.format(app_dir=APP_DIR, source=source, output=output, scale=scale, colors=colors, compact=compact)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the float32 and compact (uint8) in-memory pipelines.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24])
+    parser.add_argument('--scale', type=float, default=0.5)
+    parser.add_argument('--colors', type=int, default=32)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for megapixels in args.megapixels:
+            height, width = megapixel_shape(megapixels)
+            source = os.path.join(directory, f'source_{megapixels:g}mp.png')
+            cv2.imwrite(source, synthetic_image(height, width))
+
+            for compact in (False, True):
+                output = os.path.join(directory, f'out_{megapixels:g}mp_{int(compact)}.png')
+                report = run_mode(source, output, args.scale, args.colors, compact)
+                timings = report['timings']
+                rows.append([f"{megapixels:g}", 'compact' if compact else 'float32',
+                             *(f"{timings[stage]:.2f}" for stage in ('load', 'palette', 'remap', 'save')),
+                             f"{sum(timings.values()):.2f}", format_bytes(report['peak'])])
+            os.remove(source)
+
+    print(f"scale {args.scale}, {args.colors} colors")
+    print_table(["MP", "mode", "load s", "palette s", "remap s", "save s", "total s", "peak RSS growth"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+import argparse
+import contextlib
+import threading
+import time
+import tkinter as tk
+import numpy as np
+import torch
+from common import megapixel_shape, print_table, synthetic_image
+from redirect import Redirect
+from resize_and_remap_image import resize_and_remap_image
+
+class PerWriteRedirect:
+    # The previous console: one after(0) callback and one update_idletasks for every write.
+    def __init__(self, widget):
+        self.widget = widget
+
+    def write(self, text):
+        self.widget.after(0, self._write, text)
+
+    def _write(self, text):
+        self.widget.insert(tk.END, text)
+        self.widget.see(tk.END)
+        self.widget.update_idletasks()
+
+    def flush(self):
+        pass
+
+def measure(root, widget, console, job, interval_ms=10):
+    # The job runs in a worker thread with stdout on the console, while the Tk thread asks for a tick every
+    # interval_ms and records how late each one fires.
+    delays = []
+    done = threading.Event()
+
+    def worker():
+        with contextlib.redirect_stdout(console):
+            job()
+        done.set()
+
+    expected = [0.0]
+
+    def tick():
+        now = time.perf_counter()
+        delays.append(now - expected[0])
+        if done.is_set():
+            root.quit()
+            return
+        expected[0] = now + interval_ms / 1000
+        root.after(interval_ms, tick)
+
+    widget.delete('1.0', tk.END)
+    start = time.perf_counter()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    expected[0] = start + interval_ms / 1000
+    root.after(interval_ms, tick)
+    root.mainloop()
+    thread.join()
+    seconds = time.perf_counter() - start
+    # Let the last queued writes land before the widget is measured.
+    root.update()
+    return np.array(delays) * 1000, seconds, int(widget.index('end-1c').split('.')[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI event-loop latency while a job writes to the console.")
+    parser.add_argument('--megapixels', type=float, default=50)
+    parser.add_argument('--scale', type=float, default=0.5)
+    parser.add_argument('--colors', type=int, default=16)
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--search', default='exact', help="Nearest-color search; exact remaps block by block")
+    parser.add_argument('--burst-lines', type=int, default=20000)
+    args = parser.parse_args()
+
+    image = torch.from_numpy(synthetic_image(*megapixel_shape(args.megapixels)))
+    palette = torch.rand(args.colors, 3, generator=torch.Generator().manual_seed(0))
+
+    def remap():
+        # Progress is printed for every block, as a verbose run of the remap loop does.
+        resize_and_remap_image(image, args.scale, palette, args.block_size, lambda p: print(f"progress {p}"),
+                               nearest_search=args.search)
+
+    def burst():
+        for line in range(args.burst_lines):
+            print(f"line {line}")
+
+    root = tk.Tk()
+    widget = tk.Text(root, height=15, width=80)
+    widget.pack()
+    consoles = [('per-write', lambda: PerWriteRedirect(widget)), ('buffered', lambda: Redirect(widget))]
+
+    rows = []
+    for workload, job in (('remap', remap), ('burst', burst)):
+        for name, make_console in consoles:
+            delays, seconds, lines = measure(root, widget, make_console(), job)
+            rows.append([workload, name, f"{seconds:.2f}", f"{np.percentile(delays, 50):.1f}",
+                         f"{np.percentile(delays, 95):.1f}", f"{delays.max():.1f}", lines])
+    root.destroy()
+
+    print_table(["workload", "console", "seconds", "p50 tick delay ms", "p95 ms", "max ms", "widget lines"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import tempfile
+import time
+import tkinter as tk
+from datetime import datetime
+import ttkbootstrap as ttk
+from common import print_table
+from directory_listing import LISTING_CACHE
+from file_explorer_dialog import FileExplorerDialog
+
+def make_directory(path, files, folders=50):
+    # Mostly camera-style image names, with some folders and a share of other files the dialog filters out.
+    for i in range(folders):
+        os.mkdir(os.path.join(path, f'folder_{i:03d}'))
+    for i in range(files):
+        extension = '.JPG' if i % 10 else '.xmp'
+        open(os.path.join(path, f'IMG_{i:06d}{extension}'), 'w').close()
+
+def synchronous_listing(tree, path):
+    # The previous populate_tree: listdir, three stats per entry and one insert per row, all on the Tk thread.
+    tree.delete(*tree.get_children())
+    items = []
+    for item in os.listdir(path):
+        full_path = os.path.join(path, item)
+        if os.path.exists(full_path):
+            stats = os.stat(full_path)
+            file_type = 'file' if os.path.isfile(full_path) else 'folder'
+            modified = datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            items.append((item, f"{stats.st_size / 1024:.2f} KB", file_type, modified))
+    items.sort(key=lambda x: x[0].lower())
+    for item in items:
+        tree.insert("", "end", values=item)
+
+def measure_previous(root, path):
+    tree = ttk.Treeview(root, columns=("name", "size", "type", "modified"), show="headings")
+    start = time.perf_counter()
+    synchronous_listing(tree, path)
+    root.update()
+    seconds = time.perf_counter() - start
+    rows = len(tree.get_children())
+    tree.destroy()
+    return seconds, seconds, seconds, rows
+
+def measure_dialog(root, dialog, path):
+    # Blocking time of the navigation call, then the time until the first rows and the full listing are in,
+    # while the Tk loop keeps running.
+    start = time.perf_counter()
+    dialog.current_path = path
+    dialog.populate_tree(path)
+    blocking = time.perf_counter() - start
+    first_rows = None
+    while True:
+        root.update()
+        now = time.perf_counter() - start
+        if first_rows is None and dialog.entries:
+            first_rows = now
+        if dialog.poll_id is None:
+            return blocking, first_rows or now, now, len(dialog.entries)
+        time.sleep(0.001)
+
+def main():
+    parser = argparse.ArgumentParser(description="Navigation latency of the file dialog on a very large folder.")
+    parser.add_argument('--files', type=int, default=100000)
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    with tempfile.TemporaryDirectory() as directory:
+        make_directory(directory, args.files)
+        dialog = FileExplorerDialog(root)
+        root.update()
+
+        rows = []
+        for name, measure in (('previous (synchronous)', lambda: measure_previous(root, directory)),
+                              ('scanner, cold', lambda: measure_dialog(root, dialog, directory)),
+                              ('scanner, cached', lambda: measure_dialog(root, dialog, directory))):
+            if name == 'scanner, cold':
+                LISTING_CACHE.listings.clear()
+            blocking, first_rows, complete, count = measure()
+            rows.append([name, f"{blocking * 1000:.1f}", f"{first_rows * 1000:.1f}", f"{complete * 1000:.1f}", count])
+        dialog.close()
+    root.destroy()
+
+    print(f"{args.files} files in one folder")
+    print_table(["listing", "blocking ms", "first rows ms", "complete ms", "entries"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import contextlib
+import io
+from common import no_progress, print_table, test_images, timed, weighted_sse
+from color_histogram import color_histogram
+from extract_color_palette import extract_color_palette
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare palettes from a random subsample and from the color histogram.")
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--backends', nargs='+', default=['minibatch', 'lloyd'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for name, image in test_images(args.megapixels):
+        histogram = color_histogram(image, max_colors=1 << 24)
+        print(f"{name}: {image.shape[0]}x{image.shape[1]}, {histogram[0].shape[0]} unique colors")
+        for n_colors in args.colors:
+            for backend in args.backends:
+                for sampling in ('random', 'histogram'):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        palette, seconds = timed(extract_color_palette, image, n_colors, no_progress,
+                                                 backend=backend, seed=args.seed, sampling=sampling)
+                    rows.append([name, n_colors, backend, sampling, f"{seconds:.2f}", f"{weighted_sse(histogram, palette):.1f}"])
+
+    print_table(["image", "colors", "backend", "sampling", "seconds", "weighted SSE"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
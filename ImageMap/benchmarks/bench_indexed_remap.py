@@ -0,0 +1,38 @@
+import argparse
+import contextlib
+import io
+import torch
+from common import no_progress, print_table, test_images, timed
+from extract_color_palette import extract_color_palette
+from memory_usage import format_bytes
+from resize_and_remap_image import resize_and_remap_image
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the RGB and index-map outputs of the remap stage.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24])
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 256, 1024])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for megapixels in args.megapixels:
+        name, image = test_images(megapixels)[0]
+        source = torch.from_numpy(image)
+        for n_colors in args.colors:
+            with contextlib.redirect_stdout(io.StringIO()):
+                palette = torch.tensor(extract_color_palette(image, n_colors, no_progress, seed=0))
+                rgb, rgb_seconds = timed(resize_and_remap_image, source, args.scale, palette, 512, no_progress,
+                                         repeat=args.repeat)
+                indexed, indexed_seconds = timed(resize_and_remap_image, source, args.scale, palette, 512, no_progress,
+                                                 indexed=True, repeat=args.repeat)
+            _, expand_seconds = timed(indexed.to_rgb, repeat=args.repeat)
+            assert torch.equal(indexed.to_rgb(), rgb)
+            index_bytes = indexed.indices.numel() * indexed.indices.element_size()
+            rows.append([f"{megapixels:g}", name, n_colors, f"{rgb_seconds:.2f}", f"{indexed_seconds:.2f}",
+                         f"{expand_seconds:.3f}", format_bytes(rgb.numel()), format_bytes(index_bytes)])
+
+    print_table(["MP", "image", "colors", "RGB remap s", "indexed remap s", "expand s", "RGB bytes", "index bytes"], rows)
+
+if __name__ == "__main__":
+    main()
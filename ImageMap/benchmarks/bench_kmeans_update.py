@@ -0,0 +1,56 @@
+import argparse
+import contextlib
+import io
+from common import megapixel_shape, no_progress, print_table, synthetic_image, timed
+import numpy as np
+import torch
+from extract_color_palette import CPUKMeans, TorchKMeans
+
+class PerClusterLoopKMeans(TorchKMeans):
+    # The update step as it was before the scatter-add: one mask and one reduction per cluster.
+    def _accumulate(self, batch, assignments, sums, counts, weights=None):
+        for k in range(self.n_clusters):
+            mask = assignments == k
+            if mask.any():
+                sums[k] += batch[mask].sum(dim=0)
+                counts[k] += mask.sum()
+
+def time_update(kmeans, batch, repeat=5):
+    generator = torch.Generator().manual_seed(0)
+    assignments = torch.randint(0, kmeans.n_clusters, (batch.shape[0],), generator=generator)
+    sums = torch.zeros((kmeans.n_clusters, 3))
+    counts = torch.zeros(kmeans.n_clusters)
+    _, seconds = timed(kmeans._accumulate, batch, assignments, sums, counts, repeat=repeat)
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the number of clusters for the CPU k-means variants.")
+    parser.add_argument('--samples', type=int, default=100000)
+    parser.add_argument('--clusters', type=int, nargs='+', default=[16, 64, 256, 1024])
+    parser.add_argument('--assignment-search', default='auto', choices=('auto', 'kdtree', 'exact'))
+    args = parser.parse_args()
+
+    height, width = megapixel_shape(2)
+    pixels = synthetic_image(height, width).reshape(-1, 3).astype(np.float32) / 255.0
+    pixels = pixels[np.random.default_rng(0).choice(pixels.shape[0], args.samples, replace=False)]
+    batch = torch.from_numpy(pixels[:TorchKMeans.max_batch_size])
+    print(f"{args.samples} samples, update step timed on a {batch.shape[0]}-pixel batch, "
+          f"{torch.get_num_threads()} torch thread(s)")
+
+    rows = []
+    for n_clusters in args.clusters:
+        scatter_update = time_update(TorchKMeans(n_clusters), batch)
+        loop_update = time_update(PerClusterLoopKMeans(n_clusters), batch)
+
+        np.random.seed(0)
+        _, lloyd_time = timed(TorchKMeans(n_clusters, 'cpu', args.assignment_search).fit, pixels, no_progress)
+        with contextlib.redirect_stderr(io.StringIO()):
+            _, minibatch_time = timed(CPUKMeans(n_clusters).fit, pixels, no_progress)
+
+        rows.append([n_clusters, f"{scatter_update * 1000:.1f}", f"{loop_update * 1000:.1f}",
+                     f"{lloyd_time:.2f}", f"{minibatch_time:.2f}"])
+
+    print_table(["clusters", "update index_add ms", "update per-cluster ms", "lloyd fit s", "sklearn minibatch fit s"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import cv2
+import torch
+from common import megapixel_shape, no_progress, print_table, synthetic_image, timed
+from load_image import load_image
+from resize_and_remap_image import resize_and_remap_image
+from save_image import save_image_to_path
+from stream_remap import multiscale_resize_and_remap
+
+def separate_calls(source, scales, palette, directory):
+    for scale in scales:
+        image = load_image(source, compact=True)
+        output = resize_and_remap_image(image, scale, palette, 512, no_progress)
+        save_image_to_path(output, os.path.join(directory, f'separate_x{scale:g}.png'))
+
+def single_pass(source, scales, palette, directory):
+    image = load_image(source, compact=True)
+    outputs = [os.path.join(directory, f'multi_x{scale:g}.png') for scale in scales]
+    multiscale_resize_and_remap(image, scales, palette, outputs, no_progress)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one multi-scale pass with one full call per scale.")
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.25, 0.5, 1.0])
+    parser.add_argument('--colors', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+
+    height, width = megapixel_shape(args.megapixels)
+    palette = torch.rand((args.colors, 3), generator=torch.Generator().manual_seed(0))
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()) as log:
+        source = os.path.join(directory, 'source.png')
+        cv2.imwrite(source, synthetic_image(height, width))
+
+        _, largest_time = timed(separate_calls, source, [max(args.scales)], palette, directory, repeat=args.repeat)
+        _, separate_time = timed(separate_calls, source, args.scales, palette, directory, repeat=args.repeat)
+        _, multi_time = timed(single_pass, source, args.scales, palette, directory, repeat=args.repeat)
+
+    print(f"{height}x{width} source, scales {', '.join(f'{scale:g}' for scale in args.scales)}, {args.colors} colors")
+    print_table(["run", "seconds", "vs largest scale alone"],
+                [["largest scale alone", f"{largest_time:.2f}", "1.00x"],
+                 ["one call per scale", f"{separate_time:.2f}", f"{separate_time / largest_time:.2f}x"],
+                 ["single multi-scale pass", f"{multi_time:.2f}", f"{multi_time / largest_time:.2f}x"]])
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
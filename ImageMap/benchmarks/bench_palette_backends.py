@@ -0,0 +1,48 @@
+import argparse
+import contextlib
+import gc
+import io
+from common import no_progress, print_table, test_images, timed, weighted_sse
+from color_histogram import color_histogram
+from extract_color_palette import extract_color_palette
+from memory_usage import current_rss, format_bytes, peak_rss, reset_peak_rss
+from palette_backends import PALETTE_BACKENDS
+
+def run_backend(image, n_colors, backend, seed, sampling):
+    # The images are built before the first run, so the RSS growth is what the backend itself allocates.
+    gc.collect()
+    reset_peak_rss()
+    baseline = current_rss()
+    with contextlib.redirect_stdout(io.StringIO()):
+        palette, seconds = timed(extract_color_palette, image, n_colors, no_progress,
+                                 backend=backend, seed=seed, sampling=sampling)
+    return palette, seconds, peak_rss() - baseline
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the palette backends on a fixed set of synthetic images.")
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--backends', nargs='+', choices=sorted(PALETTE_BACKENDS),
+                        default=['minibatch', 'lloyd', 'lloyd++', 'median-cut', 'octree'])
+    parser.add_argument('--histogram', action='store_true', help="Also run every backend on the color histogram")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    samplings = ('random', 'histogram') if args.histogram else ('random',)
+    images = test_images(args.megapixels)
+    histograms = [color_histogram(image, max_colors=1 << 24) for _, image in images]
+
+    rows = []
+    for (name, image), histogram in zip(images, histograms):
+        print(f"{name}: {image.shape[0]}x{image.shape[1]}, {histogram[0].shape[0]} unique colors")
+        for n_colors in args.colors:
+            for backend in args.backends:
+                for sampling in samplings:
+                    palette, seconds, peak = run_backend(image, n_colors, backend, args.seed, sampling)
+                    rows.append([name, n_colors, backend, sampling, f"{seconds:.2f}", format_bytes(peak),
+                                 f"{weighted_sse(histogram, palette):.1f}"])
+
+    print_table(["image", "colors", "backend", "sampling", "seconds", "peak RSS growth", "weighted SSE"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,32 @@
+import argparse
+from common import megapixel_shape, print_table, synthetic_image, timed
+import torch
+from palette_index import build_palette_index, find_nearest_neighbor_batch
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep palette sizes across the exact, LUT and KD-tree searches.")
+    parser.add_argument('--megapixels', type=float, default=2)
+    parser.add_argument('--colors', type=int, nargs='+', default=[256, 1024, 2048, 4096])
+    args = parser.parse_args()
+
+    height, width = megapixel_shape(args.megapixels)
+    pixels = (torch.from_numpy(synthetic_image(height, width)).float() / 255.0).reshape(-1, 3)
+    generator = torch.Generator().manual_seed(0)
+    print(f"{pixels.shape[0] / 1e6:.1f} MP")
+
+    rows = []
+    for n_colors in args.colors:
+        picks = torch.randint(0, pixels.shape[0], (n_colors,), generator=generator)
+        palette = (pixels[picks] + 0.01 * torch.randn((n_colors, 3), generator=generator)).clamp(0, 1)
+
+        exact_indices, exact_time = timed(find_nearest_neighbor_batch, pixels, palette)
+        row = [n_colors, f"{exact_time:.2f}"]
+        for mode in ('lut', 'kdtree'):
+            indices, seconds = timed(lambda: build_palette_index(palette, mode).query(pixels))
+            row.append(f"{seconds:.2f} ({(indices != exact_indices).sum().item()} diff)")
+        rows.append(row)
+
+    print_table(["colors", "exact s", "LUT s", "KD-tree s"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
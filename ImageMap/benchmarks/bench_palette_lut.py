@@ -0,0 +1,50 @@
+import argparse
+import contextlib
+import io
+from common import megapixel_shape, no_progress, print_table, synthetic_image, timed
+import torch
+from extract_color_palette import extract_color_palette
+from palette_index import PaletteLUT, find_nearest_neighbor_batch
+from resize_and_remap_image import resize_and_remap_image
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the palette LUT with the exact cdist search.")
+    parser.add_argument('--megapixels', type=float, default=24)
+    parser.add_argument('--colors', type=int, default=256)
+    parser.add_argument('--bits', type=int, default=6)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--skip-remap', action='store_true', help="Only time the nearest-color search")
+    args = parser.parse_args()
+
+    height, width = megapixel_shape(args.megapixels)
+    print(f"Image {height}x{width} ({height * width / 1e6:.1f} MP), {args.colors} colors, {1 << args.bits}^3 LUT")
+    image = torch.from_numpy(synthetic_image(height, width)).float() / 255.0
+    pixels = image.reshape(-1, 3)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        palette = torch.tensor(extract_color_palette(image.numpy(), args.colors, no_progress), dtype=torch.float32)
+
+    exact_indices, exact_time = timed(find_nearest_neighbor_batch, pixels, palette)
+    lut, build_time = timed(PaletteLUT, palette, bits=args.bits)
+    lut_indices, query_time = timed(lut.query, pixels)
+    mismatches = (exact_indices != lut_indices).sum().item()
+
+    rows = [
+        ["exact cdist", f"{exact_time:.2f}", "-", "-"],
+        ["LUT init", f"{build_time:.2f}", "-", "cells are filled during the first query"],
+        ["LUT query", f"{query_time:.2f}", f"{exact_time / (build_time + query_time):.1f}x",
+         f"{mismatches} mismatches, {lut.built.sum().item()} cells built, {lut.ambiguous_fraction:.1%} ambiguous"],
+    ]
+
+    if not args.skip_remap:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exact_image, exact_remap = timed(resize_and_remap_image, image, args.scale, palette, 512, no_progress, 'exact')
+            lut_image, lut_remap = timed(resize_and_remap_image, image, args.scale, palette, 512, no_progress, 'lut')
+        identical = torch.equal(exact_image, lut_image)
+        rows.append(["remap exact", f"{exact_remap:.2f}", "-", "-"])
+        rows.append(["remap LUT", f"{lut_remap:.2f}", f"{exact_remap / lut_remap:.1f}x", "identical" if identical else "DIFFERENT"])
+
+    print_table(["stage", "seconds", "speedup", "notes"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import cv2
+import numpy as np
+from common import megapixel_shape, print_table, synthetic_image
+from memory_usage import format_bytes
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each mode runs in a fresh interpreter so the peak RSS of one does not hide the other.
+RUN_SCRIPT = textwrap.dedent("""
+    import contextlib, json, os, sys
+    sys.path.insert(0, {app_dir!r})
+    import torch
+    from memory_usage import current_rss, peak_rss, reset_peak_rss
+    from batch_pipeline import process_image
+
+    reset_peak_rss()
+    baseline = current_rss()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        timings = process_image({source!r}, {output!r}, {scale!r}, {colors!r}, compact=True, seed=0,
+                                reduced_decode={reduced!r})
+    print(json.dumps({{'timings': timings, 'peak': peak_rss() - baseline}}))
+""")
+
+def run_mode(source, output, scale, colors, reduced):
+    script = RUN_SCRIPT.format(app_dir=APP_DIR, source=source, output=output, scale=scale, colors=colors, reduced=reduced)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def remap_error(output, reference):
+    # Mean squared error of the remapped output against an area-filtered downscale of the full source: how well
+    # the palette and the resize together still represent the image.
+    image = cv2.imread(output, cv2.IMREAD_COLOR).astype(np.float32)
+    return float(((image - reference) ** 2).mean())
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and reduced-resolution JPEG decodes when downscaling.")
+    parser.add_argument('--megapixels', type=float, default=48)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 0.25, 0.125])
+    parser.add_argument('--colors', type=int, default=32)
+    parser.add_argument('--quality', type=int, default=92, help="JPEG quality of the synthetic source")
+    args = parser.parse_args()
+
+    height, width = megapixel_shape(args.megapixels)
+    # Multiples of 8, so every reduction factor applies.
+    height, width = height // 8 * 8, width // 8 * 8
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.jpg')
+        cv2.imwrite(source, synthetic_image(height, width), [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+        full_image = cv2.imread(source, cv2.IMREAD_COLOR)
+
+        for scale in args.scales:
+            reference = cv2.resize(full_image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                   interpolation=cv2.INTER_AREA).astype(np.float32)
+            for reduced in (False, True):
+                output = os.path.join(directory, f'out_{scale:g}_{int(reduced)}.png')
+                report = run_mode(source, output, scale, args.colors, reduced)
+                timings = report['timings']
+                rows.append([f"{scale:g}", 'reduced' if reduced else 'full',
+                             *(f"{timings[stage]:.2f}" for stage in ('load', 'palette', 'remap')),
+                             f"{sum(timings.values()):.2f}", format_bytes(report['peak']),
+                             f"{remap_error(output, reference):.1f}"])
+
+    print(f"{height}x{width} JPEG source, {args.colors} colors")
+    print_table(["scale", "decode", "load s", "palette s", "remap s", "total s", "peak RSS growth", "MSE vs area"], rows)
+
+if __name__ == "__main__":
+    main()
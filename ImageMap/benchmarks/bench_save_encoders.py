@@ -0,0 +1,64 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import torch
+from common import no_progress, print_table, test_images, timed
+from extract_color_palette import extract_color_palette
+from resize_and_remap_image import resize_and_remap_image
+from save_image import save_image_to_path
+
+# (label, extension, indexed, encoder options); the first row is the cv2.imwrite path every output used before.
+ENCODERS = [
+    ('cv2 RGB', '.png', False, None),
+    ('strip RGB', '.png', False, {}),
+    ('strip RGB up', '.png', False, {'filter_type': 'up'}),
+    ('indexed', '.png', True, {}),
+    ('indexed rle', '.png', True, {'strategy': 'rle'}),
+    ('indexed up', '.png', True, {'filter_type': 'up'}),
+    ('indexed adaptive', '.png', True, {'filter_type': 'adaptive'}),
+    ('indexed level 6', '.png', True, {'compression_level': 6}),
+    ('indexed level 9', '.png', True, {'compression_level': 9}),
+    ('cv2 RGB TIFF', '.tif', False, None),
+    ('indexed TIFF', '.tif', True, {}),
+    ('indexed tiled TIFF', '.tif', True, {'tile_size': 256}),
+]
+
+def remapped_image(image, n_colors, seed):
+    with contextlib.redirect_stdout(io.StringIO()):
+        palette = torch.tensor(extract_color_palette(image, n_colors, no_progress, seed=seed))
+        output = resize_and_remap_image(torch.from_numpy(image), 1.0, palette, 512, no_progress)
+    return output.numpy(), palette
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encode time and file size of the save paths on remapped images.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24])
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 256])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for megapixels in args.megapixels:
+            for name, image in test_images(megapixels):
+                for n_colors in args.colors:
+                    remapped, palette = remapped_image(image, n_colors, args.seed)
+                    baseline = {}
+                    for label, extension, indexed, options in ENCODERS:
+                        path = os.path.join(directory, 'out' + extension)
+                        # None keeps the default decision, which is cv2.imwrite for images of this size.
+                        streaming = None if options is None else True
+                        _, seconds = timed(save_image_to_path, remapped, path, streaming=streaming,
+                                           palette=palette if indexed else None, repeat=args.repeat, **(options or {}))
+                        size = os.path.getsize(path)
+                        baseline.setdefault(extension, (seconds, size))
+                        base_seconds, base_size = baseline[extension]
+                        rows.append([f"{megapixels:g}", name, n_colors, label, f"{seconds:.2f}",
+                                     f"{size / 1e6:.1f}", f"{base_seconds / seconds:.2f}x", f"{size / base_size:.2f}"])
+
+    print_table(["MP", "image", "colors", "encoder", "seconds", "MB", "speed vs cv2", "size vs cv2"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import contextlib
+import io
+from common import no_progress, print_table, test_images, timed, weighted_sse
+from color_histogram import color_histogram
+from extract_color_palette import extract_color_palette
+
+# The current default path first, then the single-pass quantizers and the k-means runs they seed.
+BACKENDS = ('auto', 'lloyd', 'octree', 'median-cut', 'octree-lloyd', 'median-cut-lloyd')
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single-pass quantizers with the k-means palette path.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24])
+    parser.add_argument('--colors', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for megapixels in args.megapixels:
+        for name, image in test_images(megapixels):
+            histogram = color_histogram(image, max_colors=1 << 24)
+            for n_colors in args.colors:
+                for backend in BACKENDS:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        palette, seconds = timed(extract_color_palette, image, n_colors, no_progress,
+                                                 backend=backend, seed=args.seed)
+                    rows.append([f"{megapixels:g}", name, n_colors, backend, f"{seconds:.2f}",
+                                 f"{weighted_sse(histogram, palette):.1f}"])
+
+    print_table(["MP", "image", "colors", "backend", "seconds", "weighted SSE"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
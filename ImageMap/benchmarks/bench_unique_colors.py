@@ -0,0 +1,47 @@
+import argparse
+import gc
+import numpy as np
+import torch
+from common import megapixel_shape, print_table, synthetic_image, timed
+from color_histogram import count_unique_colors
+
+def torch_unique_rows(image):
+    # The counting as it was before packed keys: a lexicographic sort of float32 rows.
+    pixels = torch.from_numpy(image).float().div_(255.0).view(-1, 3)
+    return torch.unique(pixels, dim=0).shape[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Time unique color counting on large images.")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24, 50])
+    parser.add_argument('--baseline-max-megapixels', type=float, default=24,
+                        help="Skip the torch.unique baseline above this size; it needs several GB of memory")
+    args = parser.parse_args()
+
+    rows = []
+    for megapixels in args.megapixels:
+        height, width = megapixel_shape(megapixels)
+        image = synthetic_image(height, width)
+        exact = count_unique_colors(image, 'bitmap')
+
+        if megapixels <= args.baseline_max_megapixels:
+            count, seconds = timed(torch_unique_rows, image)
+            rows.append([f"{megapixels:g}", "torch.unique(dim=0)", count, f"{seconds:.2f}", "exact" if count == exact else "MISMATCH"])
+            gc.collect()
+
+        for method in ('bitmap', 'sort', 'hyperloglog'):
+            count, seconds = timed(count_unique_colors, image, method)
+            error = "exact" if count == exact else f"{100 * (count - exact) / exact:+.2f}%"
+            rows.append([f"{megapixels:g}", method, count, f"{seconds:.2f}", error])
+
+        wide = image.astype(np.uint16) * 257
+        for method in ('sort', 'hyperloglog'):
+            count, seconds = timed(count_unique_colors, wide, method)
+            error = "exact" if count == exact else f"{100 * (count - exact) / exact:+.2f}%"
+            rows.append([f"{megapixels:g}", f"{method} (16-bit)", count, f"{seconds:.2f}", error])
+        del image, wide
+        gc.collect()
+
+    print_table(["MP", "method", "unique colors", "seconds", "error"], rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Benchmarks are run as scripts (python benchmarks/bench_*.py), so the application modules are put on the path here.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def no_progress(progress):
+    pass
+
+def megapixel_shape(megapixels, aspect=1.5):
+    height = int(round((megapixels * 1e6 / aspect) ** 0.5))
+    return height, int(round(height * aspect))
+
+def synthetic_image(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)
+    phases = rng.uniform(0, 2 * np.pi, size=(3, 2))
+    centers = rng.uniform(0, 1, size=(6, 2))
+    colors = rng.uniform(0, 1, size=(6, 3)).astype(np.float32)
+
+    # Built row band by row band so 24-50 MP images do not need several float copies at once.
+    for start in range(0, height, 256):
+        end = min(start + 256, height)
+        y = np.linspace(start / height, end / height, end - start, endpoint=False, dtype=np.float32)[:, None]
+        band = np.empty((end - start, width, 3), dtype=np.float32)
+        for channel in range(3):
+            band[..., channel] = 0.5 + 0.25 * np.sin(6 * x[None, :] + phases[channel, 0]) * np.cos(4 * y + phases[channel, 1])
+        for (cy, cx), color in zip(centers, colors):
+            weight = np.exp(-((y - cy) ** 2 + (x[None, :] - cx) ** 2) / 0.01)[..., None]
+            band = band * (1 - weight) + color * weight
+        band += rng.normal(0, 0.02, size=band.shape).astype(np.float32)
+        image[start:end] = np.clip(band * 255, 0, 255).astype(np.uint8)
+    return image
+
+def timed(func, *args, repeat=1, **kwargs):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+def test_images(megapixels):
+    height, width = megapixel_shape(megapixels)
+    photo = synthetic_image(height, width)
+    # Flat artwork: the same gradients posterized to a few levels per channel.
+    levels = 6
+    art = (np.rint(photo.astype(np.float32) / 255 * (levels - 1)) * (255 / (levels - 1))).astype(np.uint8)
+    return [('photo', photo), ('posterized', art)]
+
+def weighted_sse(histogram, palette):
+    # Mean squared error over every pixel of the image, in 8-bit units, computed once per distinct color.
+    import torch
+    from palette_index import build_palette_index
+    colors, counts = histogram
+    colors = torch.from_numpy(colors)
+    palette = torch.tensor(palette, dtype=torch.float32)
+    indices = build_palette_index(palette, 'exact').query(colors)
+    errors = ((colors - palette[indices]) * 255).pow(2).sum(dim=1).double()
+    return float((errors * torch.from_numpy(counts).double()).sum() / counts.sum())
\ No newline at end of file
@@ -1,12 +1,12 @@
-import torch
 from multilingual_support import language_manager
+from color_histogram import count_unique_colors
+from tracing import span
 
-def calculate_unique_colors(image_tensor):
+def calculate_unique_colors(image_tensor, method='auto'):
     if image_tensor is None or image_tensor.numel() == 0:
         raise ValueError("The image is empty.")
 
-    pixels = image_tensor.view(-1, image_tensor.shape[-1])
-    unique_colors = torch.unique(pixels, dim=0)
-    number_of_unique_colors = unique_colors.size(0)
+    with span('unique_colors', method=method, bytes=image_tensor.numel() * image_tensor.element_size()):
+        number_of_unique_colors = count_unique_colors(image_tensor, method)
     print(language_manager.translate("unique_colors"), number_of_unique_colors)
     return number_of_unique_colors
\ No newline at end of file
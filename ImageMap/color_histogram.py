@@ -0,0 +1,129 @@
+import numpy as np
+
+# Clustering cost grows with the number of distinct colors, so larger histograms are requantized to fewer bits.
+DEFAULT_MAX_HISTOGRAM_COLORS = 262144
+
+def to_uint8_pixels(pixels: np.ndarray) -> np.ndarray:
+    pixels = pixels.reshape(-1, 3)
+    if pixels.dtype == np.uint8:
+        return pixels
+    if pixels.dtype == np.uint16:
+        return (pixels >> 8).astype(np.uint8)
+    scale = 1.0 if pixels.max() > 1.0 else 255.0
+    return np.clip(np.rint(pixels * scale), 0, 255).astype(np.uint8)
+
+def pack_colors(pixels: np.ndarray, bits: int = 8) -> np.ndarray:
+    # Channel by channel, so only one uint32 key array is allocated rather than an N x 3 int copy.
+    shift = 8 - bits
+    keys = (pixels[:, 0] >> shift).astype(np.uint32) << (2 * bits)
+    keys |= (pixels[:, 1] >> shift).astype(np.uint32) << bits
+    keys |= (pixels[:, 2] >> shift).astype(np.uint32)
+    return keys
+
+def unpack_keys(keys: np.ndarray, bits: int = 8) -> np.ndarray:
+    mask = (1 << bits) - 1
+    return np.stack([(keys >> (2 * bits)) & mask, (keys >> bits) & mask, keys & mask], axis=1)
+
+def _requantize(colors, counts, bits):
+    # Bins of the coarser grid are represented by the count-weighted mean of the colors they merge.
+    keys = pack_colors(colors, bits)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    merged_counts = np.bincount(inverse, weights=counts)
+    means = np.stack([np.bincount(inverse, weights=counts * colors[:, channel]) for channel in range(3)], axis=1)
+    return means / merged_counts[:, None], merged_counts.astype(np.int64)
+
+def color_histogram(pixels: np.ndarray, bits: int = 8, max_colors: int = DEFAULT_MAX_HISTOGRAM_COLORS,
+                    chunk_pixels: int = 1 << 24):
+    if not 1 <= bits <= 8:
+        raise ValueError(f"Histogram bits must be between 1 and 8, got {bits}")
+    pixels = to_uint8_pixels(pixels)
+
+    histogram = np.zeros(1 << (3 * bits), dtype=np.int64)
+    for start in range(0, pixels.shape[0], chunk_pixels):
+        counts = np.bincount(pack_colors(pixels[start:start + chunk_pixels], bits))
+        histogram[:counts.shape[0]] += counts
+        del counts
+
+    keys = np.flatnonzero(histogram)
+    counts = histogram[keys]
+    del histogram
+
+    if bits == 8:
+        colors = unpack_keys(keys, bits).astype(np.float64)
+    else:
+        # Bin centers on the coarse grid, refined below when a finer histogram is not available.
+        colors = (unpack_keys(keys, bits).astype(np.float64) + 0.5) * (1 << (8 - bits)) - 0.5
+
+    while colors.shape[0] > max_colors and bits > 1:
+        bits -= 1
+        colors, counts = _requantize(np.clip(np.rint(colors), 0, 255).astype(np.uint8), counts, bits)
+
+    return (colors / 255.0).astype(np.float32), counts
+
+UNIQUE_COUNT_METHODS = ('auto', 'bitmap', 'sort', 'hyperloglog')
+BITMAP_MIN_PIXELS = 1 << 20
+
+def pack_wide_colors(pixels: np.ndarray) -> np.ndarray:
+    pixels = pixels.reshape(-1, 3)
+    keys = pixels[:, 0].astype(np.uint64) << np.uint64(32)
+    keys |= pixels[:, 1].astype(np.uint64) << np.uint64(16)
+    keys |= pixels[:, 2].astype(np.uint64)
+    return keys
+
+def _mix64(keys: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer: spreads packed colors, which differ only in their low bits, over all 64 bits.
+    with np.errstate(over='ignore'):
+        keys = keys.astype(np.uint64)
+        keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return keys ^ (keys >> np.uint64(31))
+
+def _hyperloglog_count(key_chunks, precision: int = 14) -> int:
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    rest_bits = 64 - precision
+    for keys in key_chunks:
+        hashes = _mix64(keys)
+        buckets = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = (hashes & np.uint64((1 << rest_bits) - 1)).astype(np.float64)
+        # frexp gives the bit length of the remaining bits exactly, since they fit in a double's mantissa.
+        ranks = (rest_bits + 1 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(registers, buckets, ranks)
+
+    m = registers.shape[0]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    empty = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and empty:
+        estimate = m * np.log(m / empty)
+    return int(round(estimate))
+
+def count_unique_colors(image, method: str = 'auto', chunk_pixels: int = 1 << 24, precision: int = 14) -> int:
+    if method not in UNIQUE_COUNT_METHODS:
+        raise ValueError(f"Unknown unique color count method: {method}")
+    if hasattr(image, 'cpu'):
+        image = image.cpu().numpy()
+    pixels = image.reshape(-1, 3)
+
+    # 16-bit colors do not fit a 2^24 bitmap, so they are counted exactly on 48-bit keys.
+    wide = pixels.dtype == np.uint16
+    if not wide:
+        pixels = to_uint8_pixels(pixels)
+    pack = pack_wide_colors if wide else pack_colors
+    chunks = (pack(pixels[start:start + chunk_pixels]) for start in range(0, pixels.shape[0], chunk_pixels))
+
+    if method == 'auto':
+        method = 'sort' if wide or pixels.shape[0] < BITMAP_MIN_PIXELS else 'bitmap'
+
+    if method == 'hyperloglog':
+        return _hyperloglog_count(chunks, precision)
+
+    if method == 'bitmap':
+        if wide:
+            raise ValueError("The bitmap count only supports 8-bit colors")
+        seen = np.zeros(1 << 24, dtype=np.bool_)
+        for keys in chunks:
+            seen[keys] = True
+        return int(np.count_nonzero(seen))
+
+    unique = np.unique(np.concatenate([np.unique(keys) for keys in chunks]))
+    return int(unique.shape[0])
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import numpy as np
+from typing import Optional
+from color_histogram import pack_colors
+
+def _weighted_means(pixels: np.ndarray, labels: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    totals = np.bincount(labels, weights=weights)
+    sums = np.stack([np.bincount(labels, weights=weights * pixels[:, channel]) for channel in range(3)], axis=1)
+    return (sums / totals[:, None]).astype(np.float32)
+
+def _compact_labels(keys: np.ndarray, n_keys: int) -> np.ndarray:
+    # Renumbers the keys that occur to 0..n-1 with a bincount, which stays linear where np.unique would sort.
+    occupied = np.bincount(keys, minlength=n_keys) > 0
+    return (np.cumsum(occupied) - 1)[keys]
+
+# Breaks ties between boxes of equal score, which would otherwise compare the index arrays.
+_box_counter = itertools.count()
+
+def _box_entry(pixels: np.ndarray, weights: np.ndarray, indices: np.ndarray):
+    box = pixels[indices]
+    ranges = box.max(axis=0) - box.min(axis=0)
+    channel = int(np.argmax(ranges))
+    # Boxes are split in order of total weight times their widest side, so heavy and spread-out boxes go first.
+    score = float(ranges[channel]) * float(weights[indices].sum())
+    return -score, next(_box_counter), channel, indices
+
+def median_cut_palette(pixels: np.ndarray, n_colors: int, sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
+    pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 3)
+    weights = np.ones(pixels.shape[0]) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+    heap = [_box_entry(pixels, weights, np.arange(pixels.shape[0]))]
+    done = []
+    while heap and len(heap) + len(done) < n_colors:
+        negative_score, _, channel, indices = heapq.heappop(heap)
+        if negative_score == 0:
+            # The largest remaining box holds a single color, so no box can be split further.
+            done.append(indices)
+            done.extend(entry[3] for entry in heap)
+            heap = []
+            break
+
+        order = indices[np.argsort(pixels[indices, channel], kind='stable')]
+        values = pixels[order, channel]
+        cumulative = np.cumsum(weights[order])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2, side='right'))
+        # Moved to the nearest change of value so equal colors never end up on both sides of the cut.
+        changes = np.flatnonzero(values[1:] != values[:-1]) + 1
+        cut = int(changes[np.argmin(np.abs(changes - cut))])
+
+        heapq.heappush(heap, _box_entry(pixels, weights, order[:cut]))
+        heapq.heappush(heap, _box_entry(pixels, weights, order[cut:]))
+
+    boxes = done + [entry[3] for entry in heap]
+    labels = np.empty(pixels.shape[0], dtype=np.intp)
+    for label, indices in enumerate(boxes):
+        labels[indices] = label
+    return _weighted_means(pixels, labels, weights)
+
+def octree_palette(pixels: np.ndarray, n_colors: int, sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
+    pixels = np.asarray(pixels, dtype=np.float32).reshape(-1, 3)
+    weights = np.ones(pixels.shape[0]) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    codes = np.clip(np.rint(pixels * 255), 0, 255).astype(np.uint8)
+
+    # The nodes at depth d of the octree are the colors truncated to their d high bits, so a whole level is one
+    # bincount over packed keys instead of a walk down the tree pixel by pixel. Levels are built only as deep as
+    # the splits below reach.
+    def level(depth):
+        return _compact_labels(pack_colors(codes, depth), 1 << (3 * depth))
+
+    labels = np.zeros(pixels.shape[0], dtype=np.intp)
+    node_weights = [np.array([weights.sum()])]
+    # Per level, the children of every node as one array sorted by parent and the offset of each node's run.
+    children = []
+
+    def build_level():
+        nonlocal labels
+        depth = len(children) + 1
+        child_labels = level(depth)
+        parent_of = np.empty(int(child_labels.max()) + 1, dtype=np.intp)
+        parent_of[child_labels] = labels
+        offsets = np.zeros(node_weights[-1].shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(parent_of, minlength=node_weights[-1].shape[0]), out=offsets[1:])
+        children.append((np.argsort(parent_of, kind='stable'), offsets))
+        node_weights.append(np.bincount(child_labels, weights=weights, minlength=parent_of.shape[0]))
+        labels = child_labels
+
+    # Starting from the root, the heaviest leaf is replaced by its children until there are n_colors leaves.
+    # When its children would overshoot, the heaviest ones become leaves and the rest stay merged, so the
+    # palette has exactly min(n_colors, distinct colors) entries. Full-depth nodes are single colors and final.
+    heap = [(-node_weights[0][0], 0, 0)]
+    leaves = []
+    while heap and len(heap) + len(leaves) < n_colors:
+        _, depth, node = heapq.heappop(heap)
+        if depth == 8:
+            leaves.append([(depth, node)])
+            continue
+        if len(children) == depth:
+            build_level()
+        order, offsets = children[depth]
+        nodes = order[offsets[node]:offsets[node + 1]]
+        nodes = nodes[np.argsort(-node_weights[depth + 1][nodes], kind='stable')]
+        room = n_colors - len(heap) - len(leaves)
+        if len(nodes) > room:
+            leaves.append([(depth + 1, int(child)) for child in nodes[room - 1:]])
+            nodes = nodes[:room - 1]
+        for child in nodes:
+            heapq.heappush(heap, (-node_weights[depth + 1][child], depth + 1, int(child)))
+    leaves.extend([(depth, node)] for _, depth, node in heap)
+
+    leaf_labels = [np.full(weights_at_depth.shape[0], -1, dtype=np.intp) for weights_at_depth in node_weights]
+    for label, members in enumerate(leaves):
+        for depth, node in members:
+            leaf_labels[depth][node] = label
+    # Every pixel lies under exactly one leaf; its label is read at the depth of that leaf.
+    pixel_labels = np.full(pixels.shape[0], -1, dtype=np.intp)
+    for depth, depth_labels in enumerate(leaf_labels):
+        if (depth_labels >= 0).any():
+            found = depth_labels[labels if depth == len(children) else level(depth)]
+            pixel_labels = np.where(found >= 0, found, pixel_labels)
+    return _weighted_means(pixels, pixel_labels, weights)
@@ -41,4 +41,12 @@ class ConfigManager:
 
     def set_language(self, language):
         self.config['language'] = language
+        self.save_config()
+
+    def get_palette_backend(self):
+        # Set by hand in ~/.imagemap_config.json; see palette_backends.py for the names.
+        return self.config.get('palette_backend', 'auto')
+
+    def set_palette_backend(self, backend):
+        self.config['palette_backend'] = backend
         self.save_config()
\ No newline at end of file
@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+def scan_directory(path, extensions=None, chunk_size=2048):
+    # Yields lists of (sort key, name, is_dir). DirEntry.is_dir answers from the type readdir already returned,
+    # so listing costs no stat per entry; sizes and dates are read only for the rows that are shown.
+    chunk = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if not is_dir and extensions is not None and not entry.name.lower().endswith(extensions):
+                continue
+            chunk.append((entry.name.lower(), entry.name, is_dir))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+class ListingCache:
+    # Sorted listings of the most recently visited directories. Adding, removing or renaming an entry changes
+    # the directory's mtime, which invalidates its listing.
+    def __init__(self, max_directories=32):
+        self.max_directories = max_directories
+        self.listings = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, extensions=None):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        key = (path, extensions)
+        with self.lock:
+            cached = self.listings.get(key)
+            if cached is None or cached[0] != mtime:
+                return None
+            self.listings.move_to_end(key)
+            return cached[1]
+
+    def put(self, path, mtime, entries, extensions=None):
+        # Listings are filtered by extension, so dialogs filtering differently keep separate entries.
+        key = (path, extensions)
+        with self.lock:
+            self.listings[key] = (mtime, entries)
+            self.listings.move_to_end(key)
+            while len(self.listings) > self.max_directories:
+                self.listings.popitem(last=False)
+
+LISTING_CACHE = ListingCache()
+
+class DirectoryScanner:
+    # Lists one directory at a time on a background thread. Each start() begins a new generation; the thread of
+    # an older one stops at its next chunk, and poll() drops whatever it had already queued.
+    # Messages are (kind, payload): ('chunk', entries), ('done', None) or ('error', exception).
+    def __init__(self, extensions=None, chunk_size=2048, cache=LISTING_CACHE):
+        self.extensions = extensions
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.messages = queue.Queue()
+        self.generation = 0
+
+    def start(self, path):
+        self.generation += 1
+        generation = self.generation
+        cached = self.cache.get(path, self.extensions) if self.cache is not None else None
+        if cached is not None:
+            self.messages.put((generation, 'chunk', cached))
+            self.messages.put((generation, 'done', None))
+        else:
+            threading.Thread(target=self._scan, args=(path, generation), daemon=True).start()
+        return generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                generation, kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                return messages
+            if generation == self.generation:
+                messages.append((kind, payload))
+
+    def _scan(self, path, generation):
+        try:
+            # Taken before the listing, so a change made while it runs leaves a stale entry that never matches.
+            mtime = os.stat(path).st_mtime_ns
+            entries = []
+            for chunk in scan_directory(path, self.extensions, self.chunk_size):
+                if generation != self.generation:
+                    return
+                entries.extend(chunk)
+                self.messages.put((generation, 'chunk', chunk))
+            if self.cache is not None:
+                self.cache.put(path, mtime, sorted(entries), self.extensions)
+            self.messages.put((generation, 'done', None))
+        except OSError as e:
+            self.messages.put((generation, 'error', e))
@@ -3,7 +3,13 @@ import numpy as np
 from sklearn.cluster import MiniBatchKMeans
 from multilingual_support import language_manager
 import logging
+import time
 from typing import Optional
+from palette_index import KDTreePaletteIndex, resolve_nearest_search
+from color_histogram import color_histogram
+from color_quantizers import median_cut_palette, octree_palette
+from palette_backends import get_backend
+from tracing import counter, span
 
 def get_available_devices():
     if not torch.cuda.is_available():
@@ -20,43 +26,137 @@ def get_safe_gpu_memory(device_id: int, safety_factor: float = 0.7) -> int:
     free_mem = total_mem - reserved_mem - allocated_mem
     return int(free_mem * safety_factor)
 
+# Quantizer seeds already sit near the final centers, so Lloyd needs only a few iterations to refine them.
+QUANTIZER_INITS = {'octree': octree_palette, 'median-cut': median_cut_palette}
+KMEANS_INITS = ('random', 'kmeans++') + tuple(QUANTIZER_INITS)
+
+def kmeans_plus_plus(pixels: np.ndarray, n_clusters: int, rng: np.random.Generator,
+                     sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
+    # Each new center is drawn with probability proportional to weight times the squared distance to the
+    # nearest center so far, which spreads the initial centroids over the colors actually present.
+    weights = np.ones(pixels.shape[0]) if sample_weight is None else sample_weight.astype(np.float64)
+    centers = [pixels[rng.choice(pixels.shape[0], p=weights / weights.sum())]]
+    closest = np.sum((pixels - centers[0]) ** 2, axis=1, dtype=np.float64)
+    for _ in range(1, n_clusters):
+        scores = weights * closest
+        total = scores.sum()
+        if total <= 0:
+            # Fewer distinct colors than clusters; the remaining centers repeat colors already chosen.
+            index = rng.choice(pixels.shape[0], p=weights / weights.sum())
+        else:
+            index = rng.choice(pixels.shape[0], p=scores / total)
+        centers.append(pixels[index])
+        np.minimum(closest, np.sum((pixels - pixels[index]) ** 2, axis=1, dtype=np.float64), out=closest)
+    return np.stack(centers)
+
+class PaletteStats:
+    # Filled in by the k-means loops: one entry per iteration, inertia as the weighted sum of squared distances.
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.samples = 0
+        self.inertia = []
+        self.shifts = []
+        self.iteration_seconds = []
+        self.converged = False
+        self.seconds = 0.0
+
+    @property
+    def iterations(self):
+        return len(self.iteration_seconds)
+
+    def record(self, inertia, shift, seconds):
+        self.inertia.append(float(inertia))
+        self.shifts.append(None if shift is None else float(shift))
+        self.iteration_seconds.append(seconds)
+        counter('palette.inertia', inertia=self.inertia[-1])
+
+    def summary(self):
+        text = f"{self.backend}: {self.samples} samples, {self.iterations} iteration(s) in {self.seconds:.2f}s"
+        if self.inertia:
+            text += f", inertia {self.inertia[0]:.4g} -> {self.inertia[-1]:.4g}"
+        return text + (", converged" if self.converged else "")
+
 class CPUKMeans:
-    def __init__(self, n_clusters: int):
+    def __init__(self, n_clusters: int, seed: Optional[int] = None):
         self.n_clusters = n_clusters
         self.kmeans = MiniBatchKMeans(
             n_clusters=n_clusters,
             batch_size=1024,
             n_init=3,
             max_iter=100,
-            compute_labels=False
+            compute_labels=False,
+            random_state=seed
         )
 
-    def fit(self, pixels: np.ndarray, progress_function) -> np.ndarray:
+    def fit(self, pixels: np.ndarray, progress_function, sample_weight: Optional[np.ndarray] = None,
+            stats: Optional[PaletteStats] = None) -> np.ndarray:
         n_samples = len(pixels)
         batch_size = 1024
+        start = time.perf_counter()
         
         for i in range(0, n_samples, batch_size):
             end_idx = min(i + batch_size, n_samples)
             batch = pixels[i:end_idx]
-            self.kmeans.partial_fit(batch)
+            self.kmeans.partial_fit(batch, sample_weight=None if sample_weight is None else sample_weight[i:end_idx])
             
             progress = int(90 * (i / n_samples))
             progress_function(progress)
-            
+
+        if stats is not None:
+            # MiniBatch makes a single pass over the sample, reported as one iteration.
+            inertia = -self.kmeans.score(pixels, sample_weight=sample_weight)
+            stats.record(inertia, None, time.perf_counter() - start)
         return self.kmeans.cluster_centers_
 
-class GPUKMeans:
-    def __init__(self, n_clusters: int, device_id: int):
+def damped_update(centroids: torch.Tensor, sums: torch.Tensor, counts: torch.Tensor, alpha: float = 0.8):
+    # Moves each centroid alpha of the way to the mean of its pixels and returns the largest move.
+    mask = counts > 0
+    means = centroids.clone()
+    means[mask] = sums[mask] / counts[mask, None]
+    # Clusters that lost every pixel keep their centroid; pulling them towards black would keep them
+    # moving and stop the loop from ever seeing the centroids settle.
+    updated = centroids * (1 - alpha) + means * alpha
+    shift = float((updated - centroids).norm(dim=1).max())
+    return updated, shift
+
+class TorchKMeans:
+    max_batch_size = 65536
+
+    def __init__(self, n_clusters: int, device: str = 'cpu', assignment_search: str = 'auto', seed: Optional[int] = None,
+                 init: str = 'random', max_iter: int = 10, tol: float = 1e-4):
+        if init not in KMEANS_INITS:
+            raise ValueError(f"Unknown k-means initialization: {init}")
         self.n_clusters = n_clusters
-        self.device = f'cuda:{device_id}'
-        self.device_id = device_id
+        self.device = device
         self.centroids = None
-        torch.cuda.set_device(device_id)
+        self.assignment_search = assignment_search
+        self.seed = seed
+        self.init = init
+        self.max_iter = max_iter
+        # Largest centroid move, in normalized RGB units, below which the centroids count as settled.
+        self.tol = tol
+
+    def _memory_budget(self) -> int:
+        return 512 * 1024 * 1024
+
+    def _assignment_index(self):
+        if self.assignment_search not in ('auto', 'kdtree', 'exact'):
+            raise ValueError(f"Unknown assignment search: {self.assignment_search}")
+        # The centroids move every iteration, so only the KD-tree is cheap enough to rebuild each time.
+        if resolve_nearest_search(self.assignment_search, self.n_clusters, self.device) == 'kdtree':
+            return KDTreePaletteIndex(self.centroids)
+        return None
 
-    @torch.amp.autocast(device_type='cuda')
     def _calculate_distances(self, batch: torch.Tensor, chunk_size: Optional[int] = None) -> torch.Tensor:
+        # Mixed precision applies to CUDA only; entering a CUDA autocast on a CPU run just warns.
+        if torch.device(self.device).type != 'cuda':
+            return self._distances(batch, chunk_size)
+        with torch.autocast('cuda'):
+            return self._distances(batch, chunk_size)
+
+    def _distances(self, batch: torch.Tensor, chunk_size: Optional[int]) -> torch.Tensor:
         if chunk_size is None:
-            available_mem = get_safe_gpu_memory(self.device_id)
+            available_mem = self._memory_budget()
             elem_size = 4
             chunk_size = available_mem // (self.n_clusters * elem_size * 3)
             chunk_size = min(chunk_size, batch.shape[0])
@@ -82,112 +182,169 @@ class GPUKMeans:
             dot_product = torch.mm(batch, self.centroids.T)
             return chunk_norm + centroid_norm.T - 2 * dot_product
 
-    def fit(self, pixels: np.ndarray, progress_function) -> np.ndarray:
+    def _accumulate(self, batch: torch.Tensor, assignments: torch.Tensor, sums: torch.Tensor, counts: torch.Tensor,
+                    weights: Optional[torch.Tensor] = None):
+        # One scatter-add for every cluster at once, so a batch costs the same whatever n_clusters is.
+        if weights is None:
+            sums.index_add_(0, assignments, batch)
+            counts += torch.bincount(assignments, minlength=self.n_clusters).to(counts.dtype)
+        else:
+            sums.index_add_(0, assignments, batch * weights[:, None])
+            counts.index_add_(0, assignments, weights)
+
+    def initial_centroids(self, pixels: np.ndarray, sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
         n_samples = len(pixels)
-        safe_mem = get_safe_gpu_memory(self.device_id)
-        batch_size = min(8192, safe_mem // (pixels.shape[1] * 4 * 3))
-        
-        if self.centroids is None:
-            idx = np.random.choice(n_samples, self.n_clusters, replace=False)
-            self.centroids = torch.tensor(pixels[idx], device=self.device, dtype=torch.float32)
+        rng = np.random.default_rng(self.seed)
+        if self.init == 'kmeans++':
+            return kmeans_plus_plus(pixels, self.n_clusters, rng, sample_weight)
+        if self.init in QUANTIZER_INITS:
+            initial = QUANTIZER_INITS[self.init](pixels, self.n_clusters, sample_weight)
+            if initial.shape[0] < self.n_clusters:
+                # Fewer distinct colors than clusters; the spare centroids start on random pixels.
+                extra = pixels[rng.choice(n_samples, self.n_clusters - initial.shape[0])]
+                initial = np.concatenate([initial, extra])
+            return initial
+        p = None if sample_weight is None else sample_weight / sample_weight.sum()
+        return pixels[rng.choice(n_samples, self.n_clusters, replace=False, p=p)]
 
-        for iteration in range(10):
-            new_centroids = torch.zeros_like(self.centroids)
-            counts = torch.zeros(self.n_clusters, device=self.device)
-            
-            for start_idx in range(0, n_samples, batch_size):
-                end_idx = min(start_idx + batch_size, n_samples)
-                batch = torch.tensor(pixels[start_idx:end_idx], device=self.device, dtype=torch.float32)
-                
+    def partial_sums(self, pixels: np.ndarray, sample_weight: Optional[np.ndarray] = None, progress_function=None):
+        # The assignment step over one set of pixels: per-centroid sums, counts and the inertia. Shards of a
+        # sharded fit each return these and the caller adds them up, so the result does not depend on the split.
+        n_samples = len(pixels)
+        safe_mem = self._memory_budget()
+        batch_size = min(self.max_batch_size, safe_mem // (pixels.shape[1] * 4 * 3))
+
+        sums = torch.zeros_like(self.centroids)
+        counts = torch.zeros(self.n_clusters, device=self.device)
+        inertia = torch.zeros((), dtype=torch.float64, device=self.device)
+        palette_index = self._assignment_index()
+
+        for start_idx in range(0, n_samples, batch_size):
+            end_idx = min(start_idx + batch_size, n_samples)
+            batch = torch.tensor(pixels[start_idx:end_idx], device=self.device, dtype=torch.float32)
+            weights = None
+            if sample_weight is not None:
+                weights = torch.tensor(sample_weight[start_idx:end_idx], device=self.device, dtype=torch.float32)
+
+            if palette_index is not None:
+                assignments = palette_index.query(batch)
+            else:
                 distances = self._calculate_distances(batch)
                 assignments = torch.argmin(distances, dim=1)
-                
-                for k in range(self.n_clusters):
-                    mask = assignments == k
-                    if mask.any():
-                        new_centroids[k] += batch[mask].sum(dim=0)
-                        counts[k] += mask.sum()
-                
-                del batch, distances, assignments
-                torch.cuda.empty_cache()
-                
-                progress = int(90 * (start_idx / n_samples))
-                progress_function(progress)
+                del distances
 
-            mask = counts > 0
-            new_centroids[mask] /= counts[mask, None]
-            
-            alpha = 0.8
-            self.centroids.mul_(1 - alpha).add_(new_centroids, alpha=alpha)
-            
-            del new_centroids, counts, mask
+            errors = (batch - self.centroids[assignments]).pow(2).sum(dim=1)
+            inertia += (errors if weights is None else errors * weights).sum().double()
+            self._accumulate(batch, assignments, sums, counts, weights)
+
+            del batch, assignments, weights
             torch.cuda.empty_cache()
 
+            if progress_function is not None:
+                progress_function(int(90 * (start_idx / n_samples)))
+
+        del palette_index
+        return sums, counts, inertia.item()
+
+    def fit(self, pixels: np.ndarray, progress_function, sample_weight: Optional[np.ndarray] = None,
+            stats: Optional[PaletteStats] = None) -> np.ndarray:
+        if self.centroids is None:
+            initial = self.initial_centroids(pixels, sample_weight)
+            self.centroids = torch.tensor(initial, device=self.device, dtype=torch.float32)
+
+        for iteration in range(self.max_iter):
+            start = time.perf_counter()
+            sums, counts, inertia = self.partial_sums(pixels, sample_weight, progress_function)
+            self.centroids, shift = damped_update(self.centroids, sums, counts)
+            del sums, counts
+            torch.cuda.empty_cache()
+
+            if stats is not None:
+                stats.record(inertia, shift, time.perf_counter() - start)
+            if shift <= self.tol:
+                logging.info(f"k-means converged after {iteration + 1} iteration(s)")
+                if stats is not None:
+                    stats.converged = True
+                break
+
         result = self.centroids.cpu().numpy()
-        del self.centroids
+        self.centroids = None
         torch.cuda.empty_cache()
         return result
 
-def extract_color_palette(image, number_of_colors, progress_function, number_iterations=10):
+class GPUKMeans(TorchKMeans):
+    max_batch_size = 8192
+
+    def __init__(self, n_clusters: int, device_id: int, assignment_search: str = 'auto', seed: Optional[int] = None,
+                 init: str = 'random', max_iter: int = 10, tol: float = 1e-4):
+        super().__init__(n_clusters, f'cuda:{device_id}', assignment_search, seed, init, max_iter, tol)
+        self.device_id = device_id
+        torch.cuda.set_device(device_id)
+
+    def _memory_budget(self) -> int:
+        return get_safe_gpu_memory(self.device_id)
+
+SAMPLING_MODES = ('random', 'histogram')
+INTEGER_PIXEL_SCALES = {np.dtype(np.uint8): 255.0, np.dtype(np.uint16): 65535.0}
+
+def extract_color_palette(image, number_of_colors, progress_function, number_iterations=10, backend='auto',
+                          seed: Optional[int] = None, sampling: str = 'random', histogram_bits: int = 8,
+                          return_stats: bool = False):
+    start = time.perf_counter()
     print(language_manager.translate("color_palette_processing"))
     progress_function(0)
 
     if isinstance(image, torch.Tensor):
-        pixels = image.cpu().numpy()
-    else:
-        pixels = image.copy()
+        image = image.cpu().numpy()
+
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    palette_backend = get_backend(backend)
+    stats = PaletteStats(backend)
 
-    if pixels.max() > 1.0:
-        pixels = pixels.astype(np.float32) / 255.0
-        
-    pixels = pixels.reshape(-1, 3)
-    
     devices = get_available_devices()
     logging.info(f"Available devices: CPU and {devices['gpu_count']} GPU(s)")
-    
 
-    if devices['gpu_count'] > 0:
-        max_pixels = 200000 if devices['gpu_count'] > 1 else 150000
-    else:
-        max_pixels = 100000
-        
-    if pixels.shape[0] > max_pixels:
-        indices = np.random.choice(pixels.shape[0], max_pixels, replace=False)
-        pixels = pixels[indices]
-
-    if devices['gpu_count'] == 0:
-        logging.info("Using CPU for processing")
-        kmeans = CPUKMeans(number_of_colors)
-        centers = kmeans.fit(pixels, progress_function)
-        
-    elif devices['gpu_count'] == 1:
-        logging.info("Using single GPU for processing")
-        torch.cuda.empty_cache()
-        kmeans = GPUKMeans(number_of_colors, device_id=0)
-        centers = kmeans.fit(pixels, progress_function)
-        
-    else:
-        logging.info("Using multiple GPUs for processing")
-        torch.cuda.empty_cache()
-        
-        split_idx = len(pixels) // 2
-        pixels_gpu0 = pixels[:split_idx]
-        pixels_gpu1 = pixels[split_idx:]
-        
-        n_colors_gpu0 = number_of_colors // 2
-        n_colors_gpu1 = number_of_colors - n_colors_gpu0
-        
-        kmeans_gpu0 = GPUKMeans(n_colors_gpu0, device_id=0)
-        kmeans_gpu1 = GPUKMeans(n_colors_gpu1, device_id=1)
-        
-        centers_gpu0 = kmeans_gpu0.fit(pixels_gpu0, lambda p: progress_function(p // 2))
-        centers_gpu1 = kmeans_gpu1.fit(pixels_gpu1, lambda p: progress_function(50 + p // 2))
-        
-        centers = np.vstack([centers_gpu0, centers_gpu1])
-        
-        final_kmeans = GPUKMeans(number_of_colors, device_id=0)
-        centers = final_kmeans.fit(centers, lambda p: progress_function(90 + p // 10))
+    with span('palette.sample', sampling=sampling) as sample:
+        weights = None
+        if sampling == 'histogram' or palette_backend.full_image:
+            # Every pixel is counted once, grouped by color, instead of clustering a random subsample.
+            pixels, weights = color_histogram(image, histogram_bits)
+            # The histogram comes out sorted by color; shuffled so mini-batches are not slices of one hue range.
+            order = np.random.default_rng(seed).permutation(pixels.shape[0])
+            pixels, weights = pixels[order], weights[order].astype(np.float32)
+            logging.info(f"Clustering {pixels.shape[0]} histogram colors")
+        else:
+            # Integer pixels are subsampled first and only the sample is promoted to float, which avoids a full
+            # copy and a max() scan of the image.
+            pixels = image.reshape(-1, 3)
+            if pixels.dtype in INTEGER_PIXEL_SCALES:
+                value_scale = INTEGER_PIXEL_SCALES[pixels.dtype]
+            else:
+                value_scale = 255.0 if pixels.max() > 1.0 else 1.0
+
+            # Smaller images are shuffled rather than subsampled: in raster order, mini-batches would be strips of
+            # the image and the centers would be seeded from its top rows only.
+            max_pixels = palette_backend.max_pixels(devices)
+            rng = np.random.default_rng(seed)
+            if pixels.shape[0] > max_pixels:
+                pixels = pixels[rng.choice(pixels.shape[0], max_pixels, replace=False)]
+            else:
+                pixels = pixels[rng.permutation(pixels.shape[0])]
 
+            pixels = pixels.astype(np.float32)
+            if value_scale != 1.0:
+                pixels /= value_scale
+        sample.set(samples=pixels.shape[0], bytes=pixels.nbytes)
+
+    if weights is not None and pixels.shape[0] <= number_of_colors:
+        logging.info("The image has no more colors than the palette; using them as is")
+        centers = pixels
+    else:
+        with span('palette.fit', backend=backend, colors=number_of_colors, samples=pixels.shape[0]):
+            centers = palette_backend.fit(pixels, number_of_colors, progress_function, weights, seed, devices,
+                                          max_iter=number_iterations, stats=stats)
+    stats.samples = pixels.shape[0]
 
     brightness = np.mean(centers, axis=1)
     sorted_indices = np.argsort(brightness)
@@ -195,5 +352,9 @@ def extract_color_palette(image, number_of_colors, progress_function, number_ite
 
     progress_function(100)
     print(language_manager.translate("color_palette_done"))
-    
+
+    stats.seconds = time.perf_counter() - start
+    logging.info(f"Palette stats: {stats.summary()}")
+    if return_stats:
+        return sorted_centers.tolist(), stats
     return sorted_centers.tolist()
\ No newline at end of file
@@ -4,19 +4,33 @@ from ttkbootstrap.constants import *
 import ttkbootstrap as ttk
 import os
 from datetime import datetime
-from save_image import save_image
 from multilingual_support import language_manager
+from directory_listing import DirectoryScanner
+from load_image import SUPPORTED_EXTENSIONS
+
+# How often the Tk thread picks up the entries found by the scanner.
+SCAN_POLL_MS = 30
+# Rows drawn before the tree has a size on screen.
+DEFAULT_VISIBLE_ROWS = 30
 
 class FileExplorerDialog(tk.Toplevel):
-    def __init__(self, parent, image_data=None, mode="load"):
+    def __init__(self, parent, image_data=None, mode="load", palette=None):
         super().__init__(parent)
         self.parent = parent
         self.result = None
         self.mode = mode
         self.image_data = image_data
+        self.palette = palette
         self.title(language_manager.translate('select_image') if mode == "load" else language_manager.translate('save_image_as'))
         self.geometry("800x600")
         self.current_path = os.path.expanduser("~")
+        # Only folders and the image formats the application reads are listed; see directory_listing.
+        self.scanner = DirectoryScanner(SUPPORTED_EXTENSIONS)
+        self.entries = []
+        self.details = {}
+        self.top = 0
+        self.selected_name = None
+        self.poll_id = None
         self.create_widgets()
         self.populate_tree(self.current_path)
         self.transient(parent)
@@ -49,39 +63,142 @@ class FileExplorerDialog(tk.Toplevel):
         self.tree.column("size", width=100)
         self.tree.column("type", width=100)
         self.tree.column("modified", width=150)
+        # The tree only ever holds the rows on screen; this scrollbar moves the window over self.entries.
+        self.scrollbar = ttk.Scrollbar(self, orient=VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
         self.tree.pack(expand=True, fill=BOTH)
+        self.row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
 
         self.tree.bind("<Double-1>", self.on_double_click)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<Configure>", lambda event: self.render())
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", self.on_mousewheel)
+        self.tree.bind("<Button-5>", self.on_mousewheel)
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self.move_selection(1))
 
     def populate_tree(self, path):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Returns at once: the listing comes from the cache or from a background scan, and poll_scan adds it to
+        # the view chunk by chunk.
+        self.entries = []
+        self.details = {}
+        self.top = 0
+        self.selected_name = None
+        self.scanner.start(path)
+        self.render()
+        # A cached listing is already queued, so the first poll runs now rather than on the next tick.
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+        self.poll_scan()
 
-        try:
-            items = []
-            for item in os.listdir(path):
-                full_path = os.path.join(path, item)
-                if os.path.exists(full_path):
-                    stats = os.stat(full_path)
-                    file_type = language_manager.translate('file') if os.path.isfile(full_path) else language_manager.translate('folder')
-                    modified = datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    size = f"{stats.st_size / 1024:.2f} {language_manager.translate('kb')}"
-                    items.append((item, size, file_type, modified))
-
-            items.sort(key=lambda x: x[0].lower())
-
-            for item in items:
-                self.tree.insert("", "end", values=item)
-        except PermissionError:
-            messagebox.showerror(language_manager.translate('error_occurred'), language_manager.translate('access_denied'), parent=self)
-        except Exception as e:
-            messagebox.showerror(language_manager.translate('error_occurred'), str(e), parent=self)
+    def poll_scan(self):
+        self.poll_id = None
+        scanning = True
+        added = False
+        for kind, payload in self.scanner.poll():
+            if kind == 'chunk':
+                self.entries.extend(payload)
+                added = True
+            elif kind == 'done':
+                scanning = False
+            else:
+                scanning = False
+                if isinstance(payload, PermissionError):
+                    messagebox.showerror(language_manager.translate('error_occurred'), language_manager.translate('access_denied'), parent=self)
+                else:
+                    messagebox.showerror(language_manager.translate('error_occurred'), str(payload), parent=self)
+        if added:
+            # Entries are (lowercase name, name, is_dir) tuples, so this sorts by name like the previous listing;
+            # the sorted prefix makes each re-sort little more than a merge.
+            self.entries.sort()
+            self.render()
+        if scanning:
+            self.poll_id = self.after(SCAN_POLL_MS, self.poll_scan)
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return DEFAULT_VISIBLE_ROWS
+        # One row is taken by the headings.
+        return max(1, height // self.row_height - 1)
+
+    def render(self):
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, len(self.entries) - rows))
+        end = min(self.top + rows, len(self.entries))
+
+        self.tree.delete(*self.tree.get_children())
+        for index in range(self.top, end):
+            values = self.row_values(self.entries[index])
+            self.tree.insert("", "end", iid=str(index), values=values)
+            if values[0] == self.selected_name:
+                self.tree.selection_set(str(index))
+                self.tree.focus(str(index))
+
+        if self.entries:
+            self.scrollbar.set(self.top / len(self.entries), end / len(self.entries))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def row_values(self, entry):
+        # Size and date are read when a row is first shown, not for every entry of the folder.
+        _, name, is_dir = entry
+        values = self.details.get(name)
+        if values is None:
+            file_type = language_manager.translate('folder') if is_dir else language_manager.translate('file')
+            try:
+                stats = os.stat(os.path.join(self.current_path, name))
+                modified = datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                size = f"{stats.st_size / 1024:.2f} {language_manager.translate('kb')}"
+            except OSError:
+                modified = size = ""
+            values = self.details[name] = (name, size, file_type, modified)
+        return values
+
+    def scroll_to(self, top):
+        self.top = top
+        self.render()
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(value) * len(self.entries)))
+        else:
+            step = self.visible_rows() if unit == 'pages' else 1
+            self.scroll_to(self.top + int(value) * step)
+
+    def on_mousewheel(self, event):
+        direction = -1 if event.num == 4 or getattr(event, 'delta', 0) > 0 else 1
+        self.scroll_to(self.top + 3 * direction)
+        return "break"
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            # Names are read from the entries, not from the row values: ttk turns a name like "0123" into an int.
+            self.selected_name = self.entries[int(selection[0])][1]
+
+    def move_selection(self, step):
+        # The tree holds only the visible rows, so moving past the first or last one scrolls the window.
+        selection = self.tree.selection()
+        index = int(selection[0]) + step if selection else self.top
+        if not self.entries:
+            return "break"
+        index = max(0, min(index, len(self.entries) - 1))
+        self.selected_name = self.entries[index][1]
+        rows = self.visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + rows:
+            self.top = index - rows + 1
+        self.render()
+        return "break"
 
     def on_double_click(self, event):
         selection = self.tree.selection()
         if selection:
             item = selection[0]
-            file_name = self.tree.item(item, "values")[0]
+            file_name = self.entries[int(item)][1]
             file_path = os.path.join(self.current_path, file_name)
             if os.path.isfile(file_path) and self.mode == "load":
                 self.result = file_path
@@ -106,14 +223,16 @@ class FileExplorerDialog(tk.Toplevel):
             self.save_file()
 
     def save_file(self):
+        from save_image import output_path_with_extension, save_image
+
         file_name = self.filename_entry.get()
         if not file_name:
             messagebox.showerror(language_manager.translate('error_occurred'), language_manager.translate('enter_filename'), parent=self)
             return
 
-        full_path = os.path.join(self.current_path, file_name + ".png")
+        full_path = output_path_with_extension(os.path.join(self.current_path, file_name))
         try:
-            save_image(self.image_data, full_path)
+            save_image(self.image_data, full_path, self.palette)
             messagebox.showinfo(language_manager.translate('save_image'), language_manager.translate('image_saved_successfully'), parent=self)
             self.result = full_path
             self.close()
@@ -124,7 +243,7 @@ class FileExplorerDialog(tk.Toplevel):
         selection = self.tree.selection()
         if selection:
             item = selection[0]
-            file_name = self.tree.item(item, "values")[0]
+            file_name = self.entries[int(item)][1]
             file_path = os.path.join(self.current_path, file_name)
             if os.path.isfile(file_path):
                 self.result = file_path
@@ -135,5 +254,9 @@ class FileExplorerDialog(tk.Toplevel):
             messagebox.showinfo(language_manager.translate('error_occurred'), language_manager.translate('select_file'), parent=self)
 
     def close(self):
+        self.scanner.cancel()
+        if self.poll_id is not None:
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
         self.parent.focus_set()
         self.destroy()
\ No newline at end of file
@@ -0,0 +1,30 @@
+import torch
+
+def index_dtype(n_colors: int) -> torch.dtype:
+    if n_colors <= 256:
+        return torch.uint8
+    if n_colors <= 65536:
+        return torch.uint16
+    raise ValueError(f"Palettes of more than 65536 colors cannot be stored as an index map, got {n_colors}")
+
+class IndexedImage:
+    # A remapped image kept as palette indices, uint8 up to 256 colors and uint16 above, with the uint8 palette
+    # they point into: a third of the RGB bytes or less. RGB is a gather through the palette, done on demand.
+    def __init__(self, indices: torch.Tensor, palette: torch.Tensor):
+        self.indices = indices
+        self.palette = palette
+
+    @property
+    def shape(self):
+        return tuple(self.indices.shape) + (3,)
+
+    def to_rgb(self, out=None, rows_per_chunk: int = 256) -> torch.Tensor:
+        # Expanded a few rows at a time, so the int64 indices the gather needs never exist for the whole image.
+        rgb = torch.empty(self.shape, dtype=torch.uint8) if out is None else torch.as_tensor(out)
+        if tuple(rgb.shape) != self.shape or rgb.dtype != torch.uint8:
+            raise ValueError(f"Output buffer must be uint8 of shape {self.shape}, got {rgb.dtype} {tuple(rgb.shape)}")
+        height = self.indices.shape[-2]
+        for start in range(0, height, rows_per_chunk):
+            rows = self.indices[..., start:start + rows_per_chunk, :]
+            rgb[..., start:start + rows_per_chunk, :, :] = self.palette[rows.long()]
+        return rgb
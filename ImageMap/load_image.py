@@ -1,20 +1,71 @@
-import cv2
-import torch
 import logging
-from multilingual_support import LanguageManager
+from multilingual_support import language_manager
+from tracing import span
 
-language_manager = LanguageManager()
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp', '.ppm', '.pgm', '.pnm')
+# Shrink factors OpenCV can decode JPEG files at. libjpeg scales in the DCT, so the smaller image is both cheaper
+# and properly filtered; other formats would be decoded in full and then shrunk with a linear resize.
+REDUCED_DECODE_FACTORS = (8, 4, 2)
+REDUCED_DECODE_EXTENSIONS = ('.jpg', '.jpeg')
 
-def load_image(image_path):
+def image_size(image_path):
+    # Width and height from the file header, without decoding the pixels; None when PIL cannot read it.
     try:
-        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        from PIL import Image
+        with Image.open(image_path) as image:
+            return image.size
+    except Exception:
+        return None
+
+def reduced_decode_factor(image_path, scale):
+    # The largest factor that keeps the decoded image at or above the target size. It must divide both
+    # dimensions, so the decoded size is exact and the remaining resize by scale * factor gives the same
+    # output size as a full decode.
+    if not image_path.lower().endswith(REDUCED_DECODE_EXTENSIONS):
+        return 1
+    size = image_size(image_path)
+    if size is None:
+        return 1
+    width, height = size
+    for factor in REDUCED_DECODE_FACTORS:
+        if factor * scale <= 1 and width % factor == 0 and height % factor == 0:
+            return factor
+    return 1
+
+def load_image(image_path, compact=False, reduction=1):
+    # Imported on the first load, so neither the window nor the batch CLI pays for them at startup.
+    import cv2
+    import numpy as np
+    import torch
+
+    try:
+        # Compact mode keeps the decoded uint8 (or uint16 for 16-bit files) pixels instead of a float32 copy
+        # four times larger; the kernels that need floats promote their own strips.
+        flags = cv2.IMREAD_COLOR | cv2.IMREAD_ANYDEPTH if compact else cv2.IMREAD_COLOR
+        if reduction != 1:
+            # The file is decoded at 1/reduction of its size; see reduced_decode_factor.
+            reduced_flags = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+            if reduction not in reduced_flags:
+                raise ValueError(f"Unsupported decode reduction: {reduction}")
+            flags |= reduced_flags[reduction]
+        with span('load.decode', reduction=reduction) as decode:
+            image = cv2.imread(image_path, flags)
+            if image is not None:
+                decode.set(bytes=image.nbytes, shape=list(image.shape))
         if image is None:
             logging.error("Failed to load image. Image is None.")
             return None
 
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image_tensor = torch.from_numpy(image_rgb).to(device).float() / 255.0
+        with span('load.to_tensor', device=device.type) as to_tensor:
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            if compact and image_rgb.dtype in (np.uint8, np.uint16):
+                image_tensor = torch.from_numpy(image_rgb).to(device)
+            elif compact:
+                image_tensor = torch.from_numpy(image_rgb).to(device).float()
+            else:
+                image_tensor = torch.from_numpy(image_rgb).to(device).float() / 255.0
+            to_tensor.set(bytes=image_tensor.numel() * image_tensor.element_size())
 
         logging.info(language_manager.translate("image_loaded_successfully"))
         print(language_manager.translate("image_loaded_successfully"))
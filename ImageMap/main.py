@@ -1,11 +1,31 @@
-import tkinter as tk
-from ttkbootstrap import Style
+import argparse
 import sys
 import os
-from application import Application
-from multilingual_support import language_manager
+from startup_profile import StartupProfile
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ImageMap desktop application.")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Print the time of each startup phase and of the slowest imports once the window is shown")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = StartupProfile() if args.profile_startup else None
+    if profile is not None:
+        profile.install()
+
+    # Imported here rather than at the top so the profile sees them; torch, scikit-learn and OpenCV are not
+    # imported at all until the first job.
+    import tkinter as tk
+    from ttkbootstrap import Style
+    from multilingual_support import language_manager
+    if profile is not None:
+        profile.mark('tkinter, ttkbootstrap, languages')
+    from application import Application
+    if profile is not None:
+        profile.mark('application modules')
 
-def main():
     print(language_manager.translate('starting_app'))
     print(language_manager.translate('python_version').format(sys.version))
     print(language_manager.translate('current_directory').format(os.getcwd()))
@@ -22,9 +42,20 @@ def main():
     x = (root.winfo_screenwidth() // 2) - (width // 2)
     y = (root.winfo_screenheight() // 2) - (height // 2)
     root.geometry(f'{width}x{height}+{x}+{y}')
+    if profile is not None:
+        profile.mark('Tk root and theme')
 
     app = Application(root)
+    if profile is not None:
+        profile.mark('main window widgets')
+
+        def window_shown():
+            profile.mark('first draw')
+            profile.uninstall()
+            profile.report()
+        root.after_idle(window_shown)
+
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,47 @@
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def _status_kb(field):
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def current_rss():
+    rss = _status_kb('VmRSS')
+    if rss is not None:
+        return rss * 1024
+    return peak_rss()
+
+def peak_rss():
+    peak = _status_kb('VmHWM')
+    if peak is not None:
+        return peak * 1024
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def reset_peak_rss():
+    # Linux lets a process reset its own high-water mark so the peak of a single stage can be measured.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
\ No newline at end of file
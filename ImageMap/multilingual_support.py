@@ -15,22 +15,23 @@ class LanguageManager:
             'de': 'Deutsch'
         }
         self.observers = {}
-        self.load_translations()
+        self.load_translations(self.current_language)
 
-    def load_translations(self):
-        logging.info(f"Current working directory: {os.getcwd()}")
+    def load_translations(self, lang_code):
+        # Only the active language is read: at startup, then once per language the user switches to.
+        if lang_code in self.translations or lang_code not in self.languages:
+            return
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        for lang_code in self.languages.keys():
-            file_path = os.path.join(current_dir, 'languages', f'{lang_code}.json')
-            logging.info(f"Attempting to load translation file: {file_path}")
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    self.translations[lang_code] = json.load(file)
-                    logging.info(f"Successfully loaded translation file for {lang_code}")
-            except FileNotFoundError:
-                logging.warning(f"Warning: Translation file for {lang_code} not found. Full path: {file_path}")
-            except json.JSONDecodeError:
-                logging.error(f"Error: Invalid JSON in translation file for {lang_code}")
+        file_path = os.path.join(current_dir, 'languages', f'{lang_code}.json')
+        self.translations[lang_code] = {}
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                self.translations[lang_code] = json.load(file)
+                logging.info(f"Successfully loaded translation file for {lang_code}")
+        except FileNotFoundError:
+            logging.warning(f"Warning: Translation file for {lang_code} not found. Full path: {file_path}")
+        except json.JSONDecodeError:
+            logging.error(f"Error: Invalid JSON in translation file for {lang_code}")
 
     def get_translated_text(self, key):
         return self.translations.get(self.current_language, {}).get(key, key)
@@ -43,6 +44,7 @@ class LanguageManager:
 
     def set_language(self, lang_code):
         if lang_code in self.languages:
+            self.load_translations(lang_code)
             self.current_language = lang_code
             self.config_manager.set_language(lang_code) 
             self.notify_observers()
@@ -69,4 +71,5 @@ class LanguageManager:
             return translation.format(*args)
         return translation
 
+# The one instance every module shares, so the config file and the translations are read once per process.
 language_manager = LanguageManager()
\ No newline at end of file
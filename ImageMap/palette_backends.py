@@ -0,0 +1,134 @@
+import logging
+import numpy as np
+from typing import Optional
+from color_quantizers import median_cut_palette, octree_palette
+
+# Only numpy is imported here so the batch CLI can list the backends without loading torch and sklearn;
+# the k-means backends import them when they run.
+
+PALETTE_BACKENDS = {}
+
+def register_backend(name):
+    def register(cls):
+        cls.name = name
+        PALETTE_BACKENDS[name] = cls
+        return cls
+    return register
+
+def get_backend(name):
+    if name not in PALETTE_BACKENDS:
+        raise ValueError(f"Unknown palette backend: {name}")
+    return PALETTE_BACKENDS[name]()
+
+class PaletteBackend:
+    # Turns float32 RGB pixels in [0, 1], optionally weighted by pixel counts, into number_of_colors centers.
+    name = None
+    # Backends that are cheap enough per color are given the histogram of the whole image instead of a sample.
+    full_image = False
+
+    def max_pixels(self, devices) -> int:
+        # Random sample sizes that keep ten k-means iterations interactive on a CPU, one GPU or several GPUs.
+        if devices['gpu_count'] > 0:
+            return 200000 if devices['gpu_count'] > 1 else 150000
+        return 100000
+
+    def fit(self, pixels: np.ndarray, number_of_colors: int, progress_function, sample_weight: Optional[np.ndarray] = None,
+            seed: Optional[int] = None, devices=None, max_iter: int = 10, stats=None) -> np.ndarray:
+        raise NotImplementedError
+
+@register_backend('minibatch')
+class MiniBatchBackend(PaletteBackend):
+    # sklearn's MiniBatchKMeans, which already seeds its centers with k-means++.
+    def fit(self, pixels, number_of_colors, progress_function, sample_weight=None, seed=None, devices=None, max_iter=10,
+            stats=None):
+        from extract_color_palette import CPUKMeans
+        logging.info("Using CPU for processing")
+        return CPUKMeans(number_of_colors, seed).fit(pixels, progress_function, sample_weight, stats)
+
+@register_backend('lloyd')
+class LloydBackend(PaletteBackend):
+    init = 'random'
+
+    def fit(self, pixels, number_of_colors, progress_function, sample_weight=None, seed=None, devices=None, max_iter=10,
+            stats=None):
+        import torch
+        from extract_color_palette import GPUKMeans, TorchKMeans
+        from sharded_kmeans import ShardedKMeans
+        gpu_count = 0 if devices is None else devices['gpu_count']
+
+        if gpu_count == 0:
+            logging.info("Using CPU for processing with torch Lloyd k-means")
+            kmeans = TorchKMeans(number_of_colors, device='cpu', seed=seed, init=self.init, max_iter=max_iter)
+            return kmeans.fit(pixels, progress_function, sample_weight, stats)
+
+        torch.cuda.empty_cache()
+        if gpu_count == 1:
+            logging.info("Using single GPU for processing")
+            kmeans = GPUKMeans(number_of_colors, device_id=0, seed=seed, init=self.init, max_iter=max_iter)
+            return kmeans.fit(pixels, progress_function, sample_weight, stats)
+
+        logging.info("Using multiple GPUs for processing")
+        kmeans = ShardedKMeans(number_of_colors, devices=[f'cuda:{i}' for i in range(gpu_count)], seed=seed, init=self.init,
+                               max_iter=max_iter)
+        return kmeans.fit(pixels, progress_function, sample_weight, stats)
+
+@register_backend('lloyd++')
+class SeededLloydBackend(LloydBackend):
+    init = 'kmeans++'
+
+@register_backend('lloyd-sharded')
+class ShardedLloydBackend(PaletteBackend):
+    # Lloyd split over every GPU, or over CPU worker processes on a machine without one.
+    init = 'kmeans++'
+    workers = None
+
+    def fit(self, pixels, number_of_colors, progress_function, sample_weight=None, seed=None, devices=None, max_iter=10,
+            stats=None):
+        from sharded_kmeans import ShardedKMeans
+        gpu_count = 0 if devices is None else devices['gpu_count']
+        cuda_devices = [f'cuda:{i}' for i in range(gpu_count)] or None
+        kmeans = ShardedKMeans(number_of_colors, devices=cuda_devices, workers=self.workers, seed=seed, init=self.init,
+                               max_iter=max_iter)
+        return kmeans.fit(pixels, progress_function, sample_weight, stats)
+
+@register_backend('octree-lloyd')
+class OctreeLloydBackend(LloydBackend):
+    init = 'octree'
+
+@register_backend('median-cut-lloyd')
+class MedianCutLloydBackend(LloydBackend):
+    init = 'median-cut'
+
+@register_backend('auto')
+class AutoBackend(PaletteBackend):
+    # MiniBatch on a CPU-only machine, torch Lloyd as soon as a GPU is available.
+    def _resolve(self, devices):
+        return MiniBatchBackend() if devices is None or devices['gpu_count'] == 0 else LloydBackend()
+
+    def max_pixels(self, devices):
+        return self._resolve(devices).max_pixels(devices)
+
+    def fit(self, pixels, number_of_colors, progress_function, sample_weight=None, seed=None, devices=None, max_iter=10,
+            stats=None):
+        return self._resolve(devices).fit(pixels, number_of_colors, progress_function, sample_weight, seed, devices,
+                                          max_iter, stats)
+
+class QuantizerBackend(PaletteBackend):
+    # One bincount pass builds the histogram and the quantizer never iterates, so every pixel is used.
+    full_image = True
+    quantize = None
+
+    def fit(self, pixels, number_of_colors, progress_function, sample_weight=None, seed=None, devices=None, max_iter=10,
+            stats=None):
+        logging.info(f"Using {self.name} quantization")
+        centers = self.quantize(pixels, number_of_colors, sample_weight)
+        progress_function(90)
+        return centers
+
+@register_backend('median-cut')
+class MedianCutBackend(QuantizerBackend):
+    quantize = staticmethod(median_cut_palette)
+
+@register_backend('octree')
+class OctreeBackend(QuantizerBackend):
+    quantize = staticmethod(octree_palette)
\ No newline at end of file
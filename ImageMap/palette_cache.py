@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.imagemap_cache', 'palettes')
+# Bumped whenever the palette extraction changes in a way that makes stored palettes stale.
+CACHE_VERSION = 2
+
+def content_hasher(shape, dtype):
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(json.dumps([list(shape), np.dtype(dtype).str]).encode('ascii'))
+    return hasher
+
+def image_digest(image):
+    if hasattr(image, 'cpu'):
+        image = image.cpu().numpy()
+    image = np.ascontiguousarray(image)
+    hasher = content_hasher(image.shape, image.dtype)
+    hasher.update(memoryview(image.reshape(-1)).cast('B'))
+    return hasher.hexdigest()
+
+def file_digest(path, chunk_bytes=1 << 20):
+    # Hashes the encoded file, which is much cheaper than decoding it when only a change check is needed.
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def fingerprint(digest, **params):
+    description = json.dumps({'version': CACHE_VERSION, 'image': digest, **params}, sort_keys=True)
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=20).hexdigest()
+
+def palette_key(digest, number_of_colors, **params):
+    return fingerprint(digest, colors=number_of_colors, **params)
+
+class PaletteCache:
+    # Palettes are a few kilobytes, so a small in-memory LRU sits in front of a size-bounded directory
+    # of JSON files that is shared between runs and between batch worker processes.
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_memory_entries=64, max_disk_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, palette):
+        self.memory[key] = palette
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                palette = json.load(f)
+            # The modification time is the recency used for eviction.
+            os.utime(path)
+            return palette
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable palette cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key, palette):
+        if not self.directory:
+            return
+        path = self._path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(palette, f)
+            os.replace(temporary, path)
+            self._evict_disk()
+        except OSError as e:
+            logging.warning(f"Could not write palette cache entry {path}: {e}")
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self.lock:
+            palette = self.memory.get(key)
+            if palette is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return palette
+
+            palette = self._read_disk(key)
+            if palette is not None:
+                self._remember(key, palette)
+                self.hits += 1
+                self.disk_hits += 1
+                return palette
+
+            self.misses += 1
+            return None
+
+    def put(self, key, palette):
+        palette = [[float(value) for value in color] for color in palette]
+        with self.lock:
+            self._remember(key, palette)
+            self._write_disk(key, palette)
+
+    def get_or_compute(self, key, compute):
+        palette = self.get(key)
+        if palette is None:
+            palette = compute()
+            self.put(key, palette)
+        return palette
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits, 'hit_rate': self.hit_rate}
\ No newline at end of file
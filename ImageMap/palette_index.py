@@ -0,0 +1,218 @@
+import torch
+import numpy as np
+from typing import Optional
+
+NEAREST_SEARCH_MODES = ('auto', 'lut', 'kdtree', 'exact')
+# Below this many colors, or this many pixels, a plain cdist over the palette is cheaper than
+# building and probing the LUT.
+LUT_MIN_COLORS = 32
+LUT_MIN_PIXELS = 4_000_000
+# From this many colors a KD-tree query beats both the N x K distance matrix and the LUT's crowded cells.
+KDTREE_MIN_COLORS = 1024
+
+# Extra gap, in normalized RGB units, a cell needs between its two nearest palette colors before the LUT
+# answer is trusted. It absorbs the rounding of torch.cdist's matmul path, whose squared distances are only
+# accurate to about 1e-6, so pixels the exact search could decide either way are always refined.
+LUT_MARGIN = 4e-3
+
+def find_nearest_neighbor_batch(block: torch.Tensor, palette: torch.Tensor, batch_size: int = 1000) -> torch.Tensor:
+    n_pixels = block.shape[0]
+    n_colors = palette.shape[0]
+    min_indices = torch.zeros(n_pixels, dtype=torch.long, device=block.device)
+    min_distances = torch.full((n_pixels,), float('inf'), device=block.device)
+
+    for i in range(0, n_pixels, batch_size):
+        pixel_batch = block[i:i + batch_size]
+        distances = torch.cdist(pixel_batch, palette)
+        batch_min_distances, batch_indices = torch.min(distances, dim=1)
+
+        min_distances[i:i + batch_size] = batch_min_distances
+        min_indices[i:i + batch_size] = batch_indices
+
+        if i % (batch_size * 10) == 0:
+            torch.cuda.empty_cache()
+
+    return min_indices
+
+def first_occurrences(palette: torch.Tensor):
+    unique_colors, inverse = torch.unique(palette, dim=0, return_inverse=True)
+    first = torch.full((unique_colors.shape[0],), palette.shape[0], dtype=torch.long, device=palette.device)
+    first.scatter_reduce_(0, inverse, torch.arange(palette.shape[0], device=palette.device), reduce='amin')
+    return unique_colors, first
+
+class PaletteLUT:
+    # 64^3 cells keep the table and its candidate lists near 12 MB; each added bit multiplies that by eight.
+    def __init__(self, palette: torch.Tensor, bits: int = 6, exact: bool = True, max_candidates: int = 8,
+                 chunk_size: int = 16384):
+        self.palette = palette
+        self.bits = bits
+        self.levels = 1 << bits
+        self.exact = exact
+        self.chunk_size = chunk_size
+        # Duplicate palette entries would make every cell around them look tied, so the table is built
+        # on the distinct colors and mapped back to the first index, which is what torch.min returns.
+        self.colors, self.first_index = first_occurrences(palette.float())
+
+        # Cells are filled in lazily: a photograph only touches a small fraction of the RGB cube, so
+        # only the cells its pixels land in pay for a distance computation against the palette.
+        device = palette.device
+        n_cells = self.levels ** 3
+        self.width = min(max_candidates, self.colors.shape[0])
+        self.table = torch.empty(n_cells, dtype=torch.long, device=device)
+        self.candidates = torch.empty((n_cells, self.width), dtype=torch.int32, device=device)
+        self.candidate_counts = torch.empty(n_cells, dtype=torch.int32, device=device)
+        self.built = torch.zeros(n_cells, dtype=torch.bool, device=device)
+
+    def _build_cells(self, cells):
+        levels = self.levels
+        cell_size = 1.0 / levels
+        half_diagonal = (3 ** 0.5) * cell_size / 2
+
+        for start in range(0, cells.shape[0], self.chunk_size):
+            chunk = cells[start:start + self.chunk_size]
+            centers = torch.stack([chunk // (levels * levels), (chunk // levels) % levels, chunk % levels], dim=1)
+            centers = (centers.float() + 0.5) * cell_size
+            distances = torch.cdist(centers, self.colors)
+            nearest, order = torch.topk(distances, self.width, dim=1, largest=False)
+
+            # Every pixel of the cell lies within half_diagonal of its center, so only colors whose distance
+            # to the center is within 2 * half_diagonal of the nearest one can win anywhere in the cell.
+            reach = nearest[:, :1] + 2 * half_diagonal + LUT_MARGIN
+            counts = (distances <= reach).sum(dim=1)
+
+            self.table[chunk] = self.first_index[order[:, 0]]
+            self.candidates[chunk] = order.int()
+            # Cells with more contenders than fit in the candidate list fall back to the full search.
+            self.candidate_counts[chunk] = torch.where(counts > self.width, self.width + 1, counts).int()
+
+        self.built[cells] = True
+
+    def _ensure_built(self, keys):
+        missing = keys[~self.built[keys]]
+        if missing.numel() == 0:
+            return
+        pending = torch.zeros_like(self.built)
+        pending[missing] = True
+        self._build_cells(pending.nonzero().squeeze(1))
+
+    @property
+    def ambiguous_fraction(self):
+        built = self.built.sum().item()
+        if built == 0:
+            return 0.0
+        return ((self.candidate_counts > 1) & self.built).sum().item() / built
+
+    def cell_keys(self, pixels: torch.Tensor):
+        cells = (pixels * self.levels).floor().long()
+        inside = ((cells >= 0) & (cells < self.levels)).all(dim=1)
+        cells = cells.clamp(0, self.levels - 1)
+        keys = (cells[:, 0] * self.levels + cells[:, 1]) * self.levels + cells[:, 2]
+        return keys, inside
+
+    def _refine(self, pixels, keys, width, chunk_size=262144):
+        indices = torch.empty(pixels.shape[0], dtype=torch.long, device=pixels.device)
+        unresolved = torch.zeros(pixels.shape[0], dtype=torch.bool, device=pixels.device)
+        slots = torch.arange(width, device=pixels.device)
+
+        for start in range(0, pixels.shape[0], chunk_size):
+            end = min(start + chunk_size, pixels.shape[0])
+            counts = self.candidate_counts[keys[start:end]]
+            candidates = self.candidates[keys[start:end], :width].long()
+
+            distances = ((pixels[start:end, None, :] - self.colors[candidates]) ** 2).sum(dim=2)
+            distances[slots[None, :] >= counts[:, None]] = float('inf')
+            nearest, order = torch.topk(distances, 2, dim=1, largest=False)
+
+            indices[start:end] = self.first_index[candidates.gather(1, order[:, :1]).squeeze(1)]
+            # Near-ties are decided by the rounding of torch.cdist, so they are left to the exact search.
+            unresolved[start:end] = nearest[:, 1] - nearest[:, 0] <= LUT_MARGIN ** 2
+
+        return indices, unresolved
+
+    def query(self, pixels: torch.Tensor) -> torch.Tensor:
+        pixels = pixels.to(self.palette.device)
+        keys, inside = self.cell_keys(pixels)
+        self._ensure_built(keys)
+        indices = self.table[keys]
+
+        if self.exact and self.colors.shape[0] > 1:
+            counts = self.candidate_counts[keys]
+            # Bicubic overshoot leaves some pixels outside [0, 1]; they and the pixels of crowded cells
+            # go straight to the exact search.
+            full = ~inside | (counts > self.width)
+
+            # Most ambiguous cells sit on a boundary between two or three colors, so pixels are refined in
+            # groups of similar candidate counts instead of always comparing max_candidates colors.
+            low = 1
+            while low < self.width:
+                width = min(2 * low, self.width)
+                refine = ~full & (counts > low) & (counts <= width)
+                if refine.any():
+                    refined, unresolved = self._refine(pixels[refine], keys[refine], width)
+                    indices[refine] = refined
+                    full[refine] = unresolved
+                low = width
+
+            if full.any():
+                indices[full] = find_nearest_neighbor_batch(pixels[full], self.palette)
+
+        return indices
+
+class ExactPaletteIndex:
+    def __init__(self, palette: torch.Tensor):
+        self.palette = palette
+
+    def query(self, pixels: torch.Tensor) -> torch.Tensor:
+        return find_nearest_neighbor_batch(pixels.to(self.palette.device), self.palette)
+
+class KDTreePaletteIndex:
+    def __init__(self, palette: torch.Tensor, leaf_size: int = 16, chunk_size: int = 1 << 20):
+        from sklearn.neighbors import KDTree
+
+        self.palette = palette
+        self.chunk_size = chunk_size
+        self.colors, self.first_index = first_occurrences(palette.float())
+        self.first_index = self.first_index.cpu().numpy()
+        self.tree = KDTree(self.colors.cpu().numpy().astype(np.float64), leaf_size=leaf_size)
+
+    def query(self, pixels: torch.Tensor) -> torch.Tensor:
+        device = pixels.device
+        pixels = pixels.detach().float().cpu()
+        k = min(2, self.colors.shape[0])
+        indices = np.empty(pixels.shape[0], dtype=np.int64)
+        unresolved = np.zeros(pixels.shape[0], dtype=bool)
+
+        for start in range(0, pixels.shape[0], self.chunk_size):
+            end = min(start + self.chunk_size, pixels.shape[0])
+            distances, order = self.tree.query(pixels[start:end].numpy().astype(np.float64), k=k)
+            indices[start:end] = self.first_index[order[:, 0]]
+            if k == 2:
+                # The tree works in float64 while torch.cdist rounds in float32, so near-ties are
+                # settled by the exact search to return the same index as torch.min.
+                unresolved[start:end] = distances[:, 1] ** 2 - distances[:, 0] ** 2 <= LUT_MARGIN ** 2
+
+        indices = torch.from_numpy(indices)
+        if unresolved.any():
+            unresolved = torch.from_numpy(unresolved)
+            indices[unresolved] = find_nearest_neighbor_batch(pixels[unresolved], self.palette.float().cpu())
+        return indices.to(device)
+
+def resolve_nearest_search(mode: str, n_colors: int, device, n_pixels: Optional[int] = None) -> str:
+    if mode not in NEAREST_SEARCH_MODES:
+        raise ValueError(f"Unknown nearest search mode: {mode}")
+    if mode != 'auto':
+        return mode
+    # The tree lives on the host; on a GPU the brute-force and LUT paths stay on the device.
+    if n_colors >= KDTREE_MIN_COLORS and torch.device(device).type == 'cpu':
+        return 'kdtree'
+    if n_colors < LUT_MIN_COLORS or (n_pixels is not None and n_pixels < LUT_MIN_PIXELS):
+        return 'exact'
+    return 'lut'
+
+def build_palette_index(palette: torch.Tensor, mode: str = 'auto', n_pixels: Optional[int] = None):
+    mode = resolve_nearest_search(mode, palette.shape[0], palette.device, n_pixels)
+    if mode == 'lut':
+        return PaletteLUT(palette)
+    if mode == 'kdtree':
+        return KDTreePaletteIndex(palette)
+    return ExactPaletteIndex(palette)
\ No newline at end of file
@@ -1,16 +1,63 @@
+import logging
+import threading
 import tkinter as tk
 
 class Redirect:
-    def __init__(self, widget):
+    # Buffered sink for the text_output widget. write() only queues the text, from any thread; the Tk thread
+    # drains the queue once per frame with a single insert and keeps the last max_lines lines in the widget.
+    # Every complete line is also passed once to the imagemap.console logger.
+    def __init__(self, widget, max_lines=2000, interval_ms=33, logger=None):
         self.widget = widget
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.logger = logger or logging.getLogger('imagemap.console')
+        self.lock = threading.Lock()
+        self.pending = []
+        self.partial = ''
+        # Set while a line is being logged, so a handler that writes to stdout cannot loop back into the sink.
+        self.logging = threading.local()
+        self.widget.after(self.interval_ms, self._flush)
 
     def write(self, text):
-        self.widget.after(0, self._write, text)
+        if not text or getattr(self.logging, 'active', False):
+            return len(text)
+        with self.lock:
+            self.pending.append(text)
+            lines = (self.partial + text).split('\n')
+            self.partial = lines.pop()
+        self.logging.active = True
+        try:
+            for line in lines:
+                if line.strip():
+                    self.logger.info(line)
+        finally:
+            self.logging.active = False
+        return len(text)
 
-    def _write(self, text):
+    def write_line(self, message):
+        self.write(message if message.endswith('\n') else message + '\n')
+
+    def _flush(self):
+        with self.lock:
+            text = ''.join(self.pending)
+            self.pending = []
+        try:
+            if text:
+                self._insert(text)
+            self.widget.after(self.interval_ms, self._flush)
+        except tk.TclError:
+            # The window was destroyed; nothing is left to write to.
+            pass
+
+    def _insert(self, text):
+        lines = text.split('\n')
+        if len(lines) > self.max_lines:
+            text = '\n'.join(lines[-self.max_lines:])
         self.widget.insert(tk.END, text)
+        line_count = int(self.widget.index('end-1c').split('.')[0])
+        if line_count > self.max_lines:
+            self.widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')
         self.widget.see(tk.END)
-        self.widget.update_idletasks()
 
     def flush(self):
-        pass
\ No newline at end of file
+        pass
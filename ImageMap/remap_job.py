@@ -0,0 +1,108 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+
+CHECKPOINT_SUFFIX = '.partial.npy'
+
+class JobCancelled(Exception):
+    pass
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+class StripCheckpoint:
+    # The output is written straight into an .npy memmap, and a JSON sidecar records how many strips of it are
+    # final. The sidecar is replaced atomically after the memmap is flushed, so a crash never marks a strip done
+    # that did not reach the disk. Without resume, a checkpoint left over from an earlier run is overwritten.
+    def __init__(self, path, shape, settings, dtype=np.uint8, resume=True):
+        self.path = path
+        self.state_path = path + '.json'
+        self.shape = list(shape)
+        self.settings = settings
+        self.done_strips = 0
+
+        state = self._read_state() if resume else None
+        if state is not None and state.get('shape') == self.shape and state.get('settings') == settings \
+                and os.path.exists(path):
+            self.buffer = np.load(path, mmap_mode='r+')
+            self.done_strips = state['done_strips']
+            logging.info(f"Resuming {path} after {self.done_strips} finished strip(s)")
+        else:
+            self.buffer = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+            self._write_state()
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self):
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'shape': self.shape, 'settings': self.settings, 'done_strips': self.done_strips}, f)
+        os.replace(temporary, self.state_path)
+
+    def commit(self, done_strips):
+        self.buffer.flush()
+        self.done_strips = done_strips
+        self._write_state()
+
+    def remove(self):
+        self.buffer = None
+        for path in (self.state_path, self.path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class RemapJob:
+    # Cancellation is cooperative: the token is checked every time the pipeline reports progress, which
+    # happens after each k-means batch and each remapped block.
+    def __init__(self, checkpoint_path=None, keep_output=False, resume=True):
+        self.token = CancellationToken()
+        self.checkpoint_path = checkpoint_path
+        self.resume = resume
+        # With keep_output the result stays backed by the checkpoint memmap until finish() is called, so a
+        # large image can be encoded from the file without ever being copied into RAM.
+        self.keep_output = keep_output
+        self.checkpoint = None
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def progress(self, progress_function):
+        def report(progress):
+            self.token.check()
+            progress_function(progress)
+        return report
+
+    def open_checkpoint(self, shape, settings, dtype=np.uint8):
+        if self.checkpoint_path is None:
+            return None
+        self.checkpoint = StripCheckpoint(self.checkpoint_path, shape, settings, dtype, self.resume)
+        return self.checkpoint
+
+    def finish(self):
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+            self.checkpoint = None
\ No newline at end of file
@@ -4,108 +4,185 @@ import logging
 from multilingual_support import language_manager
 import gc
 import numpy as np
+from palette_index import build_palette_index, resolve_nearest_search
+from palette_cache import image_digest
+from remap_job import JobCancelled
+from indexed_image import IndexedImage, index_dtype
+from tracing import TRACER, span
+
+INTEGER_PIXEL_SCALES = {torch.uint8: 255.0, torch.uint16: 65535.0}
+
+def strip_source_range(start_h: int, end_h: int, scale: float, h: int):
+    src_start_h = int(start_h / scale)
+    src_end_h = min(h, int(np.ceil(end_h / scale)))
+    return src_start_h, src_end_h
+
+def resize_strip(source: torch.Tensor, size) -> torch.Tensor:
+    return F.interpolate(
+        source.permute(0, 3, 1, 2),
+        size=size,
+        mode='bicubic',
+        align_corners=False
+    ).permute(0, 2, 3, 1)
+
+def prepare_source(image: torch.Tensor):
+    if image.dim() == 3:
+        image = image.unsqueeze(0)
+
+    b, h, w, c = image.shape
+    if h == 0 or w == 0:
+        raise ValueError(f"Invalid image dimensions: {image.shape}")
+
+    # Compact uint8/uint16 images stay integer and each strip is promoted to float just before its resize.
+    if image.dtype in INTEGER_PIXEL_SCALES:
+        value_scale = INTEGER_PIXEL_SCALES[image.dtype]
+    else:
+        image = image.float()
+        value_scale = 255.0 if image.max() > 1.0 else 1.0
+    return image, value_scale
+
+def prepare_palette(palette: torch.Tensor, device: torch.device):
+    palette = palette.float().to(device)
+    if palette.max() > 1.0:
+        palette = palette.float() / 255.0
+    palette_uint8 = (palette * 255).round().clamp(0, 255).byte()
+    return palette, palette_uint8
+
+def remap_strips(image: torch.Tensor, value_scale: float, scale: float, palette_index, palette_uint8: torch.Tensor,
+                 block_size: int, block_width: int, start_strip: int = 0, indexed: bool = False):
+    # Blocks come out as uint8 RGB, or with indexed as palette indices cast on the device, so only one or two
+    # bytes per pixel are copied back and no per-block gather runs.
+    b, h, w, c = image.shape
+    dtype = index_dtype(palette_uint8.shape[0]) if indexed else None
+    new_h = max(1, int(h * scale))
+    new_w = max(1, int(w * scale))
+    strip_height = min(block_size, new_h)
+    num_strips = (new_h - 1) // strip_height + 1
+
+    for strip_idx in range(start_strip, num_strips):
+        start_h = strip_idx * strip_height
+        end_h = min((strip_idx + 1) * strip_height, new_h)
+
+        src_start_h, src_end_h = strip_source_range(start_h, end_h, scale, h)
+
+        if src_end_h <= src_start_h:
+            continue
+
+        with span('remap.interpolate', strip=strip_idx, rows=end_h - start_h):
+            source = image[:, src_start_h:src_end_h, :, :].float()
+            if value_scale != 1.0:
+                source = source / value_scale
+            strip = resize_strip(source, (end_h - start_h, new_w))
+            del source
+            # CUDA kernels run asynchronously; without the wait their time would land in the first copy back.
+            if TRACER.enabled and strip.is_cuda:
+                torch.cuda.synchronize()
+
+        for x in range(0, new_w, block_width):
+            block_w = min(block_width, new_w - x)
+
+            block = strip[:, :, x:x+block_w, :]
+            pixels = block.reshape(-1, 3)
+
+            with span('remap.nearest', strip=strip_idx, x=x) as nearest:
+                indices = palette_index.query(pixels)
+                if indexed:
+                    block = indices.to(dtype).reshape(block.shape[:3]).cpu()
+                else:
+                    block = palette_uint8[indices].reshape(block.shape).cpu()
+                nearest.set(bytes=block.numel() * block.element_size())
+            yield strip_idx, start_h, end_h, x, block
 
-def find_nearest_neighbor_batch(block: torch.Tensor, palette: torch.Tensor, batch_size: int = 1000) -> torch.Tensor:
-    n_pixels = block.shape[0]
-    n_colors = palette.shape[0]
-    min_indices = torch.zeros(n_pixels, dtype=torch.long, device=block.device)
-    min_distances = torch.full((n_pixels,), float('inf'), device=block.device)
-    
-    for i in range(0, n_pixels, batch_size):
-        pixel_batch = block[i:i + batch_size]
-        distances = torch.cdist(pixel_batch, palette)
-        batch_min_distances, batch_indices = torch.min(distances, dim=1)
-        
-        min_distances[i:i + batch_size] = batch_min_distances
-        min_indices[i:i + batch_size] = batch_indices
-        
-        if i % (batch_size * 10) == 0:
             torch.cuda.empty_cache()
-    
-    return min_indices
 
 def resize_and_remap_image_impl(image: torch.Tensor, scale: float, palette: torch.Tensor, 
-                              block_size: int, device: torch.device, progress_function) -> torch.Tensor:
+                              block_size: int, device: torch.device, progress_function,
+                              nearest_search: str = 'auto', job=None, out=None, indexed: bool = False):
     try:
+        if job is not None:
+            progress_function = job.progress(progress_function)
+
         torch.cuda.empty_cache()
         gc.collect()
         
-        if image.dim() == 3:
-            image = image.unsqueeze(0)
-        
+        image, value_scale = prepare_source(image)
         b, h, w, c = image.shape
-        if h == 0 or w == 0:
-            raise ValueError(f"Invalid image dimensions: {image.shape}")
             
         new_h = max(1, int(h * scale))
         new_w = max(1, int(w * scale))
         
         print(f"Original size: {h}x{w}, New size: {new_h}x{new_w}")
         
-        image = image.float()
-        if image.max() > 1.0:
-            image = image / 255.0
-            
-        palette = palette.to(image.dtype).to(device)
-        if palette.max() > 1.0:
-            palette = palette.float() / 255.0
+        palette, palette_uint8 = prepare_palette(palette, device)
+
+        nearest_search = resolve_nearest_search(nearest_search, palette.shape[0], device, b * new_h * new_w)
+        palette_index = build_palette_index(palette, nearest_search)
+        # Only the brute-force search materializes a pixels x colors matrix, so the other indexes
+        # answer a whole strip at once instead of block by block.
+        block_width = block_size if nearest_search == 'exact' else new_w
 
-        remapped_image = torch.empty((b, new_h, new_w, 3), dtype=torch.uint8, device='cpu')
+        # An index map has no channel axis and one or two bytes per pixel.
+        shape = (b, new_h, new_w) if indexed else (b, new_h, new_w, 3)
+        dtype = index_dtype(palette.shape[0]) if indexed else torch.uint8
+        numpy_dtype = np.dtype(np.uint16 if dtype == torch.uint16 else np.uint8)
+
+        checkpoint = None
+        if job is not None and job.checkpoint_path is not None:
+            # Anything that changes the output invalidates the checkpoint, so a stale one is never resumed.
+            settings = {'image': image_digest(image), 'scale': scale, 'block_size': block_size,
+                        'search': nearest_search, 'palette': palette_uint8.cpu().tolist()}
+            if indexed:
+                settings['indexed'] = True
+            checkpoint = job.open_checkpoint(shape, settings, numpy_dtype)
+            remapped_image = torch.from_numpy(checkpoint.buffer)
+        elif out is not None:
+            # Blocks are written straight into the caller's array, typically a numpy.memmap, never into RAM first.
+            if tuple(out.shape) not in (shape, shape[1:]) or out.dtype != numpy_dtype:
+                raise ValueError(f"Output buffer must be {numpy_dtype} of shape {shape[1:]}, got {out.dtype} {out.shape}")
+            remapped_image = torch.from_numpy(out).view(shape)
+        else:
+            remapped_image = torch.empty(shape, dtype=dtype, device='cpu')
         
         progress_function(51)
         print(language_manager.translate('resizing_image'))
         
-        strip_height = min(block_size, new_h)
-        num_strips = (new_h - 1) // strip_height + 1
-        
-        for strip_idx in range(num_strips):
-            start_h = strip_idx * strip_height
-            end_h = min((strip_idx + 1) * strip_height, new_h)
-            
-            src_start_h = int(start_h / scale)
-            src_end_h = min(h, int(np.ceil(end_h / scale)))
-            
-            if src_end_h <= src_start_h:
-                continue
-                
-            strip = F.interpolate(
-                image[:, src_start_h:src_end_h, :, :].permute(0, 3, 1, 2),
-                size=(end_h - start_h, new_w),
-                mode='bicubic',
-                align_corners=False
-            ).permute(0, 2, 3, 1)
-            
-            for x in range(0, new_w, block_size):
-                block_w = min(block_size, new_w - x)
-                
-                block = strip[:, :, x:x+block_w, :]
-                pixels = block.reshape(-1, 3)
-                
-                indices = find_nearest_neighbor_batch(pixels, palette)
-                remapped_pixels = palette[indices]
-                remapped_block = remapped_pixels.reshape(block.shape)
-                
-                block_uint8 = (remapped_block * 255).round().clamp(0, 255).cpu().byte()
-                remapped_image[:, start_h:end_h, x:x+block_w, :] = block_uint8
-                
-                progress = 51 + int(49 * ((strip_idx * new_w + x) / (new_h * new_w)))
-                progress_function(progress)
-                if progress % 10 == 0:
-                    print(language_manager.translate('remapping_progress').format(progress))
-                
-                torch.cuda.empty_cache()
+        start_strip = checkpoint.done_strips if checkpoint is not None else 0
+        last_printed = None
+        for strip_idx, start_h, end_h, x, block in remap_strips(image, value_scale, scale, palette_index, palette_uint8,
+                                                                block_size, block_width, start_strip, indexed):
+            remapped_image[:, start_h:end_h, x:x + block.shape[2]] = block
+            if checkpoint is not None and x + block.shape[2] == new_w:
+                checkpoint.commit(strip_idx + 1)
+
+            progress = 51 + int(49 * ((strip_idx * new_w + x) / (new_h * new_w)))
+            progress_function(progress)
+            # Printed once per ten percent, not once for every block that lands on the same value.
+            if progress % 10 == 0 and progress != last_printed:
+                print(language_manager.translate('remapping_progress').format(progress))
+                last_printed = progress
                 
+        if checkpoint is not None and not job.keep_output:
+            # The finished image is handed back in memory and the checkpoint files are dropped.
+            remapped_image = remapped_image.clone()
+            checkpoint.remove()
+
         if b == 1:
             remapped_image = remapped_image.squeeze(0)
-            
+
+        if indexed:
+            return IndexedImage(remapped_image, palette_uint8.cpu())
         return remapped_image
         
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"{language_manager.translate('error_occurred')}: {e}")
         logging.error(f"{language_manager.translate('error_occurred')}: {e}", exc_info=True)
         raise e
 
-def resize_and_remap_image(image, scale: float, palette: torch.Tensor, block_size: int, progress_function) -> torch.Tensor:
+def resize_and_remap_image(image, scale: float, palette: torch.Tensor, block_size: int, progress_function,
+                           nearest_search: str = 'auto', job=None, out=None, indexed: bool = False):
+    # Returns the uint8 RGB image, or with indexed an IndexedImage: the index map and the uint8 palette.
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     
     if device.type == 'cuda':
@@ -116,10 +193,14 @@ def resize_and_remap_image(image, scale: float, palette: torch.Tensor, block_siz
     logging.info(language_manager.translate('image_scaled'))
     
     try:
-        result = resize_and_remap_image_impl(image_tensor, scale, palette, block_size, device, progress_function)
+        result = resize_and_remap_image_impl(image_tensor, scale, palette, block_size, device, progress_function, nearest_search,
+                                             job, out, indexed)
         print(language_manager.translate('image_ready'))
         logging.info(language_manager.translate('image_ready'))
         return result
+    except JobCancelled:
+        logging.info("Resize and remap cancelled")
+        raise
     except Exception as e:
         print(f"Error during image resize and remap: {e}")
         logging.error(f"Error during image resize and remap: {e}", exc_info=True)
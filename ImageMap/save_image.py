@@ -1,29 +1,75 @@
+import os
 import cv2
 import numpy as np
 import torch
 import logging
 from multilingual_support import language_manager
+from indexed_image import IndexedImage
+from strip_writer import INDEXED_EXTENSIONS, STREAMING_EXTENSIONS, write_image_in_strips
+from tracing import span
 
-def save_image(image, output_path):
+# From this size the output is encoded strip by strip instead of through a full BGR copy.
+STREAMING_SAVE_BYTES = 256 * 1024 * 1024
+# Formats the save dialog keeps as typed; any other name gets .png appended.
+SAVE_EXTENSIONS = ('.png', '.tif', '.tiff', '.jpg', '.jpeg', '.webp', '.bmp', '.ppm')
+
+def output_path_with_extension(output_path):
+    if os.path.splitext(output_path)[1].lower() in SAVE_EXTENSIONS:
+        return output_path
+    return output_path + '.png'
+
+def save_image(image, output_path, palette=None):
     try:
-        save_image_to_path(image, output_path)
+        save_image_to_path(image, output_path, palette=palette)
         logging.info(language_manager.translate('image_saved'))
         print(language_manager.translate('image_saved'))
     except Exception as e:
         logging.error(f"Failed to save image: {e}", exc_info=True)
         print(f"Failed to save image: {e}")
 
-def save_image_to_path(image, output_path):
-    if isinstance(image, torch.Tensor):
-        image = image.cpu().numpy()
+def save_image_to_path(image, output_path, streaming=None, palette=None, **options):
+    # With a palette of at most 256 colors, PNG and TIFF are written indexed. options are the encoder knobs of
+    # strip_writer.open_strip_writer; passing any of them also selects the strip encoders.
+    extension = os.path.splitext(output_path)[1].lower()
+    with span('save.encode', format=extension) as encode:
+        if isinstance(image, IndexedImage):
+            # The index map goes to the indexed encoders as is; other formats get the RGB expansion.
+            if extension in INDEXED_EXTENSIONS and image.palette.shape[0] <= 256 and image.indices.dim() == 2:
+                encode.set(indexed=True, bytes=image.indices.numel() * image.indices.element_size())
+                write_image_in_strips(image.indices.numpy(), output_path, palette=image.palette.numpy(),
+                                      **{name: value for name, value in options.items() if value is not None})
+                return
+            image = image.to_rgb()
+            palette = None
+
+        if isinstance(image, torch.Tensor):
+            image = image.cpu().numpy()
+        if isinstance(palette, torch.Tensor):
+            palette = palette.cpu().numpy()
+
+        if not isinstance(image, np.ndarray):
+            raise TypeError("Image must be a numpy array or a torch tensor")
 
-    if not isinstance(image, np.ndarray):
-        raise TypeError("Image must be a numpy array or a torch tensor")
+        options = {name: value for name, value in options.items() if value is not None}
+        encode.set(bytes=image.nbytes)
+        rgb_uint8 = image.dtype == np.uint8 and image.ndim == 3 and image.shape[2] == 3
+        if palette is not None and not (rgb_uint8 and extension in INDEXED_EXTENSIONS and len(palette) <= 256):
+            palette = None
+        if streaming is None:
+            # OpenCV cannot write .npy, so that format always goes through the strip writer.
+            streaming = (palette is not None or bool(options) or extension == '.npy'
+                         or image.nbytes >= STREAMING_SAVE_BYTES)
+        # Asked for or not, strips apply only where a strip encoder exists for the pixels and the format.
+        streaming = streaming and rgb_uint8 and extension in STREAMING_EXTENSIONS
+        if streaming:
+            write_image_in_strips(image, output_path, palette=palette, **options)
+            return
 
-    if image.dtype != np.uint8:
-        image = (image * 255).astype(np.uint8)
+        if image.dtype not in (np.uint8, np.uint16):
+            image = (image * 255).astype(np.uint8)
 
-    if len(image.shape) == 3 and image.shape[2] == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        if len(image.shape) == 3 and image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
 
-    cv2.imwrite(output_path, image)
\ No newline at end of file
+        if not cv2.imwrite(output_path, image):
+            raise IOError(f"Failed to write image: {output_path}")
\ No newline at end of file
@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+import numpy as np
+import torch
+from extract_color_palette import GPUKMeans, PaletteStats, TorchKMeans, damped_update
+
+def _shard_kmeans(n_clusters: int, device: str) -> TorchKMeans:
+    if device.startswith('cuda'):
+        return GPUKMeans(n_clusters, int(device.split(':')[1]))
+    return TorchKMeans(n_clusters, device)
+
+class _ThreadShards:
+    # One thread per device: torch releases the GIL while its kernels run, so every device works at once.
+    def __init__(self, shards, n_clusters: int, devices: Sequence[str]):
+        self.workers = [(_shard_kmeans(n_clusters, device), pixels, weights)
+                        for device, (pixels, weights) in zip(devices, shards)]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.workers))
+
+    def _run(self, worker, centroids):
+        kmeans, pixels, weights = worker
+        kmeans.centroids = centroids.to(kmeans.device)
+        sums, counts, inertia = kmeans.partial_sums(pixels, weights)
+        return sums.cpu(), counts.cpu(), inertia
+
+    def step(self, centroids: torch.Tensor):
+        return list(self.executor.map(lambda worker: self._run(worker, centroids), self.workers))
+
+    def close(self):
+        self.executor.shutdown()
+
+def _shard_process(connection, pixels, weights, n_clusters, threads):
+    torch.set_num_threads(threads)
+    kmeans = TorchKMeans(n_clusters, 'cpu')
+    try:
+        while True:
+            centroids = connection.recv()
+            if centroids is None:
+                break
+            kmeans.centroids = torch.from_numpy(centroids)
+            sums, counts, inertia = kmeans.partial_sums(pixels, weights)
+            connection.send((sums.numpy(), counts.numpy(), inertia))
+    except Exception as e:
+        try:
+            connection.send(e)
+        except OSError:
+            pass
+    finally:
+        connection.close()
+
+class _ProcessShards:
+    # CPU shards live in their own processes for the whole fit; only the K centroids and the K partial sums
+    # cross the pipes each iteration.
+    def __init__(self, shards, n_clusters: int, start_method: str = 'spawn'):
+        context = multiprocessing.get_context(start_method)
+        threads = max(1, (os.cpu_count() or 1) // len(shards))
+        self.connections = []
+        self.processes = []
+        for pixels, weights in shards:
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_process, args=(child, pixels, weights, n_clusters, threads))
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def step(self, centroids: torch.Tensor):
+        array = centroids.numpy()
+        # Every shard gets its centroids before any result is read, so they all run concurrently.
+        for connection in self.connections:
+            connection.send(array)
+        partials = []
+        for connection in self.connections:
+            result = connection.recv()
+            if isinstance(result, Exception):
+                raise result
+            sums, counts, inertia = result
+            partials.append((torch.from_numpy(sums), torch.from_numpy(counts), inertia))
+        return partials
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+class ShardedKMeans:
+    # Data-parallel Lloyd k-means: the pixels are split into shards, every shard assigns its pixels to the same
+    # K centroids and returns partial sums and counts, and the partials are added up before each update.
+    # With devices it runs one thread per GPU; without, `workers` CPU processes.
+    def __init__(self, n_clusters: int, devices: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+                 seed: Optional[int] = None, init: str = 'random', max_iter: int = 10, tol: float = 1e-4,
+                 start_method: str = 'spawn'):
+        self.n_clusters = n_clusters
+        self.devices = list(devices) if devices else None
+        self.workers = len(self.devices) if self.devices else (workers or min(4, os.cpu_count() or 1))
+        self.seed = seed
+        self.init = init
+        self.max_iter = max_iter
+        self.tol = tol
+        self.start_method = start_method
+
+    def _open_shards(self, pixels: np.ndarray, sample_weight: Optional[np.ndarray]):
+        bounds = np.linspace(0, len(pixels), self.workers + 1).astype(int)
+        shards = [(pixels[start:end], None if sample_weight is None else sample_weight[start:end])
+                  for start, end in zip(bounds[:-1], bounds[1:])]
+        if self.devices:
+            return _ThreadShards(shards, self.n_clusters, self.devices)
+        return _ProcessShards(shards, self.n_clusters, self.start_method)
+
+    def fit(self, pixels: np.ndarray, progress_function, sample_weight: Optional[np.ndarray] = None,
+            stats: Optional[PaletteStats] = None) -> np.ndarray:
+        seeder = TorchKMeans(self.n_clusters, 'cpu', seed=self.seed, init=self.init)
+        centroids = torch.tensor(seeder.initial_centroids(pixels, sample_weight), dtype=torch.float32)
+        logging.info(f"Sharded k-means over {self.workers} {'device' if self.devices else 'process'} shard(s)")
+
+        shards = self._open_shards(pixels, sample_weight)
+        try:
+            for iteration in range(self.max_iter):
+                start = time.perf_counter()
+                partials = shards.step(centroids)
+                # Added up in shard order, so a seeded fit gives the same palette on every run.
+                sums = sum(partial[0] for partial in partials)
+                counts = sum(partial[1] for partial in partials)
+                inertia = sum(partial[2] for partial in partials)
+                centroids, shift = damped_update(centroids, sums, counts)
+                progress_function(int(90 * (iteration + 1) / self.max_iter))
+
+                if stats is not None:
+                    stats.record(inertia, shift, time.perf_counter() - start)
+                if shift <= self.tol:
+                    logging.info(f"k-means converged after {iteration + 1} iteration(s)")
+                    if stats is not None:
+                        stats.converged = True
+                    break
+        finally:
+            shards.close()
+        return centroids.numpy()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import builtins
+import sys
+import time
+
+# Modules that should only be imported by the first job; the report says which ones are already loaded.
+HEAVY_MODULES = ('torch', 'sklearn', 'cv2', 'PIL', 'numpy')
+
+class StartupProfile:
+    # Records the duration of each startup phase and, while installed, the inclusive time of every first import
+    # made in the top max_depth levels, so a slow import shows up by name under the module that pulled it in.
+    def __init__(self, max_depth=3, min_seconds=0.002):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+        self.imports = []
+        self.max_depth = max_depth
+        self.min_seconds = min_seconds
+        self.depth = 0
+        self.original_import = None
+
+    def install(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if self.depth >= self.max_depth or level != 0 or name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        # A slot is taken before the import runs, so a module is listed ahead of the ones it imports.
+        position = len(self.imports)
+        self.imports.append(None)
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.depth -= 1
+            self.imports[position] = (self.depth, name, time.perf_counter() - start)
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self, file=None):
+        file = file or sys.__stdout__
+        print("Startup profile:", file=file)
+        for phase, seconds in self.phases:
+            print(f"  {phase:<32} {seconds * 1000:8.1f} ms", file=file)
+        print(f"  {'total':<32} {(self.last - self.start) * 1000:8.1f} ms", file=file)
+
+        print(f"Imports over {self.min_seconds * 1000:g} ms (inclusive):", file=file)
+        for depth, name, seconds in filter(None, self.imports):
+            if seconds >= self.min_seconds:
+                print(f"  {'  ' * depth}{name:<{32 - 2 * depth}} {seconds * 1000:8.1f} ms", file=file)
+
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(f"Heavy modules loaded: {', '.join(loaded) if loaded else 'none'}", file=file)
+        file.flush()
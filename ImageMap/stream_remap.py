@@ -0,0 +1,176 @@
+import logging
+import numpy as np
+import torch
+from multilingual_support import language_manager
+from extract_color_palette import extract_color_palette
+from palette_cache import content_hasher, palette_key
+from palette_index import build_palette_index, resolve_nearest_search
+from resize_and_remap_image import prepare_palette, prepare_source, remap_strips, resize_strip, strip_source_range
+from strip_reader import open_strip_reader
+from strip_writer import PaletteRows, encoder_options, open_output_writer, open_strip_writer
+from tracing import TRACER, span
+
+# Working memory allowed for one strip: the float32 source rows, their bicubic resize and the output rows.
+DEFAULT_STRIP_MEMORY = 256 * 1024 * 1024
+
+def rows_per_read(width, memory_budget):
+    return int(max(1, min(1024, memory_budget // (width * 3 * 4))))
+
+def streaming_strip_height(width, new_w, scale, block_size, memory_budget):
+    # float32 source rows plus the contiguous copy interpolate makes of them, and the resized float rows.
+    source_row_bytes = width * 3 * 4 * 2
+    output_row_bytes = new_w * 3 * 4 * 2
+    bytes_per_output_row = source_row_bytes / scale + output_row_bytes
+    return int(max(1, min(block_size, memory_budget // bytes_per_output_row)))
+
+def sample_pixels(reader, max_pixels, memory_budget, rng, hasher=None):
+    total = reader.height * reader.width
+    step = rows_per_read(reader.width, memory_budget)
+    samples = []
+
+    # One pass over the file, taking from every band a share of the sample proportional to its size.
+    # The same pass feeds the content hash used as the palette cache key.
+    for start in range(0, reader.height, step):
+        rows = reader.read_rows(start, start + step)
+        if hasher is not None:
+            hasher.update(memoryview(np.ascontiguousarray(rows).reshape(-1)).cast('B'))
+        rows = rows.reshape(-1, 3)
+        if total <= max_pixels:
+            samples.append(rows.copy())
+            continue
+        count = int(round(max_pixels * rows.shape[0] / total))
+        if count > 0:
+            samples.append(rows[rng.choice(rows.shape[0], count, replace=False)])
+
+    return np.concatenate(samples).astype(np.float32) / 255.0
+
+def stream_resize_and_remap(input_path, output_path, scale, number_of_colors, progress_function,
+                            block_size=512, palette=None, max_sample_pixels=100000,
+                            memory_budget=DEFAULT_STRIP_MEMORY, nearest_search='auto', timings=None,
+                            palette_cache=None, seed=None, backend='auto', encoding=None):
+    timings = {} if timings is None else timings
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    with open_strip_reader(input_path) as reader:
+        h, w = reader.height, reader.width
+        new_h = max(1, int(h * scale))
+        new_w = max(1, int(w * scale))
+        print(f"Original size: {h}x{w}, New size: {new_h}x{new_w}")
+
+        if palette is None:
+            with span('load', timings, path=input_path, bytes=h * w * 3):
+                hasher = content_hasher((h, w, 3), np.uint8) if palette_cache is not None else None
+                sample = sample_pixels(reader, max_sample_pixels, memory_budget, np.random.default_rng(seed), hasher)
+
+            with span('palette', timings, colors=number_of_colors):
+                compute = lambda: extract_color_palette(sample, number_of_colors, lambda p: progress_function(p // 2),
+                                                        backend=backend, seed=seed)
+                if palette_cache is None:
+                    palette_list = compute()
+                else:
+                    # A seeded palette depends on how the pixels were sampled, so it is not shared with the
+                    # in-memory path.
+                    params = {} if seed is None else {'seed': seed, 'sampler': 'strips'}
+                    if backend != 'auto':
+                        params['backend'] = backend
+                    key = palette_key(hasher.hexdigest(), number_of_colors, **params)
+                    palette_list = palette_cache.get_or_compute(key, compute)
+                palette = torch.tensor(palette_list, dtype=torch.float32)
+
+        with span('remap', timings, scale=scale):
+            palette = palette.float().to(device)
+            if palette.max() > 1.0:
+                palette = palette / 255.0
+            palette_uint8 = (palette * 255).round().clamp(0, 255).byte()
+            palette_index = build_palette_index(palette, nearest_search, new_h * new_w)
+
+            progress_function(51)
+            print(language_manager.translate('resizing_image'))
+
+            strip_height = streaming_strip_height(w, new_w, scale, block_size, memory_budget)
+            logging.info(f"Streaming {input_path} in strips of {strip_height} output rows")
+
+            with open_strip_writer(output_path, new_w, new_h,
+                                   **encoder_options(encoding, palette_uint8.cpu().numpy())) as writer:
+                indexed = isinstance(writer, PaletteRows)
+                for start_h in range(0, new_h, strip_height):
+                    end_h = min(start_h + strip_height, new_h)
+                    src_start_h, src_end_h = strip_source_range(start_h, end_h, scale, h)
+                    src_end_h = max(src_end_h, src_start_h + 1)
+
+                    with span('stream.read', rows=src_end_h - src_start_h, bytes=(src_end_h - src_start_h) * w * 3):
+                        source = reader.read_rows(src_start_h, src_end_h)
+                    with span('remap.interpolate', rows=end_h - start_h):
+                        source = torch.from_numpy(source).to(device).unsqueeze(0).float() / 255.0
+                        strip = resize_strip(source, (end_h - start_h, new_w))
+                        del source
+                        if TRACER.enabled and strip.is_cuda:
+                            torch.cuda.synchronize()
+
+                    with span('remap.nearest', rows=end_h - start_h, bytes=(end_h - start_h) * new_w * 3):
+                        indices = palette_index.query(strip.reshape(-1, 3))
+                        if indexed:
+                            rows = indices.to(torch.uint8).reshape(end_h - start_h, new_w).cpu().numpy()
+                        else:
+                            rows = palette_uint8[indices].reshape(end_h - start_h, new_w, 3).cpu().numpy()
+                    writer.write_rows(rows)
+                    del strip, indices, rows
+
+                    progress_function(51 + int(49 * end_h / new_h))
+
+    progress_function(100)
+    print(language_manager.translate('image_ready'))
+    return palette.cpu(), (new_h, new_w)
+
+def multiscale_resize_and_remap(image, scales, palette, output_paths, progress_function, block_size=512,
+                                nearest_search='auto', timings=None, encoding=None):
+    # One normalized source and one palette index serve every scale; each output is written strip by strip.
+    timings = {} if timings is None else timings
+    if len(scales) != len(output_paths):
+        raise ValueError("Expected one output path per scale")
+
+    with span('remap', timings, scales=list(scales)):
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        image, value_scale = prepare_source(torch.as_tensor(image, device=device))
+        if image.shape[0] != 1:
+            raise ValueError("Multi-scale remap works on a single image")
+        h, w = image.shape[1:3]
+
+        sizes = [(max(1, int(h * scale)), max(1, int(w * scale))) for scale in scales]
+        total_pixels = sum(new_h * new_w for new_h, new_w in sizes)
+
+        palette, palette_uint8 = prepare_palette(palette, device)
+        nearest_search = resolve_nearest_search(nearest_search, palette.shape[0], device, max(a * b for a, b in sizes))
+        palette_index = build_palette_index(palette, nearest_search)
+
+        progress_function(51)
+        print(language_manager.translate('resizing_image'))
+
+        # Largest scale first, so a lookup table is filled by the output that touches the most of it.
+        done_pixels = 0
+        for position in sorted(range(len(scales)), key=lambda i: -sizes[i][0] * sizes[i][1]):
+            new_h, new_w = sizes[position]
+            print(f"Original size: {h}x{w}, New size: {new_h}x{new_w}")
+            block_width = block_size if nearest_search == 'exact' else new_w
+
+            with open_output_writer(output_paths[position], new_w, new_h,
+                                    **encoder_options(encoding, palette_uint8.cpu().numpy())) as writer:
+                # Indexed writers take the index blocks as they come out of the remap.
+                indexed = isinstance(writer, PaletteRows)
+                for _, start_h, end_h, x, block in remap_strips(image, value_scale, scales[position], palette_index,
+                                                                palette_uint8, block_size, block_width, indexed=indexed):
+                    if block_width == new_w:
+                        writer.write_rows(block[0].numpy())
+                    else:
+                        # The exact search answers narrow blocks; rows are written once the strip is complete.
+                        if x == 0:
+                            rows = np.empty((end_h - start_h, new_w) + tuple(block.shape[3:]), dtype=np.uint8)
+                        rows[:, x:x + block.shape[2]] = block[0].numpy()
+                        if x + block.shape[2] == new_w:
+                            writer.write_rows(rows)
+                    progress_function(51 + int(49 * (done_pixels + end_h * new_w) / total_pixels))
+            done_pixels += new_h * new_w
+
+    progress_function(100)
+    print(language_manager.translate('image_ready'))
+    return sizes
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import logging
+import cv2
+import numpy as np
+
+NETPBM_EXTENSIONS = ('.ppm', '.pgm', '.pnm')
+
+class RawStripReader:
+    # Rows are read with plain file reads rather than a memory map, so pages of rows that were already
+    # processed do not stay resident and peak memory is bounded by the size of one strip.
+    def __init__(self, path, offset, height, width, channels):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.offset = offset
+        self.height = height
+        self.width = width
+        self.channels = channels
+        self.row_bytes = width * channels
+
+    def read_rows(self, start, end):
+        end = min(end, self.height)
+        self.file.seek(self.offset + start * self.row_bytes)
+        rows = np.fromfile(self.file, dtype=np.uint8, count=(end - start) * self.row_bytes)
+        rows = rows.reshape(end - start, self.width, self.channels)
+        if self.channels == 1:
+            rows = np.repeat(rows, 3, axis=2)
+        return rows
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class NpyStripReader(RawStripReader):
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+
+        if dtype != np.uint8 or fortran_order or len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] != 3):
+            raise ValueError(f"Streaming needs a C-ordered uint8 HxW or HxWx3 array: {path}")
+        super().__init__(path, offset, shape[0], shape[1], 1 if len(shape) == 2 else 3)
+
+class NetpbmStripReader(RawStripReader):
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic = f.read(2)
+            if magic not in (b'P5', b'P6'):
+                raise ValueError(f"Only binary PGM/PPM files can be streamed: {path}")
+            width, height, maxval = (int(token) for token in self._read_tokens(f, 3))
+            offset = f.tell()
+
+        if maxval > 255:
+            raise ValueError(f"Only 8-bit PGM/PPM files can be streamed: {path}")
+        super().__init__(path, offset, height, width, 3 if magic == b'P6' else 1)
+
+    @staticmethod
+    def _read_tokens(f, count):
+        tokens = []
+        token = b''
+        while len(tokens) < count:
+            char = f.read(1)
+            if not char:
+                raise ValueError("Truncated PGM/PPM header")
+            if char == b'#':
+                f.readline()
+            elif char.isspace():
+                if token:
+                    tokens.append(token)
+                    token = b''
+            else:
+                token += char
+        return tokens
+
+class DecodedStripReader:
+    # Compressed formats cannot be read a strip at a time with OpenCV, so the file is decoded once
+    # as uint8 and strips are served from it. Memory is then bounded by the 8-bit image, not by a strip.
+    def __init__(self, path):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Failed to load image: {path}")
+        logging.warning(f"{os.path.basename(path)} cannot be read in strips; decoding it in full")
+        self.image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self.height, self.width = self.image.shape[:2]
+
+    def read_rows(self, start, end):
+        return self.image[start:end]
+
+    def close(self):
+        self.image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_strip_reader(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return NpyStripReader(path)
+    if extension in NETPBM_EXTENSIONS:
+        return NetpbmStripReader(path)
+    return DecodedStripReader(path)
\ No newline at end of file
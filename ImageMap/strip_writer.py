@@ -0,0 +1,413 @@
+import os
+import struct
+import zlib
+import numpy as np
+from color_histogram import pack_colors
+from tracing import span
+
+STREAMING_EXTENSIONS = ('.png', '.ppm', '.npy', '.tif', '.tiff')
+INDEXED_EXTENSIONS = ('.png', '.tif', '.tiff')
+
+# PNG filter type of every scanline; adaptive picks none, sub or up row by row.
+PNG_FILTERS = {'none': 0, 'sub': 1, 'up': 2, 'adaptive': None}
+DEFLATE_STRATEGIES = {'default': zlib.Z_DEFAULT_STRATEGY, 'filtered': zlib.Z_FILTERED, 'rle': zlib.Z_RLE,
+                      'huffman': zlib.Z_HUFFMAN_ONLY}
+PNG_OPTIONS = ('compression_level', 'filter_type', 'strategy')
+TIFF_OPTIONS = ('compression_level', 'filter_type', 'tile_size')
+
+def filter_scanlines(data, previous, bytes_per_pixel, filter_type):
+    # data holds n raw scanlines and previous the one above the first (zeros at the top of the image).
+    # uint8 arithmetic wraps around, which is the modulo 256 the filters are defined with.
+    if filter_type == 'adaptive':
+        candidates = np.stack([filter_scanlines(data, previous, bytes_per_pixel, name) for name in ('none', 'sub', 'up')])
+        # The usual heuristic: the smallest sum of the filtered bytes read as signed values.
+        scores = np.abs(candidates[:, :, 1:].view(np.int8).astype(np.int16)).sum(axis=2)
+        return candidates[scores.argmin(axis=0), np.arange(data.shape[0])]
+
+    out = np.empty((data.shape[0], data.shape[1] + 1), dtype=np.uint8)
+    out[:, 0] = PNG_FILTERS[filter_type]
+    if filter_type == 'none':
+        out[:, 1:] = data
+    elif filter_type == 'sub':
+        out[:, 1:1 + bytes_per_pixel] = data[:, :bytes_per_pixel]
+        np.subtract(data[:, bytes_per_pixel:], data[:, :-bytes_per_pixel], out=out[:, 1 + bytes_per_pixel:])
+    else:
+        np.subtract(data[:1], previous, out=out[:1, 1:])
+        np.subtract(data[1:], data[:-1], out=out[1:, 1:])
+    return out
+
+def pack_indices(rows, bit_depth):
+    if bit_depth == 8:
+        return rows
+    per_byte = 8 // bit_depth
+    padded = np.zeros((rows.shape[0], -(-rows.shape[1] // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :rows.shape[1]] = rows
+    padded = padded.reshape(rows.shape[0], -1, per_byte)
+    packed = np.zeros(padded.shape[:2], dtype=np.uint8)
+    for position in range(per_byte):
+        # The leftmost pixel goes in the most significant bits.
+        packed |= padded[:, :, position] << np.uint8(8 - bit_depth * (position + 1))
+    return packed
+
+def palette_to_uint8(palette):
+    # Same rounding as prepare_palette in the remap, so every remapped color is found in the palette again.
+    palette = np.asarray(palette)
+    if palette.dtype != np.uint8:
+        palette = palette.astype(np.float32)
+        if palette.max() <= 1.0:
+            palette = palette * 255
+        palette = np.clip(np.round(palette), 0, 255).astype(np.uint8)
+    return palette.reshape(-1, 3)
+
+class StripWriter:
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.file = open(path, 'wb')
+
+    def write_rows(self, rows):
+        rows = self._prepare_rows(rows)
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("More rows written than the image height")
+        with span('save.strip', rows=rows.shape[0], bytes=rows.nbytes):
+            self._write_rows(rows)
+        self.rows_written += rows.shape[0]
+
+    def _prepare_rows(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=np.uint8)
+        if rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"Expected rows of shape (n, {self.width}, 3), got {rows.shape}")
+        return rows
+
+    def _write_rows(self, rows):
+        self.file.write(rows.tobytes())
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"Only {self.rows_written} of {self.height} rows were written to {self.path}")
+            self._finish()
+        finally:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.file.close()
+            self.file = None
+            return
+        self.close()
+
+class PaletteRows:
+    # Indexed writers take rows of palette indices (n x width), or RGB rows whose colors are looked up in the
+    # palette through their packed keys.
+    def set_palette(self, palette):
+        self.palette = palette_to_uint8(palette)
+        if not 1 <= len(self.palette) <= 256:
+            raise ValueError(f"Indexed output needs 1 to 256 palette colors, got {len(self.palette)}")
+        keys = pack_colors(self.palette)
+        self.order = np.argsort(keys, kind='stable').astype(np.uint8)
+        self.sorted_keys = keys[self.order]
+
+    def _prepare_rows(self, rows):
+        rows = np.asarray(rows)
+        if rows.ndim == 3:
+            rows = super()._prepare_rows(rows)
+            keys = pack_colors(rows.reshape(-1, 3))
+            positions = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+            if not np.array_equal(self.sorted_keys[positions], keys):
+                raise ValueError(f"Rows written to {self.path} contain colors that are not in its palette")
+            return self.order[positions].reshape(rows.shape[:2])
+        if rows.shape[1:] != (self.width,):
+            raise ValueError(f"Expected index rows of shape (n, {self.width}), got {rows.shape}")
+        if rows.size and rows.max() >= len(self.palette):
+            raise ValueError(f"Palette index {rows.max()} out of range for {len(self.palette)} colors")
+        return np.ascontiguousarray(rows, dtype=np.uint8)
+
+class PPMStripWriter(StripWriter):
+    def __init__(self, path, width, height):
+        super().__init__(path, width, height)
+        self.file.write(f"P6\n{width} {height}\n255\n".encode('ascii'))
+
+class NpyStripWriter(StripWriter):
+    def __init__(self, path, width, height):
+        super().__init__(path, width, height)
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint8)), 'fortran_order': False,
+                  'shape': (height, width, 3)}
+        np.lib.format.write_array_header_1_0(self.file, header)
+
+class PNGStripWriter(StripWriter):
+    # Rows are deflated as they arrive and flushed in IDAT chunks, so the encoder never holds the full image.
+    color_type = 2
+    bit_depth = 8
+
+    def __init__(self, path, width, height, compression_level=1, filter_type='none', strategy='default',
+                 chunk_bytes=1 << 20):
+        if filter_type not in PNG_FILTERS:
+            raise ValueError(f"Unknown PNG filter {filter_type!r}, expected one of {', '.join(PNG_FILTERS)}")
+        if strategy not in DEFLATE_STRATEGIES:
+            raise ValueError(f"Unknown deflate strategy {strategy!r}, expected one of {', '.join(DEFLATE_STRATEGIES)}")
+        super().__init__(path, width, height)
+        self.compressor = zlib.compressobj(compression_level, zlib.DEFLATED, zlib.MAX_WBITS, 8,
+                                           DEFLATE_STRATEGIES[strategy])
+        self.filter_type = filter_type
+        self.chunk_bytes = chunk_bytes
+        self.pending = []
+        self.pending_bytes = 0
+        self.previous = None
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, self.bit_depth, self.color_type, 0, 0, 0))
+        self._write_header_chunks()
+
+    def _write_header_chunks(self):
+        pass
+
+    def _write_chunk(self, tag, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(tag)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xffffffff))
+
+    def _queue(self, data):
+        if data:
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+        if self.pending_bytes >= self.chunk_bytes:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self.pending:
+            self._write_chunk(b'IDAT', b''.join(self.pending))
+            self.pending = []
+            self.pending_bytes = 0
+
+    def _scanline_bytes(self, rows):
+        return rows.reshape(rows.shape[0], -1), 3
+
+    def _write_rows(self, rows):
+        data, bytes_per_pixel = self._scanline_bytes(rows)
+        if self.previous is None:
+            self.previous = np.zeros(data.shape[1], dtype=np.uint8)
+        self._queue(self.compressor.compress(filter_scanlines(data, self.previous, bytes_per_pixel,
+                                                              self.filter_type).tobytes()))
+        self.previous = data[-1]
+
+    def _finish(self):
+        self._queue(self.compressor.flush())
+        self._flush_pending()
+        self._write_chunk(b'IEND', b'')
+
+class IndexedPNGStripWriter(PaletteRows, PNGStripWriter):
+    # Color type 3: one palette index per pixel, packed to 1, 2 or 4 bits when the palette is small enough,
+    # so zlib sees a third of the RGB bytes or less.
+    color_type = 3
+
+    def __init__(self, path, width, height, palette, **options):
+        self.set_palette(palette)
+        self.bit_depth = next(bits for bits in (1, 2, 4, 8) if len(self.palette) <= 1 << bits)
+        super().__init__(path, width, height, **options)
+
+    def _write_header_chunks(self):
+        self._write_chunk(b'PLTE', self.palette.tobytes())
+
+    def _scanline_bytes(self, rows):
+        # Sub-byte rows are filtered byte by byte, as the PNG specification requires.
+        return pack_indices(rows, self.bit_depth), 1
+
+class TIFFStripWriter(StripWriter):
+    # Baseline RGB TIFF made of deflate-compressed strips, or of square tiles with tile_size. The directory is
+    # written after the last strip, once every offset is known, and the header is patched to point at it.
+    samples = 3
+    photometric = 2
+
+    def __init__(self, path, width, height, compression_level=1, rows_per_strip=64, filter_type='none',
+                 tile_size=None):
+        if filter_type not in PNG_FILTERS:
+            raise ValueError(f"Unknown filter {filter_type!r}, expected one of {', '.join(PNG_FILTERS)}")
+        if tile_size is not None and (tile_size <= 0 or tile_size % 16):
+            raise ValueError(f"TIFF tile size must be a positive multiple of 16, got {tile_size}")
+        super().__init__(path, width, height)
+        self.compression_level = compression_level
+        self.tile_size = tile_size
+        self.rows_per_strip = tile_size or max(1, min(rows_per_strip, height))
+        # Horizontal differencing is the only byte predictor TIFF defines, so every PNG filter but none maps to it.
+        self.predictor = 1 if filter_type == 'none' or self.samples == 1 else 2
+        self.pending = []
+        self.pending_rows = 0
+        self.offsets = []
+        self.byte_counts = []
+        self.file.write(b'II*\x00\x00\x00\x00\x00')
+
+    def _write_block(self, rows):
+        if self.predictor == 2:
+            rows = rows.copy()
+            rows[:, 1:] -= rows[:, :-1].copy()
+        data = zlib.compress(np.ascontiguousarray(rows).tobytes(), self.compression_level)
+        self.offsets.append(self.file.tell())
+        self.byte_counts.append(len(data))
+        self.file.write(data)
+
+    def _write_strip(self, rows):
+        if self.tile_size is None:
+            self._write_block(rows)
+            return
+        # Tiles are always full size; the right and bottom edges are padded with zeros.
+        tile = self.tile_size
+        padded = np.zeros((tile, -(-self.width // tile) * tile) + rows.shape[2:], dtype=np.uint8)
+        padded[:rows.shape[0], :self.width] = rows
+        for x in range(0, self.width, tile):
+            self._write_block(padded[:, x:x + tile])
+
+    def _write_rows(self, rows):
+        self.pending.append(rows)
+        self.pending_rows += rows.shape[0]
+        while self.pending_rows >= self.rows_per_strip:
+            block = np.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0]
+            self._write_strip(block[:self.rows_per_strip])
+            rest = block[self.rows_per_strip:]
+            self.pending = [rest] if rest.shape[0] else []
+            self.pending_rows = rest.shape[0]
+
+    def _write_array(self, values, fmt):
+        position = self.file.tell()
+        self.file.write(struct.pack(f'<{len(values)}{fmt}', *values))
+        return position
+
+    def _extra_entries(self):
+        return []
+
+    def _finish(self):
+        if self.pending_rows:
+            self._write_strip(np.concatenate(self.pending))
+            self.pending = []
+        if self.file.tell() > 0xffffffff:
+            raise ValueError(f"{self.path} is larger than 4 GB, which a classic TIFF cannot address")
+        if self.file.tell() % 2:
+            self.file.write(b'\x00')
+
+        n_blocks = len(self.offsets)
+        bits = 8 if self.samples == 1 else self._write_array([8] * self.samples, 'H')
+        offsets = self.offsets[0] if n_blocks == 1 else self._write_array(self.offsets, 'I')
+        byte_counts = self.byte_counts[0] if n_blocks == 1 else self._write_array(self.byte_counts, 'I')
+        # (tag, type, count, value or offset); type 3 is SHORT and 4 is LONG.
+        entries = [(256, 4, 1, self.width), (257, 4, 1, self.height), (258, 3, self.samples, bits), (259, 3, 1, 8),
+                   (262, 3, 1, self.photometric), (277, 3, 1, self.samples), (284, 3, 1, 1)]
+        if self.tile_size is None:
+            entries += [(273, 4, n_blocks, offsets), (278, 4, 1, self.rows_per_strip), (279, 4, n_blocks, byte_counts)]
+        else:
+            entries += [(322, 4, 1, self.tile_size), (323, 4, 1, self.tile_size), (324, 4, n_blocks, offsets),
+                        (325, 4, n_blocks, byte_counts)]
+        if self.predictor != 1:
+            entries.append((317, 3, 1, self.predictor))
+        entries += self._extra_entries()
+
+        directory = self.file.tell()
+        self.file.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in sorted(entries):
+            if kind == 3 and count == 1:
+                self.file.write(struct.pack('<HHIHH', tag, kind, count, value, 0))
+            else:
+                self.file.write(struct.pack('<HHII', tag, kind, count, value))
+        self.file.write(struct.pack('<I', 0))
+        self.file.seek(4)
+        self.file.write(struct.pack('<I', directory))
+
+class IndexedTIFFStripWriter(PaletteRows, TIFFStripWriter):
+    # Photometric 3 (palette color): one byte per pixel and a 16-bit color map.
+    samples = 1
+    photometric = 3
+
+    def __init__(self, path, width, height, palette, **options):
+        self.set_palette(palette)
+        super().__init__(path, width, height, **options)
+
+    def _extra_entries(self):
+        color_map = np.zeros((3, 256), dtype=np.uint16)
+        color_map[:, :len(self.palette)] = self.palette.T.astype(np.uint16) * 257
+        return [(320, 3, color_map.size, self._write_array(color_map.ravel().tolist(), 'H'))]
+
+class BufferedImageWriter(StripWriter):
+    # Formats without a streaming encoder (JPEG, WebP...) collect the uint8 rows and are encoded
+    # by OpenCV on close; only the output image is buffered, never a float copy.
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.file = True
+        self.image = np.empty((height, width, 3), dtype=np.uint8)
+
+    def _write_rows(self, rows):
+        self.image[self.rows_written:self.rows_written + rows.shape[0]] = rows
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file = None
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"Only {self.rows_written} of {self.height} rows were written to {self.path}")
+            import cv2
+            if not cv2.imwrite(self.path, cv2.cvtColor(self.image, cv2.COLOR_RGB2BGR)):
+                raise IOError(f"Failed to write image: {self.path}")
+        finally:
+            self.image = None
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.file = None
+            self.image = None
+            return
+        self.close()
+
+def _encoder_options(options, names):
+    return {name: options[name] for name in names if options.get(name) is not None}
+
+def open_strip_writer(path, width, height, palette=None, **options):
+    # options are the encoder knobs: compression_level and filter_type for PNG and TIFF, strategy for PNG and
+    # tile_size for TIFF. PPM and .npy are stored raw, take none of them and are always written as RGB.
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.png':
+        options = _encoder_options(options, PNG_OPTIONS)
+        if palette is not None:
+            return IndexedPNGStripWriter(path, width, height, palette, **options)
+        return PNGStripWriter(path, width, height, **options)
+    if extension in ('.tif', '.tiff'):
+        options = _encoder_options(options, TIFF_OPTIONS)
+        if palette is not None:
+            return IndexedTIFFStripWriter(path, width, height, palette, **options)
+        return TIFFStripWriter(path, width, height, **options)
+    if extension == '.ppm':
+        return PPMStripWriter(path, width, height)
+    if extension == '.npy':
+        return NpyStripWriter(path, width, height)
+    raise ValueError(f"Streaming output must be one of {', '.join(STREAMING_EXTENSIONS)}: {path}")
+
+def open_output_writer(path, width, height, palette=None, **options):
+    if os.path.splitext(path)[1].lower() in STREAMING_EXTENSIONS:
+        return open_strip_writer(path, width, height, palette, **options)
+    return BufferedImageWriter(path, width, height)
+
+def write_image_in_strips(image, path, rows_per_write=256, palette=None, **options):
+    # Encodes an H x W x 3 uint8 array, typically a memmap, a few rows at a time so it is never copied whole.
+    height, width = image.shape[:2]
+    with open_strip_writer(path, width, height, palette, **options) as writer:
+        for start in range(0, height, rows_per_write):
+            writer.write_rows(image[start:start + rows_per_write])
+
+def encoder_options(encoding, palette):
+    # The batch encoding settings as writer arguments; 'indexed' becomes the palette of the output.
+    options = dict(encoding or {})
+    if options.pop('indexed', False):
+        options['palette'] = palette
+    return options
@@ -0,0 +1,10 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def no_progress():
+    # Progress callback for pipeline calls whose progress the test does not look at.
+    return lambda progress: None
@@ -0,0 +1,27 @@
+import cv2
+import numpy as np
+from batch_cli import main
+
+def write_images(directory, names, height=40, width=60):
+    directory.mkdir()
+    rng = np.random.default_rng(0)
+    for name in names:
+        cv2.imwrite(str(directory / name), rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8))
+
+def test_cli_remaps_a_folder_and_reports_stage_timings(tmp_path, capsys):
+    write_images(tmp_path / 'in', ['a.png', 'b.jpg'])
+    (tmp_path / 'in' / 'notes.txt').write_text('not an image')
+    output_dir = tmp_path / 'out'
+
+    assert main([str(tmp_path / 'in'), '-s', '0.5', '-c', '4', '-o', str(output_dir), '-q']) == 0
+    for name in ('a.png', 'b.png'):
+        assert cv2.imread(str(output_dir / name)).shape == (20, 30, 3)
+    report = capsys.readouterr().out
+    assert "Processed 2 image(s), 0 failed" in report
+    assert all(f"  {stage:<8} total" in report for stage in ('load', 'palette', 'remap', 'save'))
+
+def test_cli_rejects_bad_settings_and_empty_inputs(tmp_path):
+    write_images(tmp_path / 'in', ['a.png'])
+    assert main([str(tmp_path / 'in'), '-s', '0', '-c', '4', '-o', str(tmp_path / 'out')]) == 2
+    assert main([str(tmp_path / 'in'), '-s', '0.5', '-c', '0', '-o', str(tmp_path / 'out')]) == 2
+    assert main([str(tmp_path / 'missing'), '-s', '0.5', '-c', '4', '-o', str(tmp_path / 'out')]) == 1
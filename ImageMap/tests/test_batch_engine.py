@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+from batch_engine import BatchEngine
+
+def make_jobs(directory, count, missing=()):
+    rng = np.random.default_rng(0)
+    jobs = []
+    for i in range(count):
+        source = directory / f'source_{i}.png'
+        if i not in missing:
+            cv2.imwrite(str(source), rng.integers(0, 256, size=(32, 48, 3), dtype=np.uint8))
+        jobs.append((str(source), str(directory / f'output_{i}.png')))
+    return jobs
+
+def test_inline_run_keeps_input_order_and_reports_failures(tmp_path):
+    jobs = make_jobs(tmp_path, 5, missing={2})
+    results = list(BatchEngine(workers=1, chunk_size=2).run(jobs, 0.5, 4, quiet=True))
+    assert [result.index for result in results] == list(range(5))
+    assert [result.ok for result in results] == [True, True, False, True, True]
+    assert set(results[0].timings) == {'load', 'palette', 'remap', 'save'}
+    assert cv2.imread(jobs[4][1]).shape == (16, 24, 3)
+
+def test_worker_processes_give_the_same_results(tmp_path):
+    jobs = make_jobs(tmp_path, 4)
+    results = list(BatchEngine(workers=2, threads_per_worker=1, pin_cores=False).run(jobs, 0.5, 4, quiet=True))
+    assert [result.index for result in results] == list(range(4)) and all(result.ok for result in results)
+    assert all(cv2.imread(output).shape == (16, 24, 3) for _, output in jobs)
+
+def test_chunks_cover_every_job_in_order():
+    jobs = list(range(10))
+    assert [len(chunk) for chunk in BatchEngine(workers=4, chunk_size=3)._make_chunks(jobs)] == [3, 3, 3, 1]
+    assert sum(BatchEngine(workers=4)._make_chunks(jobs), []) == jobs
+
+def test_chunks_leave_room_for_prefetch():
+    jobs = list(range(10))
+    assert [len(chunk) for chunk in BatchEngine(workers=4, prefetch=True)._make_chunks(jobs)] == [2] * 5
+    assert [len(chunk) for chunk in BatchEngine(workers=4, prefetch=False)._make_chunks(jobs)] == [1] * 10
@@ -0,0 +1,41 @@
+import numpy as np
+import torch
+from color_histogram import color_histogram, count_unique_colors
+from extract_color_palette import TorchKMeans, extract_color_palette
+
+def test_histogram_counts_every_pixel():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(300, 200, 3), dtype=np.uint8)
+    colors, counts = color_histogram(image, max_colors=1 << 24)
+    assert counts.sum() == 300 * 200
+    assert colors.shape[0] == np.unique(image.reshape(-1, 3), axis=0).shape[0]
+
+    coarse_colors, coarse_counts = color_histogram(image, max_colors=500)
+    assert coarse_colors.shape[0] <= 500
+    assert coarse_counts.sum() == 300 * 200
+
+def test_histogram_palette_is_exact_for_flat_images(no_progress):
+    image = np.zeros((40, 50, 3), dtype=np.uint8)
+    image[:, 25:] = (255, 255, 255)
+    image[:4, :4] = (255, 0, 0)
+    palette = extract_color_palette(image, 8, no_progress, sampling='histogram')
+    assert sorted(map(tuple, np.rint(np.array(palette) * 255).astype(int))) == [(0, 0, 0), (255, 0, 0), (255, 255, 255)]
+
+def test_weighted_lloyd_converges_to_weighted_means(no_progress):
+    colors = np.array([[0, 0, 0], [0.2, 0, 0], [1, 1, 1]], dtype=np.float32)
+    weights = np.array([300, 100, 600], dtype=np.float32)
+    kmeans = TorchKMeans(2)
+    kmeans.centroids = torch.tensor([[0.1, 0.1, 0.1], [0.9, 0.9, 0.9]])
+    centers = kmeans.fit(colors, no_progress, weights)
+    np.testing.assert_allclose(centers, [[0.05, 0, 0], [1, 1, 1]], atol=1e-5)
+
+def test_unique_color_count_matches_torch_unique():
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 64, size=(500, 400, 3), dtype=np.uint8) * 4
+    expected = torch.unique(torch.from_numpy(image).float().view(-1, 3) / 255.0, dim=0).shape[0]
+
+    assert count_unique_colors(image, 'bitmap') == expected
+    assert count_unique_colors(image, 'sort') == expected
+    assert count_unique_colors(torch.from_numpy(image).float() / 255.0) == expected
+    assert count_unique_colors(image.astype(np.uint16) * 257) == expected
+    assert abs(count_unique_colors(image, 'hyperloglog') - expected) < 0.03 * expected
\ No newline at end of file
@@ -0,0 +1,15 @@
+import numpy as np
+import torch
+from resize_and_remap_image import resize_and_remap_image
+
+def test_compact_remap_matches_float_remap(no_progress):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(300, 200, 3), dtype=np.uint8)
+    palette = torch.rand((16, 3), generator=torch.Generator().manual_seed(0))
+
+    compact = resize_and_remap_image(torch.from_numpy(image), 0.5, palette, 64, no_progress)
+    full = resize_and_remap_image(torch.from_numpy(image).float() / 255.0, 0.5, palette, 64, no_progress)
+    assert torch.equal(compact, full)
+
+    wide = torch.from_numpy(image.astype(np.uint16) * 257)
+    assert torch.equal(resize_and_remap_image(wide, 0.5, palette, 64, no_progress), full)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import logging
+import threading
+from redirect import Redirect
+
+class FakeText:
+    # Just enough of tk.Text for the console: line-based insert, delete and index, and after() calls recorded.
+    def __init__(self):
+        self.text = ''
+        self.inserts = 0
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def insert(self, index, text):
+        self.inserts += 1
+        self.text += text
+
+    def index(self, index):
+        lines = self.text.split('\n')
+        return f"{len(lines)}.{len(lines[-1])}"
+
+    def delete(self, start, end):
+        line = int(end.split('.')[0])
+        self.text = '\n'.join(self.text.split('\n')[line - 1:])
+
+    def see(self, index):
+        pass
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+def test_writes_are_coalesced_into_one_insert_per_flush():
+    widget = FakeText()
+    console = Redirect(widget)
+    threads = [threading.Thread(target=lambda: [console.write(f"line {i}\n") for i in range(100)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert widget.inserts == 0
+    widget.run_pending()
+    assert widget.inserts == 1
+    assert widget.text.count('\n') == 400
+
+def test_widget_keeps_only_the_last_lines():
+    widget = FakeText()
+    console = Redirect(widget, max_lines=50)
+    for i in range(30):
+        for j in range(10):
+            console.write_line(f"{i}-{j}")
+        widget.run_pending()
+    lines = widget.text.split('\n')
+    assert len(lines) <= 50
+    assert lines[-2] == "29-9"
+
+def test_each_complete_line_is_logged_once(caplog):
+    console = Redirect(FakeText())
+    with caplog.at_level(logging.INFO, logger='imagemap.console'):
+        console.write("first ")
+        console.write("half\nsecond\n")
+        console.write_line("status")
+    assert [record.getMessage() for record in caplog.records] == ["first half", "second", "status"]
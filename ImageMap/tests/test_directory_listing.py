@@ -0,0 +1,98 @@
+import os
+import time
+from directory_listing import DirectoryScanner, ListingCache, scan_directory
+
+def make_directory(path, names):
+    for name in names:
+        if name.endswith('/'):
+            os.mkdir(os.path.join(path, name[:-1]))
+        else:
+            open(os.path.join(path, name), 'w').close()
+
+def wait_for_listing(scanner, timeout=5.0):
+    entries = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for kind, payload in scanner.poll():
+            if kind == 'chunk':
+                entries.extend(payload)
+            elif kind == 'done':
+                return sorted(entries)
+            else:
+                raise payload
+        time.sleep(0.001)
+    raise TimeoutError("The scan did not finish")
+
+def test_scan_yields_chunks_of_folders_and_matching_files(tmp_path):
+    make_directory(tmp_path, ['b.JPG', 'a.png', 'notes.txt', 'Photos/', 'c.tif'])
+    chunks = list(scan_directory(str(tmp_path), ('.png', '.jpg', '.tif'), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert sorted(entry for chunk in chunks for entry in chunk) == [
+        ('a.png', 'a.png', False), ('b.jpg', 'b.JPG', False), ('c.tif', 'c.tif', False), ('photos', 'Photos', True)]
+
+def test_cache_is_invalidated_when_the_directory_changes(tmp_path):
+    cache = ListingCache()
+    path = str(tmp_path)
+    mtime = os.stat(path).st_mtime_ns
+    cache.put(path, mtime, [('a.png', 'a.png', False)])
+    assert cache.get(path) == [('a.png', 'a.png', False)]
+
+    make_directory(tmp_path, ['b.png'])
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert cache.get(path) is None
+
+def test_cache_keeps_the_most_recent_directories(tmp_path):
+    cache = ListingCache(max_directories=2)
+    paths = []
+    for name in ('one', 'two', 'three'):
+        os.mkdir(tmp_path / name)
+        paths.append(str(tmp_path / name))
+        cache.put(paths[-1], os.stat(paths[-1]).st_mtime_ns, [])
+    assert cache.get(paths[0]) is None
+    assert cache.get(paths[1]) == [] and cache.get(paths[2]) == []
+
+def test_scanner_lists_in_the_background_then_from_the_cache(tmp_path):
+    names = [f'image_{i:04d}.png' for i in range(500)] + ['readme.txt']
+    make_directory(tmp_path, names)
+    cache = ListingCache()
+    scanner = DirectoryScanner(('.png',), chunk_size=64, cache=cache)
+
+    scanner.start(str(tmp_path))
+    entries = wait_for_listing(scanner)
+    assert [name for _, name, _ in entries] == names[:-1]
+    assert cache.get(str(tmp_path), ('.png',)) == entries
+
+    scanner.start(str(tmp_path))
+    assert scanner.poll() == [('chunk', entries), ('done', None)]
+
+def test_scanners_with_different_filters_do_not_share_listings(tmp_path):
+    make_directory(tmp_path, ['a.png', 'b.jpg', 'notes.txt'])
+    cache = ListingCache()
+    images = DirectoryScanner(('.png', '.jpg'), cache=cache)
+    images.start(str(tmp_path))
+    assert [name for _, name, _ in wait_for_listing(images)] == ['a.png', 'b.jpg']
+
+    everything = DirectoryScanner(cache=cache)
+    everything.start(str(tmp_path))
+    assert [name for _, name, _ in wait_for_listing(everything)] == ['a.png', 'b.jpg', 'notes.txt']
+    images.start(str(tmp_path))
+    assert [name for _, name, _ in wait_for_listing(images)] == ['a.png', 'b.jpg']
+
+def test_messages_of_an_earlier_scan_are_dropped(tmp_path):
+    for name in ('first', 'second'):
+        os.mkdir(tmp_path / name)
+        make_directory(tmp_path / name, [f'{name}_{i}.png' for i in range(100)])
+    scanner = DirectoryScanner(('.png',), chunk_size=10, cache=None)
+    scanner.start(str(tmp_path / 'first'))
+    scanner.start(str(tmp_path / 'second'))
+    entries = wait_for_listing(scanner)
+    assert len(entries) == 100 and all(name.startswith('second') for _, name, _ in entries)
+
+def test_scan_errors_are_reported(tmp_path):
+    scanner = DirectoryScanner(cache=None)
+    scanner.start(str(tmp_path / 'missing'))
+    deadline = time.monotonic() + 5.0
+    messages = []
+    while not messages and time.monotonic() < deadline:
+        messages = scanner.poll()
+    assert messages[0][0] == 'error' and isinstance(messages[0][1], FileNotFoundError)
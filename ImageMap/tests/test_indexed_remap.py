@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import torch
+from indexed_image import IndexedImage
+from resize_and_remap_image import resize_and_remap_image
+from save_image import save_image_to_path
+
+def remap_both(palette, progress_function, image=None):
+    image = torch.rand(64, 48, 3, generator=torch.Generator().manual_seed(0)) if image is None else image
+    rgb = resize_and_remap_image(image, 0.5, palette, 16, progress_function)
+    indexed = resize_and_remap_image(image, 0.5, palette, 16, progress_function, indexed=True)
+    return rgb, indexed
+
+def test_index_map_expands_to_the_rgb_result(no_progress):
+    palette = torch.tensor([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 1.0]])
+    rgb, indexed = remap_both(palette, no_progress)
+    assert isinstance(indexed, IndexedImage)
+    assert indexed.indices.dtype == torch.uint8 and tuple(indexed.indices.shape) == (32, 24)
+    assert torch.equal(indexed.to_rgb(rows_per_chunk=5), rgb)
+
+def test_large_palettes_use_uint16_indices(no_progress):
+    palette = torch.rand(300, 3, generator=torch.Generator().manual_seed(1))
+    rgb, indexed = remap_both(palette, no_progress)
+    assert indexed.indices.dtype == torch.uint16
+    assert torch.equal(indexed.to_rgb(), rgb)
+
+def test_index_map_is_written_into_a_memmap(tmp_path, no_progress):
+    palette = torch.tensor([[0.2, 0.2, 0.2], [0.8, 0.8, 0.8]])
+    image = torch.rand(40, 40, 3)
+    out = np.lib.format.open_memmap(str(tmp_path / 'indices.npy'), mode='w+', dtype=np.uint8, shape=(20, 20))
+    indexed = resize_and_remap_image(image, 0.5, palette, 8, no_progress, out=out, indexed=True)
+    assert np.array_equal(out, indexed.indices.numpy())
+
+def test_indexed_image_saves_as_indexed_png_and_as_rgb(tmp_path, no_progress):
+    palette = torch.tensor([[0.1, 0.2, 0.3], [0.9, 0.5, 0.1], [0.3, 0.9, 0.7]])
+    rgb, indexed = remap_both(palette, no_progress)
+    for name in ('out.png', 'out.jpg'):
+        save_image_to_path(indexed, str(tmp_path / name))
+    decoded = cv2.cvtColor(cv2.imread(str(tmp_path / 'out.png'), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+    assert np.array_equal(decoded, rgb.numpy())
+    assert (tmp_path / 'out.jpg').exists()
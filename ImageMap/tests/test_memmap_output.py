@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+import torch
+from resize_and_remap_image import resize_and_remap_image
+from save_image import save_image_to_path
+
+def test_remap_into_memmap_matches_in_memory_result(tmp_path, no_progress):
+    image = torch.rand(48, 40, 3)
+    palette = torch.tensor([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [0.0, 1.0, 0.0]])
+    expected = resize_and_remap_image(image, 0.5, palette, 8, no_progress)
+
+    out = np.lib.format.open_memmap(str(tmp_path / 'out.npy'), mode='w+', dtype=np.uint8, shape=(24, 20, 3))
+    result = resize_and_remap_image(image, 0.5, palette, 8, no_progress, out=out)
+    assert torch.equal(result, expected)
+    assert np.array_equal(out, expected.numpy())
+
+def test_streamed_save_decodes_to_the_same_pixels(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, size=(150, 70, 3), dtype=np.uint8)
+    for name in ('out.png', 'out.tif'):
+        path = str(tmp_path / name)
+        save_image_to_path(image, path, streaming=True)
+        decoded = cv2.cvtColor(cv2.imread(path, cv2.IMREAD_UNCHANGED), cv2.COLOR_BGR2RGB)
+        assert np.array_equal(decoded, image)
+
+def test_memmap_outputs_are_encoded_in_strips(tmp_path, monkeypatch):
+    import batch_pipeline
+    source = str(tmp_path / 'source.png')
+    cv2.imwrite(source, np.random.default_rng(0).integers(0, 256, size=(64, 48, 3), dtype=np.uint8))
+    def no_imwrite(*args):
+        raise AssertionError("The memmap output went through cv2.imwrite")
+    monkeypatch.setattr(cv2, 'imwrite', no_imwrite)
+    output = str(tmp_path / 'out.png')
+    batch_pipeline.process_image(source, output, 0.5, 4, block_size=16, compact=True, memmap_output=True)
+    assert cv2.imread(output).shape == (32, 24, 3)
@@ -0,0 +1,24 @@
+import cv2
+import numpy as np
+import torch
+from resize_and_remap_image import resize_and_remap_image
+from stream_remap import multiscale_resize_and_remap
+
+def test_multiscale_matches_separate_calls(tmp_path, no_progress):
+    image = torch.from_numpy(np.random.default_rng(0).integers(0, 256, size=(240, 320, 3), dtype=np.uint8))
+    palette = torch.rand((64, 3), generator=torch.Generator().manual_seed(0))
+    scales = [0.25, 1.0, 0.5]
+    outputs = [str(tmp_path / 'quarter.png'), str(tmp_path / 'full.npy'), str(tmp_path / 'half.bmp')]
+
+    for nearest_search in ('exact', 'lut'):
+        sizes = multiscale_resize_and_remap(image, scales, palette, outputs, no_progress, block_size=32,
+                                            nearest_search=nearest_search)
+        assert sizes == [(60, 80), (240, 320), (120, 160)]
+
+        for scale, output in zip(scales, outputs):
+            expected = resize_and_remap_image(image, scale, palette, 32, no_progress, nearest_search).numpy()
+            if output.endswith('.npy'):
+                written = np.load(output)
+            else:
+                written = cv2.cvtColor(cv2.imread(output), cv2.COLOR_BGR2RGB)
+            assert np.array_equal(written, expected)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from color_quantizers import median_cut_palette, octree_palette
+from extract_color_palette import TorchKMeans, extract_color_palette, kmeans_plus_plus
+from palette_backends import PALETTE_BACKENDS, get_backend
+
+def test_every_backend_returns_a_brightness_sorted_palette(no_progress):
+    image = np.random.default_rng(0).integers(0, 256, size=(200, 200, 3), dtype=np.uint8)
+    for backend in PALETTE_BACKENDS:
+        palette = np.array(extract_color_palette(image, 8, no_progress, backend=backend, seed=3))
+        assert palette.shape == (8, 3)
+        assert np.all(np.diff(palette.mean(axis=1)) >= 0)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend('nearest')
+
+def test_quantizers_recover_flat_colors():
+    colors = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 255, 255]], dtype=np.float32) / 255
+    pixels = np.repeat(colors, [50, 10, 20, 5, 15], axis=0)
+    for quantize in (median_cut_palette, octree_palette):
+        palette = quantize(pixels, 5)
+        assert palette.shape == (5, 3)
+        np.testing.assert_allclose(np.sort(palette, axis=0), np.sort(colors, axis=0), atol=1e-6)
+
+def test_quantizers_return_exactly_the_requested_number_of_colors(no_progress):
+    # Sizes below and between the octree level sizes (8, 64, 512), where whole levels do not fit.
+    pixels = np.random.default_rng(0).integers(0, 256, size=(200 * 200, 3)).astype(np.float32) / 255
+    for quantize in (median_cut_palette, octree_palette):
+        for n_colors in (2, 4, 7, 16, 24, 100, 256):
+            assert quantize(pixels, n_colors).shape == (n_colors, 3)
+    palette = np.array(extract_color_palette(pixels.reshape(200, 200, 3), 4, no_progress, backend='octree'))
+    assert palette.shape == (4, 3)
+
+def test_octree_stops_at_the_distinct_colors():
+    colors = np.eye(3, dtype=np.float32)
+    palette = octree_palette(np.repeat(colors, [30, 20, 10], axis=0), 8)
+    np.testing.assert_allclose(np.sort(palette, axis=0), np.sort(colors, axis=0), atol=1e-6)
+    # The heaviest colors keep a palette entry of their own; the lightest ones are merged.
+    merged = octree_palette(np.repeat(colors, [30, 20, 10], axis=0), 2)
+    assert merged.shape == (2, 3) and any(np.allclose(color, colors[0]) for color in merged)
+
+def test_kmeans_plus_plus_spreads_over_distinct_colors():
+    pixels = np.repeat(np.eye(3, dtype=np.float32), 100, axis=0)
+    centers = kmeans_plus_plus(pixels, 3, np.random.default_rng(0))
+    assert len({tuple(center) for center in centers}) == 3
+
+def test_octree_seeded_lloyd_starts_on_the_quantized_colors(no_progress):
+    colors = np.array([[0.1, 0.1, 0.1], [0.9, 0.2, 0.2], [0.2, 0.9, 0.2], [0.2, 0.2, 0.9]], dtype=np.float32)
+    pixels = np.repeat(colors, 25, axis=0)
+    centers = TorchKMeans(4, init='octree', max_iter=1).fit(pixels, no_progress)
+    np.testing.assert_allclose(np.sort(centers, axis=0), np.sort(colors, axis=0), atol=1e-6)
+
+def test_lloyd_stops_once_the_centroids_settle(no_progress):
+    colors = np.array([[0.1, 0.1, 0.1], [0.9, 0.9, 0.9]], dtype=np.float32)
+    image = np.repeat(colors, 5000, axis=0).reshape(100, 100, 3)
+    palette, stats = extract_color_palette(image, 2, no_progress, number_iterations=50, backend='lloyd++', seed=0,
+                                           return_stats=True)
+    np.testing.assert_allclose(palette, colors, atol=1e-3)
+    assert stats.converged and stats.iterations < 50
+    assert len(stats.inertia) == len(stats.iteration_seconds) == stats.iterations
+    assert stats.inertia[-1] <= stats.inertia[0]
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+from palette_cache import PaletteCache, content_hasher, image_digest, palette_key
+from strip_reader import NpyStripReader
+from stream_remap import sample_pixels
+
+def test_cache_hits_misses_and_lru_eviction(tmp_path):
+    cache = PaletteCache(str(tmp_path), max_memory_entries=2)
+    calls = []
+    compute = lambda: calls.append(1) or [[0.0, 0.5, 1.0]]
+
+    for name in ('a', 'b', 'a', 'c', 'b'):
+        cache.get_or_compute(palette_key(name, 8), compute)
+
+    # 'b' was evicted from memory by 'c' but is still on disk.
+    assert len(calls) == 3
+    assert (cache.hits, cache.misses, cache.disk_hits) == (2, 3, 1)
+    assert list(cache.memory) == [palette_key('c', 8), palette_key('b', 8)]
+
+def test_disk_eviction_keeps_recent_entries(tmp_path):
+    # Room for one single-color palette on disk.
+    cache = PaletteCache(str(tmp_path), max_disk_bytes=20)
+    cache.put(palette_key('old', 8), [[0.0, 0.0, 0.0]])
+    # Dated back explicitly: on a filesystem with coarse timestamps both entries could share one mtime.
+    old_path = os.path.join(tmp_path, palette_key('old', 8) + '.json')
+    mtime = os.stat(old_path).st_mtime_ns - 10 * 10 ** 9
+    os.utime(old_path, ns=(mtime, mtime))
+    cache.put(palette_key('new', 8), [[1.0, 1.0, 1.0]])
+    assert os.listdir(tmp_path) == [palette_key('new', 8) + '.json']
+
+def test_streaming_digest_matches_in_memory_digest(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, size=(50, 40, 3), dtype=np.uint8)
+    path = str(tmp_path / 'image.npy')
+    np.save(path, image)
+
+    hasher = content_hasher(image.shape, np.uint8)
+    with NpyStripReader(path) as reader:
+        sample_pixels(reader, 100, 40 * 3 * 4 * 7, np.random.default_rng(0), hasher)
+    assert hasher.hexdigest() == image_digest(image)
+    assert palette_key(image_digest(image), 8) != palette_key(image_digest(image), 16)
\ No newline at end of file
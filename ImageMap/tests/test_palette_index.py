@@ -0,0 +1,46 @@
+import torch
+from palette_index import ExactPaletteIndex, KDTreePaletteIndex, PaletteLUT, build_palette_index, find_nearest_neighbor_batch
+from resize_and_remap_image import resize_and_remap_image
+
+def test_lut_matches_exact_search():
+    generator = torch.Generator().manual_seed(0)
+    for n_colors in (1, 2, 16, 256):
+        palette = torch.rand((n_colors, 3), generator=generator)
+        if n_colors > 4:
+            palette[4] = palette[1]
+        pixels = torch.rand((200000, 3), generator=generator) * 1.1 - 0.05
+
+        lut_indices = PaletteLUT(palette, bits=5).query(pixels)
+        exact_indices = find_nearest_neighbor_batch(pixels, palette)
+        assert torch.equal(lut_indices, exact_indices)
+
+def test_kdtree_matches_exact_search():
+    generator = torch.Generator().manual_seed(2)
+    for n_colors in (1, 2, 1024, 4096):
+        palette = torch.rand((n_colors, 3), generator=generator)
+        if n_colors > 4:
+            palette[3] = palette[0]
+        pixels = torch.rand((100000, 3), generator=generator)
+
+        tree_indices = KDTreePaletteIndex(palette).query(pixels)
+        exact_indices = find_nearest_neighbor_batch(pixels, palette)
+        assert torch.equal(tree_indices, exact_indices)
+
+def test_auto_index_selection():
+    assert isinstance(build_palette_index(torch.rand(8, 3)), ExactPaletteIndex)
+    assert isinstance(build_palette_index(torch.rand(256, 3)), PaletteLUT)
+    assert isinstance(build_palette_index(torch.rand(2048, 3)), KDTreePaletteIndex)
+
+def test_remap_output_identical_with_lut():
+    generator = torch.Generator().manual_seed(1)
+    image = torch.rand((120, 160, 3), generator=generator)
+    image[:, :80] = 0.25
+    palette = torch.rand((48, 3), generator=generator)
+
+    lut_image = resize_and_remap_image(image, 0.6, palette, 64, lambda progress: None, 'lut')
+    exact_image = resize_and_remap_image(image, 0.6, palette, 64, lambda progress: None, 'exact')
+    assert torch.equal(lut_image, exact_image)
+def test_default_lut_stays_small():
+    lut = PaletteLUT(torch.rand((64, 3), generator=torch.Generator().manual_seed(3)))
+    size = sum(tensor.numel() * tensor.element_size() for tensor in (lut.table, lut.candidates, lut.candidate_counts, lut.built))
+    assert lut.levels == 64 and size < 16 * 2 ** 20
@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+import torch
+from extract_color_palette import extract_color_palette
+from load_image import load_image, reduced_decode_factor
+from resize_and_remap_image import resize_and_remap_image
+
+def gradient_image(height, width):
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.stack([x / width, y / height, 0.5 + 0.5 * np.sin(x / 9 + y / 13)], axis=2)
+    return (image * 255).astype(np.uint8)
+
+def write_jpeg(path, height, width):
+    cv2.imwrite(str(path), cv2.cvtColor(gradient_image(height, width), cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return str(path)
+
+def quantization_error(image, palette):
+    # Mean squared distance to the nearest palette color, in 8-bit units.
+    pixels = image.reshape(-1, 3).float()
+    palette = torch.tensor(palette, dtype=torch.float32) * 255
+    return float(torch.cdist(pixels, palette).min(dim=1).values.pow(2).mean())
+
+def test_factor_stays_above_the_target_and_divides_the_size(tmp_path):
+    path = write_jpeg(tmp_path / 'photo.jpg', 96, 128)
+    assert reduced_decode_factor(path, 0.25) == 4
+    assert reduced_decode_factor(path, 0.3) == 2
+    assert reduced_decode_factor(path, 0.1) == 8
+    assert reduced_decode_factor(path, 0.75) == 1
+
+    odd = write_jpeg(tmp_path / 'odd.jpg', 96, 130)
+    assert reduced_decode_factor(odd, 0.25) == 2
+
+    png = tmp_path / 'photo.png'
+    cv2.imwrite(str(png), gradient_image(96, 128))
+    assert reduced_decode_factor(str(png), 0.25) == 1
+
+def test_reduced_decode_gives_the_same_output_size(tmp_path, no_progress):
+    path = write_jpeg(tmp_path / 'photo.jpg', 200, 312)
+    palette = torch.rand(8, 3, generator=torch.Generator().manual_seed(0))
+    for scale in (0.5, 0.3, 0.2, 0.125):
+        factor = reduced_decode_factor(path, scale)
+        reduced = load_image(path, compact=True, reduction=factor)
+        assert tuple(reduced.shape) == (200 // factor, 312 // factor, 3)
+        full = resize_and_remap_image(load_image(path, compact=True), scale, palette, 64, no_progress)
+        output = resize_and_remap_image(reduced, scale * factor, palette, 64, no_progress)
+        assert output.shape == full.shape
+
+def test_palettes_from_reduced_decodes_stay_comparable(tmp_path, no_progress):
+    path = write_jpeg(tmp_path / 'photo.jpg', 384, 512)
+    full = load_image(path, compact=True)
+    # Both palettes are judged on the full decode, as the remap of a full decode would see it.
+    reference = quantization_error(full.cpu(), extract_color_palette(full, 16, no_progress, seed=0))
+    for factor in (2, 4, 8):
+        reduced = load_image(path, compact=True, reduction=factor)
+        palette = extract_color_palette(reduced, 16, no_progress, seed=0)
+        assert quantization_error(full.cpu(), palette) <= reference * 1.15 + 1.0
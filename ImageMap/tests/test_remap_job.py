@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import pytest
+import torch
+from remap_job import CHECKPOINT_SUFFIX, JobCancelled, RemapJob
+from resize_and_remap_image import resize_and_remap_image
+
+def cancel_after(job, calls):
+    reported = []
+    def progress(value):
+        reported.append(value)
+        if len(reported) == calls:
+            job.cancel()
+    return progress
+
+def test_job_cancellation_stops_the_remap():
+    image = torch.rand(64, 64, 3)
+    palette = torch.tensor([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [1.0, 0.0, 0.0]])
+    job = RemapJob()
+    with pytest.raises(JobCancelled):
+        resize_and_remap_image(image, 1.0, palette, 16, cancel_after(job, 3), job=job)
+
+def test_interrupted_remap_resumes_from_the_checkpoint(tmp_path, no_progress):
+    image = torch.rand(64, 64, 3)
+    palette = torch.tensor([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [0.0, 0.0, 1.0]])
+    expected = resize_and_remap_image(image, 1.0, palette, 16, no_progress)
+
+    checkpoint = str(tmp_path / ('out.png' + CHECKPOINT_SUFFIX))
+    job = RemapJob(checkpoint)
+    with pytest.raises(JobCancelled):
+        resize_and_remap_image(image, 1.0, palette, 16, cancel_after(job, 10), job=job)
+    with open(checkpoint + '.json', 'r', encoding='utf-8') as f:
+        assert json.load(f)['done_strips'] >= 1
+
+    resumed = resize_and_remap_image(image, 1.0, palette, 16, no_progress, job=RemapJob(checkpoint))
+    assert torch.equal(resumed, expected)
+    assert not (tmp_path / ('out.png' + CHECKPOINT_SUFFIX)).exists()
+
+def test_checkpoint_is_ignored_without_resume(tmp_path, no_progress):
+    image = torch.rand(64, 64, 3)
+    palette = torch.tensor([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [0.0, 0.0, 1.0]])
+    expected = resize_and_remap_image(image, 1.0, palette, 16, no_progress)
+
+    checkpoint = str(tmp_path / ('out.png' + CHECKPOINT_SUFFIX))
+    job = RemapJob(checkpoint)
+    with pytest.raises(JobCancelled):
+        resize_and_remap_image(image, 1.0, palette, 16, cancel_after(job, 10), job=job)
+    # Strips the leftover checkpoint marks as done, but that a fresh run must not reuse.
+    leftover = np.load(checkpoint, mmap_mode='r+')
+    leftover[:] = 7
+    leftover.flush()
+    del leftover
+
+    fresh = resize_and_remap_image(image, 1.0, palette, 16, no_progress, job=RemapJob(checkpoint, resume=False))
+    assert torch.equal(fresh, expected)
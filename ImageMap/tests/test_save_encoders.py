@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+import pytest
+from save_image import output_path_with_extension, save_image_to_path
+
+def palette_image(n_colors, shape=(37, 53), seed=0):
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 256, size=(n_colors, 3), dtype=np.uint8)
+    return palette[rng.integers(0, n_colors, size=shape)], palette
+
+def decode(path):
+    return cv2.cvtColor(cv2.imread(path, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+@pytest.mark.parametrize('n_colors', [2, 4, 16, 200])
+@pytest.mark.parametrize('filter_type', ['none', 'sub', 'up', 'adaptive'])
+def test_indexed_png_decodes_to_the_remapped_colors(tmp_path, n_colors, filter_type):
+    image, palette = palette_image(n_colors)
+    path = str(tmp_path / 'out.png')
+    save_image_to_path(image, path, palette=palette, filter_type=filter_type)
+    assert np.array_equal(decode(path), image)
+
+@pytest.mark.parametrize('options', [{}, {'filter_type': 'sub'}, {'tile_size': 16}, {'tile_size': 32, 'filter_type': 'up'}])
+def test_tiff_round_trips_rgb_and_indexed(tmp_path, options):
+    image, palette = palette_image(12, shape=(70, 45))
+    for indexed in (False, True):
+        path = str(tmp_path / 'out.tif')
+        save_image_to_path(image, path, palette=palette if indexed else None, streaming=True, **options)
+        assert np.array_equal(decode(path), image)
+
+def test_indexed_png_is_smaller_than_rgb(tmp_path):
+    # A remapped gradient: bands of equal indices with ragged borders, as a palette remap of a photo produces.
+    _, palette = palette_image(16)
+    y, x = np.mgrid[0:200, 0:300]
+    jitter = np.random.default_rng(1).integers(0, 8, size=(200, 300))
+    image = palette[(x + y + jitter) * 16 // 508]
+    sizes = {}
+    for level in (0, None):
+        for name, indexed_palette in (('rgb', None), ('indexed', palette)):
+            path = tmp_path / f'{name}_{level}.png'
+            save_image_to_path(image, str(path), palette=indexed_palette, streaming=True, compression_level=level)
+            sizes[name, level] = path.stat().st_size
+    # Stored blocks hold 4 bits per pixel against 24, whatever the zlib version; deflate narrows the gap.
+    assert sizes['indexed', 0] < sizes['rgb', 0] / 4
+    assert sizes['indexed', None] < sizes['rgb', None]
+
+def test_colors_outside_the_palette_are_rejected(tmp_path):
+    image, palette = palette_image(8)
+    with pytest.raises(ValueError):
+        save_image_to_path(image, str(tmp_path / 'out.png'), palette=palette[:4])
+
+def test_save_dialog_keeps_known_extensions():
+    assert output_path_with_extension('/tmp/result') == '/tmp/result.png'
+    assert output_path_with_extension('/tmp/result.TIF') == '/tmp/result.TIF'
+    assert output_path_with_extension('/tmp/result.v2') == '/tmp/result.v2.png'
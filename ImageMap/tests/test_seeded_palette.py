@@ -0,0 +1,27 @@
+import numpy as np
+from batch_pipeline import outputs_up_to_date, output_fingerprint, record_fingerprint
+from extract_color_palette import extract_color_palette
+
+def test_seeded_palette_is_reproducible(no_progress):
+    image = np.random.default_rng(0).integers(0, 256, size=(400, 400, 3), dtype=np.uint8)
+    for backend in ('minibatch', 'lloyd'):
+        first = extract_color_palette(image, 8, no_progress, backend=backend, seed=11)
+        second = extract_color_palette(image, 8, no_progress, backend=backend, seed=11)
+        assert first == second
+
+def test_fingerprint_tracks_input_and_settings(tmp_path):
+    source = tmp_path / 'source.png'
+    output = tmp_path / 'output.png'
+    source.write_bytes(b'first')
+    output.write_bytes(b'remapped')
+
+    value = output_fingerprint(str(source), 0.5, 8, seed=1)
+    assert not outputs_up_to_date([str(output)], value)
+    record_fingerprint([str(output)], value)
+    assert outputs_up_to_date([str(output)], value)
+
+    assert output_fingerprint(str(source), 0.5, 8, seed=2) != value
+    assert output_fingerprint(str(source), 0.5, 8, seed=1, block_size=512) == value
+    assert output_fingerprint(str(source), 0.5, 8, seed=1, block_size=64) != value
+    source.write_bytes(b'second')
+    assert output_fingerprint(str(source), 0.5, 8, seed=1) != value
\ No newline at end of file
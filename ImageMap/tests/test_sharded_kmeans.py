@@ -0,0 +1,15 @@
+import numpy as np
+from extract_color_palette import PaletteStats, TorchKMeans
+from sharded_kmeans import ShardedKMeans
+
+def test_process_shards_match_a_single_lloyd_fit(no_progress):
+    rng = np.random.default_rng(4)
+    pixels = rng.random((6000, 3), dtype=np.float32)
+    weights = rng.integers(1, 20, size=6000).astype(np.float32)
+
+    single = TorchKMeans(8, seed=2, init='kmeans++', max_iter=5, tol=0).fit(pixels, no_progress, weights)
+    stats = PaletteStats('lloyd-sharded')
+    sharded = ShardedKMeans(8, workers=3, seed=2, init='kmeans++', max_iter=5, tol=0).fit(pixels, no_progress, weights, stats)
+
+    np.testing.assert_allclose(sharded, single, atol=1e-4)
+    assert stats.iterations == 5
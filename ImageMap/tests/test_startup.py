@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loaded_modules(statement):
+    # A fresh interpreter, so modules imported by other tests do not count.
+    script = textwrap.dedent(f"""
+        import json, sys
+        sys.path.insert(0, {APP_DIR!r})
+        {statement}
+        print(json.dumps(sorted(name for name in ('torch', 'sklearn', 'cv2', 'tkinter') if name in sys.modules)))
+    """)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_batch_cli_imports_no_gui_and_no_heavy_modules():
+    assert loaded_modules("import batch_cli") == []
+
+def test_application_defers_torch_sklearn_and_opencv():
+    pytest.importorskip('ttkbootstrap')
+    assert loaded_modules("import application") == ['tkinter']
+
+def test_only_the_active_language_is_loaded():
+    from multilingual_support import LanguageManager
+    manager = LanguageManager()
+    assert set(manager.translations) <= {manager.current_language}
+    other = next(code for code in manager.get_languages() if code != manager.current_language)
+    manager.load_translations(other)
+    assert other in manager.translations
+    assert manager.translations[other].get('load_image')
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import textwrap
+import numpy as np
+import pytest
+from strip_writer import NpyStripWriter
+
+# Peak RSS growth allowed while streaming, on top of what the interpreter and torch already use.
+RSS_LIMIT_MB = float(os.environ.get('IMAGEMAP_STREAM_RSS_LIMIT_MB', '256'))
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_synthetic_image(path, height, width, band=256):
+    x = np.arange(width, dtype=np.uint32)
+    with NpyStripWriter(path, width, height) as writer:
+        for start in range(0, height, band):
+            y = np.arange(start, min(start + band, height), dtype=np.uint32)[:, None]
+            channels = np.broadcast_arrays((x[None, :] * 7 + y) % 256, (y * 3) % 256, (x[None, :] ^ y) % 256)
+            rows = np.stack(channels, axis=2)
+            writer.write_rows(rows.astype(np.uint8))
+
+def test_streaming_peak_rss_stays_bounded(tmp_path):
+    height, width = 8000, 6000
+    source = str(tmp_path / 'huge.npy')
+    output = str(tmp_path / 'huge_remapped.png')
+    write_synthetic_image(source, height, width)
+
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {APP_DIR!r})
+        import torch
+        from memory_usage import current_rss, peak_rss, reset_peak_rss
+        from stream_remap import stream_resize_and_remap
+
+        if not reset_peak_rss():
+            print('unsupported')
+            sys.exit(0)
+        baseline = current_rss()
+        stream_resize_and_remap({source!r}, {output!r}, 0.25, 16, lambda p: None, memory_budget=64 * 1024 * 1024)
+        print(peak_rss() - baseline)
+    """)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    last_line = result.stdout.strip().splitlines()[-1]
+    if last_line == 'unsupported':
+        pytest.skip("Peak RSS cannot be reset on this platform")
+
+    growth_mb = int(last_line) / (1024 * 1024)
+    full_float_mb = height * width * 3 * 4 / (1024 * 1024)
+    assert os.path.getsize(output) > 0
+    assert growth_mb < RSS_LIMIT_MB, f"peak RSS grew by {growth_mb:.0f} MB (limit {RSS_LIMIT_MB:.0f} MB, full float32 image {full_float_mb:.0f} MB)"
\ No newline at end of file
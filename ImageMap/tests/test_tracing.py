@@ -0,0 +1,74 @@
+import json
+import pytest
+from tracing import NULL_SPAN, Tracer, format_summary, summarize, write_chrome_trace
+
+def test_disabled_tracer_returns_the_shared_null_span():
+    tracer = Tracer()
+    assert tracer.span('remap', strip=0) is NULL_SPAN
+    with tracer.span('remap') as span:
+        span.set(bytes=10)
+    tracer.counter('palette.inertia', inertia=1.0)
+    assert tracer.drain() == []
+
+def test_timings_accumulate_without_recording_events():
+    tracer = Tracer()
+    timings = {}
+    for _ in range(3):
+        with tracer.span('remap', timings):
+            pass
+    assert set(timings) == {'remap'} and timings['remap'] >= 0.0
+    assert tracer.drain() == []
+
+def test_enabled_spans_record_complete_events():
+    tracer = Tracer()
+    tracer.enable(memory=False)
+    timings = {}
+    with tracer.span('save', timings, path='out.png'):
+        with tracer.span('save.strip', rows=4) as strip:
+            strip.set(bytes=1024)
+    tracer.counter('palette.inertia', inertia=2.5)
+
+    strip, save, counter = tracer.drain()
+    assert (strip['name'], strip['cat'], strip['ph']) == ('save.strip', 'save', 'X')
+    assert strip['args']['rows'] == 4 and strip['args']['bytes'] == 1024 and 'cpu_ms' in strip['args']
+    assert save['ts'] <= strip['ts'] and save['dur'] >= strip['dur']
+    assert save['args']['path'] == 'out.png' and timings['save'] == pytest.approx(save['dur'] / 1e6)
+    assert counter['ph'] == 'C' and counter['args'] == {'inertia': 2.5}
+    assert tracer.drain() == []
+
+def test_failed_spans_are_recorded_with_the_error():
+    tracer = Tracer()
+    tracer.enable(memory=False)
+    with pytest.raises(ValueError):
+        with tracer.span('load'):
+            raise ValueError("bad file")
+    event, = tracer.drain()
+    assert event['args']['error'] == 'ValueError'
+    assert tracer.open_spans == 0
+
+def test_memory_fields_are_recorded_when_enabled():
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span('palette'):
+        pass
+    event, = tracer.drain()
+    assert event['args']['rss_mb'] >= 0 and event['args']['peak_mb'] >= 0
+
+def test_summary_and_chrome_trace(tmp_path):
+    tracer = Tracer()
+    tracer.enable(memory=False)
+    for _ in range(2):
+        with tracer.span('remap.nearest', bytes=2 ** 20):
+            pass
+    tracer.counter('palette.inertia', inertia=1.0)
+    events = tracer.drain()
+
+    rows = summarize(events)
+    assert list(rows) == ['remap.nearest']
+    assert rows['remap.nearest']['calls'] == 2 and rows['remap.nearest']['bytes'] == 2 ** 21
+    assert 'remap.nearest' in format_summary(events).splitlines()[1]
+
+    path = tmp_path / 'trace.json'
+    write_chrome_trace(str(path), events)
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['traceEvents'] == events
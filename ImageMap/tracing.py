@@ -0,0 +1,167 @@
+import atexit
+import json
+import os
+import threading
+import time
+from memory_usage import current_rss, peak_rss, reset_peak_rss
+
+# Set to a file name to trace any entry point (the desktop application included) and write the trace on exit.
+TRACE_ENV = 'IMAGEMAP_TRACE'
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    # Wall time always, so stage timings can come from the same measurement; CPU time, RSS and the peak RSS
+    # growth only when the tracer records. The process high-water mark is reset when no other span is open,
+    # so nested spans report the peak since their outermost parent started.
+    def __init__(self, tracer, name, timings, args):
+        self.tracer = tracer
+        self.name = name
+        self.timings = timings
+        self.args = args
+        self.seconds = 0.0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        tracer = self.tracer
+        self.recording = tracer.enabled
+        if self.recording:
+            if tracer.memory:
+                if tracer.enter() == 1:
+                    reset_peak_rss()
+                self.rss = current_rss()
+            else:
+                tracer.enter()
+            self.cpu = time.process_time()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        self.seconds = (end - self.start) / 1e9
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + self.seconds
+        if self.recording:
+            tracer = self.tracer
+            tracer.exit()
+            args = dict(self.args, cpu_ms=round((time.process_time() - self.cpu) * 1000, 3))
+            if tracer.memory:
+                args['rss_mb'] = round(self.rss / 2 ** 20, 1)
+                args['peak_mb'] = round(max(0, peak_rss() - self.rss) / 2 ** 20, 1)
+            if exc_type is not None:
+                args['error'] = exc_type.__name__
+            tracer.add({'name': self.name, 'cat': self.name.split('.')[0], 'ph': 'X', 'ts': tracer.timestamp(self.start),
+                        'dur': (end - self.start) / 1000, 'pid': tracer.pid, 'tid': threading.get_ident(), 'args': args})
+        return False
+
+class Tracer:
+    # Spans and counters in Chrome trace event format (chrome://tracing, ui.perfetto.dev). Timestamps are
+    # wall-clock microseconds, so the events of several worker processes line up in one trace.
+    def __init__(self):
+        self.enabled = False
+        self.memory = True
+        self.events = []
+        self.lock = threading.Lock()
+        self.open_spans = 0
+        self.pid = os.getpid()
+        self.origin_ns = time.perf_counter_ns()
+        self.origin_wall_ns = time.time_ns()
+
+    def enable(self, memory=True):
+        self.memory = memory
+        self.pid = os.getpid()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, timings=None, **args):
+        # Disabled and without a timings dict, this returns a shared no-op context: one attribute check per call.
+        if not self.enabled and timings is None:
+            return NULL_SPAN
+        return Span(self, name, timings, args)
+
+    def counter(self, name, **values):
+        if self.enabled:
+            self.add({'name': name, 'ph': 'C', 'ts': self.timestamp(time.perf_counter_ns()), 'pid': self.pid,
+                      'args': values})
+
+    def timestamp(self, perf_ns):
+        return (self.origin_wall_ns + perf_ns - self.origin_ns) / 1000
+
+    def enter(self):
+        with self.lock:
+            self.open_spans += 1
+            return self.open_spans
+
+    def exit(self):
+        with self.lock:
+            self.open_spans -= 1
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def extend(self, events):
+        with self.lock:
+            self.events.extend(events)
+
+    def drain(self):
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+def write_chrome_trace(path, events):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+def summarize(events):
+    # Per span name: calls, wall and CPU time, bytes processed and the largest peak RSS growth.
+    rows = {}
+    for event in events:
+        if event.get('ph') != 'X':
+            continue
+        args = event.get('args', {})
+        row = rows.setdefault(event['name'], {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'bytes': 0, 'peak_mb': 0.0})
+        row['calls'] += 1
+        row['wall_ms'] += event['dur'] / 1000
+        row['cpu_ms'] += args.get('cpu_ms', 0.0)
+        row['bytes'] += args.get('bytes', 0)
+        row['peak_mb'] = max(row['peak_mb'], args.get('peak_mb', 0.0))
+    return rows
+
+def format_summary(events):
+    rows = summarize(events)
+    lines = [f"{'span':<24} {'calls':>6} {'wall ms':>10} {'cpu ms':>10} {'MB':>9} {'MB/s':>8} {'peak MB':>8}"]
+    for name, row in sorted(rows.items(), key=lambda item: -item[1]['wall_ms']):
+        megabytes = row['bytes'] / 2 ** 20
+        rate = f"{megabytes / (row['wall_ms'] / 1000):8.1f}" if row['bytes'] and row['wall_ms'] else f"{'':>8}"
+        lines.append(f"{name:<24} {row['calls']:>6} {row['wall_ms']:>10.1f} {row['cpu_ms']:>10.1f} "
+                     f"{megabytes:>9.1f} {rate} {row['peak_mb']:>8.1f}")
+    return '\n'.join(lines)
+
+TRACER = Tracer()
+span = TRACER.span
+counter = TRACER.counter
+
+def _write_env_trace(path):
+    # Skipped when an entry point has already written and drained the events itself.
+    events = TRACER.drain()
+    if events:
+        write_chrome_trace(path, events)
+
+if os.environ.get(TRACE_ENV):
+    TRACER.enable()
+    atexit.register(_write_env_trace, os.environ[TRACE_ENV])